@@ -0,0 +1,155 @@
+# Storage backends for the Audit_Log sheet.
+#
+# MockGoogleSheets keeps every sheet as an in-memory list. The Audit_Log is the
+# only sheet the agent writes during a request, so it gets a pluggable backend:
+#   - InMemoryAuditLog: the original behaviour, lost on restart.
+#   - SegmentFileAuditLog: append-only JSON-lines segment files with fsync
+#     group commit and crash recovery. Needs nothing beyond the local disk.
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("it-access-guardian")
+
+class InMemoryAuditLog:
+    """Audit_Log rows held in a plain list (not durable)."""
+    durable = False
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    def append(self, row: Dict[str, Any]) -> int:
+        self.rows.append(row)
+        return len(self.rows)
+
+    def sync(self, ticket: int):
+        pass
+
+    def close(self):
+        pass
+
+class SegmentFileAuditLog:
+    """
+    Append-only audit log stored as numbered JSON-lines segment files.
+
+    append() only queues the encoded row and returns a ticket; sync(ticket)
+    blocks until that row is on disk. Whichever caller finds no flush in
+    progress becomes the leader and writes + fsyncs everything queued so far,
+    so concurrent writers share one fsync (group commit).
+    """
+    durable = True
+    SEGMENT_PREFIX = "audit-"
+    SEGMENT_SUFFIX = ".jsonl"
+
+    def __init__(self, directory: str, segment_max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.rows: List[Dict[str, Any]] = []
+        self.fsync_count = 0
+        self._cond = threading.Condition()
+        self._pending: List[bytes] = []
+        self._appended = 0   # ticket of the last queued row
+        self._durable = 0    # ticket of the last row known to be on disk
+        self._flushing = False
+        self._error: Optional[BaseException] = None
+        os.makedirs(directory, exist_ok=True)
+        self._segment_no = self._recover()
+        self._file = open(self._segment_path(self._segment_no), "ab")
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{self.SEGMENT_PREFIX}{number:06d}{self.SEGMENT_SUFFIX}")
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX):
+                numbers.append(int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _recover(self) -> int:
+        """Loads all segments into self.rows and returns the segment to append to."""
+        numbers = self._segment_numbers()
+        for i, number in enumerate(numbers):
+            path = self._segment_path(number)
+            good_bytes = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete record")
+                        self.rows.append(json.loads(line))
+                    except ValueError:
+                        if i != len(numbers) - 1:
+                            raise RuntimeError(f"Corrupt audit segment {path} at byte {good_bytes}")
+                        # A crash mid-write can only tear the tail of the newest segment
+                        logger.warning("[AUDIT_LOG] dropping torn record at %s:%d", path, good_bytes)
+                        break
+                    good_bytes += len(line)
+            if i == len(numbers) - 1 and good_bytes != os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(good_bytes)
+        if numbers:
+            logger.info("[AUDIT_LOG] recovered %d rows from %d segments", len(self.rows), len(numbers))
+        return numbers[-1] if numbers else 1
+
+    def append(self, row: Dict[str, Any]) -> int:
+        # default=dict encodes mapping rows that are not dicts (see src/sheet_rows.py)
+        data = json.dumps(row, separators=(",", ":"), default=dict).encode("utf-8") + b"\n"
+        with self._cond:
+            self._pending.append(data)
+            self.rows.append(row)
+            self._appended += 1
+            return self._appended
+
+    def sync(self, ticket: int):
+        with self._cond:
+            while self._durable < ticket:
+                if self._error is not None:
+                    raise RuntimeError("Audit log is unavailable after a failed write") from self._error
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                batch, self._pending = self._pending, []
+                target = self._appended
+                self._flushing = True
+                self._cond.release()
+                try:
+                    self._write_batch(batch)
+                except BaseException as e:
+                    self._error = e
+                    raise
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    if self._error is None:
+                        self._durable = target
+                    self._cond.notify_all()
+
+    def _write_batch(self, batch: List[bytes]):
+        if not batch:
+            return
+        self._file.write(b"".join(batch))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsync_count += 1
+        if self._file.tell() >= self.segment_max_bytes:
+            self._file.close()
+            self._segment_no += 1
+            self._file = open(self._segment_path(self._segment_no), "ab")
+
+    def close(self):
+        with self._cond:
+            ticket = self._appended
+        self.sync(ticket)
+        self._file.close()
+
+def open_audit_log(directory: Optional[str] = None):
+    """
+    Returns the Audit_Log backend: durable segment files when a directory is
+    given (AUDIT_LOG_DIR), otherwise the in-memory list.
+    """
+    if directory:
+        return SegmentFileAuditLog(directory)
+    return InMemoryAuditLog()
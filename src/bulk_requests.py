@@ -0,0 +1,132 @@
+# Parsing for bulk access-request uploads (POST /requests/bulk).
+#
+# The body is read incrementally and turned into one dict per record:
+#
+#   {"line": 2, "employee_email": ..., "software": ..., "request_type": "Grant"}
+#
+# or {"line": 7, "error": "..."} for a record that cannot be used. `line` is
+# the record's line number in the upload, so outcomes can be matched back to
+# the source file. Two formats are accepted:
+#
+#   CSV (text/csv): a header row naming the columns employee_email, software
+#   and optionally request_type, in any order; fields must not span lines.
+#
+#   JSON lines (application/x-ndjson, application/jsonl, application/json):
+#   one object per line with the same keys.
+#
+# request_type defaults to Grant. Blank lines are skipped.
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+
+BULK_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json": "jsonl",
+}
+
+REQUIRED_FIELDS = ("employee_email", "software")
+FIELD_ALIASES = {"software_name": "software", "email": "employee_email"}
+REQUEST_TYPES = {
+    "": "Grant", "grant": "Grant",
+    "deprovision": "Deprovision", "revoke": "Deprovision", "remove": "Deprovision",
+}
+
+class BulkFormatError(ValueError):
+    """The upload as a whole cannot be parsed, e.g. a CSV header without the required columns."""
+
+def bulk_format(content_type: Optional[str]) -> Optional[str]:
+    """Maps a Content-Type header to "csv" or "jsonl", or None if it is not supported."""
+    return BULK_FORMATS.get((content_type or "").split(";")[0].strip().lower())
+
+def _record(line: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+    values = {FIELD_ALIASES.get(k, k): v for k, v in fields.items()}
+    missing = [f for f in REQUIRED_FIELDS if not isinstance(values.get(f), str) or not values[f].strip()]
+    if missing:
+        return {"line": line, "error": f"missing {', '.join(missing)}"}
+    raw_type = values.get("request_type") or ""
+    request_type = REQUEST_TYPES.get(raw_type.strip().lower()) if isinstance(raw_type, str) else None
+    if request_type is None:
+        return {"line": line, "error": f"unknown request_type {raw_type!r}"}
+    return {"line": line, "employee_email": values["employee_email"].strip(),
+            "software": values["software"].strip(), "request_type": request_type}
+
+class BulkRequestParser:
+    """Incremental parser: feed() bytes as they arrive, close() at the end of the body."""
+
+    def __init__(self, fmt: str):
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"unsupported bulk format {fmt!r}")
+        self.fmt = fmt
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._pending = ""
+        self._line = 0
+        self._columns: Optional[List[str]] = None
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        text = self._pending + self._decoder.decode(data)
+        lines = text.split("\n")
+        self._pending = lines.pop()  # incomplete last line, if any
+        return self._parse_lines(lines)
+
+    def close(self) -> List[Dict[str, Any]]:
+        lines = [self._pending + self._decoder.decode(b"", final=True)]
+        self._pending = ""
+        records = self._parse_lines(lines)
+        if self.fmt == "csv" and self._columns is None:
+            raise BulkFormatError("CSV upload has no header row")
+        return records
+
+    def _parse_lines(self, lines: List[str]) -> List[Dict[str, Any]]:
+        numbered = []
+        for text in lines:
+            self._line += 1
+            text = text.rstrip("\r")
+            if text.strip():
+                numbered.append((self._line, text))
+        if self.fmt == "jsonl":
+            return [self._parse_json(line, text) for line, text in numbered]
+        if self._columns is None and numbered:
+            self._parse_header(numbered.pop(0)[1])
+        # One reader for the whole chunk; each text is a complete record
+        columns = self._columns
+        records = []
+        for (line, _), values in zip(numbered, csv.reader([text for _, text in numbered])):
+            if len(values) > len(columns):
+                records.append({"line": line, "error": f"expected {len(columns)} fields, got {len(values)}"})
+            else:
+                records.append(_record(line, dict(zip(columns, values))))
+        return records
+
+    def _parse_header(self, text: str):
+        columns = [c.strip().lower() for c in next(csv.reader([text]))]
+        columns = [FIELD_ALIASES.get(c, c) for c in columns]
+        missing = [f for f in REQUIRED_FIELDS if f not in columns]
+        if missing:
+            raise BulkFormatError(f"CSV header is missing column(s): {', '.join(missing)}")
+        self._columns = columns
+
+    @staticmethod
+    def _parse_json(line: int, text: str) -> Dict[str, Any]:
+        try:
+            fields = json.loads(text)
+        except json.JSONDecodeError as e:
+            return {"line": line, "error": f"invalid JSON: {e.msg}"}
+        if not isinstance(fields, dict):
+            return {"line": line, "error": "expected a JSON object"}
+        return _record(line, fields)
+
+async def read_batches(chunks: AsyncIterable[bytes], parser: BulkRequestParser,
+                       batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Parses an async stream of body chunks into batches of at most batch_size records."""
+    batch: List[Dict[str, Any]] = []
+    async for chunk in chunks:
+        batch.extend(parser.feed(chunk))
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    batch.extend(parser.close())
+    for start in range(0, len(batch), batch_size):
+        yield batch[start:start + batch_size]
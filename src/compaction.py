@@ -0,0 +1,148 @@
+# Conversation history compaction for the agent's model calls.
+#
+# ADK re-sends the whole session history (including raw tool call/response
+# payloads) on every model call. Once the workflow facts are known (verified
+# employee, role, software, request ID), the older turns add nothing but
+# tokens, so they are folded into a short structured summary and only the
+# most recent turns are sent verbatim.
+import logging
+from typing import Callable, Dict, List, Optional
+
+from google.genai import types
+
+from src.text_patterns import CHARS_PER_TOKEN, EMPLOYEE_FOUND_PATTERN, tool_result
+
+logger = logging.getLogger("it-access-guardian")
+
+MAX_SUMMARY_MESSAGE_CHARS = 200
+MAX_SUMMARY_MESSAGES = 5  # most recent folded user messages quoted in the summary
+
+def _is_user_turn_start(content: types.Content) -> bool:
+    """A turn starts at a user message with text (not a function response)."""
+    return content.role == "user" and any(p.text for p in content.parts or [])
+
+def extract_workflow_facts(contents: List[types.Content]) -> Dict[str, str]:
+    """Collects the facts the workflow has established from tool calls and results."""
+    facts: Dict[str, str] = {}
+    pending_email = None
+    for content in contents:
+        for part in content.parts or []:
+            if part.function_call:
+                args = part.function_call.args or {}
+                if part.function_call.name == "find_employee_by_email":
+                    pending_email = args.get("email")
+                elif part.function_call.name == "find_policy_for_user" and args.get("software_name"):
+                    facts["software"] = args["software_name"]
+            elif part.function_response:
+                name = part.function_response.name
+                result = tool_result(part.function_response.response)
+                if name == "find_employee_by_email" and isinstance(result, str):
+                    match = EMPLOYEE_FOUND_PATTERN.match(result)
+                    if match and pending_email:
+                        facts.update(email=pending_email, name=match["name"], role=match["role"])
+                    elif pending_email:
+                        facts["unknown_email"] = pending_email
+                elif name == "find_policy_for_user":
+                    facts["policy"] = ("none for this role" if not result else
+                                       f"manager approval required={result.get('Requires_Manager_Approval')}, "
+                                       f"contact={result.get('Approval_Contact_Email')}")
+                elif name == "check_audit_log_for_duplicate" and result:
+                    facts["existing_request"] = f"{result.get('Request_ID')} ({result.get('Status')})"
+                elif name == "append_to_audit_log" and isinstance(result, dict):
+                    facts["request_id"] = str(result.get("Request_ID"))
+                    facts["status"] = str(result.get("Status"))
+                    facts["software"] = result.get("Software_Name") or facts.get("software", "")
+                elif name == "find_manager_email" and isinstance(result, str) and result.startswith("Manager email:"):
+                    facts["manager_email"] = result[len("Manager email:"):].strip()
+                elif name == "send_gmail" and isinstance(result, dict) and result.get("to"):
+                    facts["notified"] = ", ".join(filter(None, [facts.get("notified"), result["to"]]))
+    return facts
+
+def summarize(facts: Dict[str, str], folded: List[types.Content]) -> str:
+    lines = ["[Summary of earlier turns, compacted. Treat these facts as established.]"]
+    if "email" in facts:
+        lines.append(f"Verified employee: {facts['name']} <{facts['email']}>, role: {facts['role']}")
+    if "unknown_email" in facts and "email" not in facts:
+        lines.append(f"Employee not found: {facts['unknown_email']}")
+    for key, label in (("software", "Software requested"), ("policy", "Policy"),
+                       ("existing_request", "Existing request"), ("request_id", "Audit log Request ID"),
+                       ("status", "Logged status"), ("manager_email", "Manager"), ("notified", "Email sent to")):
+        if facts.get(key):
+            lines.append(f"{label}: {facts[key]}")
+    said = [p.text[:MAX_SUMMARY_MESSAGE_CHARS] for c in folded if c.role == "user" for p in c.parts or [] if p.text]
+    said = said[-MAX_SUMMARY_MESSAGES:]
+    if said:
+        lines.append("Earlier user messages: " + " | ".join(said))
+    return "\n".join(lines)
+
+def prompt_size(llm_request) -> int:
+    """Approximate prompt size in characters: system instruction plus serialized contents."""
+    size = len(str(llm_request.config.system_instruction or "")) if llm_request.config else 0
+    return size + sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents)
+
+class HistoryCompactor:
+    """
+    before_model/after_model callbacks for LlmAgent.
+
+    Keeps the last keep_turns user turns verbatim and folds everything before
+    them into one summary, once the employee has been identified. Also records
+    prompt size per model call (characters before/after compaction and the
+    model's reported prompt token count) in self.stats. If given,
+    `observe_prompt(stage, tokens)` is called for every model call with the
+    estimated tokens "before" and "after" compaction, and with the "reported"
+    prompt token count once the model answers.
+    """
+
+    def __init__(self, keep_turns: int = 2, enabled: bool = True,
+                 observe_prompt: Optional[Callable[[str, int], None]] = None):
+        self.keep_turns = keep_turns
+        self.enabled = enabled
+        self.observe_prompt = observe_prompt
+        self.stats = {"calls": 0, "compacted_calls": 0, "last_prompt_chars": 0, "max_prompt_chars": 0,
+                      "chars_saved": 0, "last_prompt_tokens": 0, "max_prompt_tokens": 0}
+
+    def compact(self, contents: List[types.Content]) -> List[types.Content]:
+        turn_starts = [i for i, c in enumerate(contents) if _is_user_turn_start(c)]
+        if len(turn_starts) <= self.keep_turns:
+            return contents
+        cut = turn_starts[-self.keep_turns] if self.keep_turns else len(contents)
+        folded = contents[:cut]
+        facts = extract_workflow_facts(folded)
+        if "email" not in facts and "unknown_email" not in facts:
+            return contents  # nothing established yet; keep the raw history
+        summary = types.Part(text=summarize(facts, folded))
+        if cut < len(contents):
+            first = contents[cut]
+            kept = [types.Content(role=first.role, parts=[summary] + list(first.parts or []))] + contents[cut + 1:]
+        else:
+            kept = [types.Content(role="user", parts=[summary])]
+        return kept
+
+    def before_model(self, callback_context, llm_request):
+        before = prompt_size(llm_request)
+        after = before
+        if self.enabled:
+            compacted = self.compact(llm_request.contents)
+            if compacted is not llm_request.contents:
+                llm_request.contents = compacted
+                after = prompt_size(llm_request)
+                self.stats["compacted_calls"] += 1
+                self.stats["chars_saved"] += before - after
+        self.stats["calls"] += 1
+        self.stats["last_prompt_chars"] = after
+        self.stats["max_prompt_chars"] = max(self.stats["max_prompt_chars"], after)
+        logger.info("[PROMPT] chars=%d (before compaction %d), contents=%d", after, before, len(llm_request.contents))
+        if self.observe_prompt is not None:
+            self.observe_prompt("before", before // CHARS_PER_TOKEN)
+            self.observe_prompt("after", after // CHARS_PER_TOKEN)
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage and usage.prompt_token_count:
+            self.stats["last_prompt_tokens"] = usage.prompt_token_count
+            self.stats["max_prompt_tokens"] = max(self.stats["max_prompt_tokens"], usage.prompt_token_count)
+            logger.info("[PROMPT] tokens=%d", usage.prompt_token_count)
+            if self.observe_prompt is not None:
+                self.observe_prompt("reported", usage.prompt_token_count)
+        return None
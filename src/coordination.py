@@ -0,0 +1,128 @@
+# Coordination between concurrent requests.
+#
+# RequestCoalescer is single-flight for access requests. The first
+# invocation to run check_audit_log_for_duplicate for an (employee, software)
+# pair owns that pair until it has appended its Audit_Log row or its turn
+# ends. Another invocation checking the same pair meanwhile waits for the
+# owner and then runs its own check, which finds the owner's row, so a
+# double-click or client retry reports the existing request instead of
+# creating a second row and a second approval email.
+#
+# SessionLocks serializes turns on the same session_id, so two requests for
+# one conversation never interleave their events.
+#
+# Both are per process: with several workers sharing SESSION_DB_PATH, turns
+# routed to different workers are not coordinated.
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("it-access-guardian")
+
+CHECK_TOOL = "check_audit_log_for_duplicate"
+APPEND_TOOL = "append_to_audit_log"
+
+RequestKey = Tuple[str, str]
+
+class RequestCoalescer:
+    """
+    Per-(employee, software) claims, plus the LlmAgent callbacks that take
+    them at the duplicate check and release them once the row is appended.
+    A claim not released within timeout seconds is taken over.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._owners: Dict[RequestKey, str] = {}
+        self._released: Dict[RequestKey, asyncio.Event] = {}
+        self._keys_by_owner: Dict[str, Set[RequestKey]] = {}
+        self.waits = 0
+
+    @staticmethod
+    def key(employee_email: str, software_name: str) -> RequestKey:
+        return (employee_email or "").strip().lower(), (software_name or "").strip().lower()
+
+    def owner_of(self, key: RequestKey) -> Optional[str]:
+        return self._owners.get(key)
+
+    async def acquire(self, key: RequestKey, owner: str) -> bool:
+        """Waits while another owner holds key, then takes it. Returns whether it had to wait."""
+        waited = False
+        deadline = time.monotonic() + self.timeout
+        while self._owners.get(key) not in (None, owner):
+            if not waited:
+                waited = True
+                self.waits += 1
+                logger.info("[SINGLE_FLIGHT] %s / %s already in flight; waiting", *key)
+            remaining = deadline - time.monotonic()
+            try:
+                await asyncio.wait_for(self._released[key].wait(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                logger.warning("[SINGLE_FLIGHT] %s / %s still held after %.0fs; taking over", *key, self.timeout)
+                self.release(key)
+                break
+        if self._owners.get(key) != owner:
+            self._owners[key] = owner
+            self._released[key] = asyncio.Event()
+            self._keys_by_owner.setdefault(owner, set()).add(key)
+        return waited
+
+    def release(self, key: RequestKey, owner: Optional[str] = None):
+        """Releases key (only if owner holds it, when owner is given) and wakes its waiters."""
+        holder = self._owners.get(key)
+        if holder is None or (owner is not None and holder != owner):
+            return
+        del self._owners[key]
+        self._released.pop(key).set()
+        keys = self._keys_by_owner.get(holder)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_owner[holder]
+
+    def release_owner(self, owner: str):
+        """Releases everything owner still holds, e.g. when its turn ends without an append."""
+        for key in list(self._keys_by_owner.get(owner, ())):
+            self.release(key, owner)
+
+    # ----- LlmAgent callbacks -----
+    async def before_tool(self, tool, args, tool_context):
+        if tool.name == CHECK_TOOL:
+            await self.acquire(self.key(args.get("employee_email"), args.get("software_name")), tool_context.invocation_id)
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        # A duplicate means nothing will be appended, so waiters can check right away
+        if tool.name == APPEND_TOOL or (tool.name == CHECK_TOOL and tool_response):
+            self.release(self.key(args.get("employee_email"), args.get("software_name")), tool_context.invocation_id)
+        return None
+
+    def after_agent(self, callback_context):
+        self.release_owner(callback_context.invocation_id)
+        return None
+
+class SessionLocks:
+    """One asyncio.Lock per session ID, dropped once no turn holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[str, List] = {}  # session_id -> [lock, holders and waiters]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, session_id: Optional[str]):
+        if not session_id:
+            yield  # a new session is not visible to any other request yet
+            return
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
@@ -0,0 +1,114 @@
+# Employee_Directory import from an HR CSV export, applied as a delta.
+#
+# The export is read one row at a time, so memory grows with the number of
+# employees (one email each, to find leavers) and the size of the delta, not
+# with the export. Each row is compared with the current directory row for the
+# same email:
+#   - not in the directory: added
+#   - Role, Manager_Email or Employee_Name differs: updated (role and manager
+#     changes are counted separately)
+#   - the same: left alone
+# Directory rows whose email is not in the export are leavers and are removed.
+# The delta is applied with MockGoogleSheets.update_rows, which swaps in the
+# new sheet at once: lookups never wait and never see a half-applied import,
+# and the recertification job (src/recertification.py) sees exactly the rows
+# that changed.
+#
+# Header names are matched case-insensitively to the sheet's columns, or to
+# the aliases in COLUMN_ALIASES; other columns are ignored.
+import csv
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("it-access-guardian")
+
+DIRECTORY_COLUMNS = ("Employee_Email", "Employee_Name", "Role", "Manager_Email")
+REQUIRED_COLUMNS = ("Employee_Email", "Role")
+COLUMN_ALIASES = {
+    "email": "Employee_Email", "work_email": "Employee_Email",
+    "name": "Employee_Name", "full_name": "Employee_Name",
+    "job_role": "Role",
+    "manager": "Manager_Email",
+}
+
+class DirectoryImportError(ValueError):
+    """The export cannot be used as a whole, e.g. a missing column or no valid rows."""
+
+def _header_columns(header: List[str]) -> List[Optional[str]]:
+    known = {c.lower(): c for c in DIRECTORY_COLUMNS}
+    known.update(COLUMN_ALIASES)
+    columns = [known.get(name.strip().lstrip("\ufeff").lower()) for name in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise DirectoryImportError(f"HR export is missing column(s): {', '.join(missing)}")
+    return columns
+
+class DirectoryDelta:
+    """Changes that bring a directory in line with an HR export."""
+
+    def __init__(self):
+        self.upserts: List[Dict[str, str]] = []  # added and updated rows, as in the export
+        self.deletes: List[tuple] = []           # index keys of leavers
+        self.counts = {"rows": 0, "invalid": 0, "duplicates": 0, "added": 0,
+                       "role_changes": 0, "manager_changes": 0, "updated": 0, "removed": 0}
+
+def compute_directory_delta(db, lines: Iterable[str]) -> DirectoryDelta:
+    """
+    Reads an HR export (an iterable of CSV lines, e.g. an open file) against
+    db's Employee_Directory. Only rows that differ are kept.
+    """
+    current = dict(db.indexes["Employee_Directory"])  # snapshot; rows added meanwhile are not leavers
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise DirectoryImportError("HR export is empty")
+    columns = _header_columns(header)
+    delta = DirectoryDelta()
+    counts = delta.counts
+    seen = set()
+    for values in reader:
+        if not any(values):
+            continue
+        counts["rows"] += 1
+        row = {column: value.strip() for column, value in zip(columns, values) if column}
+        email = row.get("Employee_Email", "")
+        if not email or not row.get("Role"):
+            counts["invalid"] += 1
+            continue
+        key = email.lower()
+        if key in seen:
+            counts["duplicates"] += 1  # first row wins, as in the sheet's index
+            continue
+        seen.add(key)
+        row = {column: row.get(column, "") for column in DIRECTORY_COLUMNS}
+        existing = current.get((key,))
+        if existing is None:
+            counts["added"] += 1
+        elif any(existing.get(column, "") != row[column] for column in DIRECTORY_COLUMNS):
+            counts["updated"] += 1
+            counts["role_changes"] += existing.get("Role") != row["Role"]
+            counts["manager_changes"] += existing.get("Manager_Email", "") != row["Manager_Email"]
+        else:
+            continue
+        delta.upserts.append(row)
+    if not seen:
+        # Most likely a truncated export; applying it would remove everyone
+        raise DirectoryImportError("HR export has no valid rows")
+    delta.deletes = [key for key in current if key[0] not in seen]
+    counts["removed"] = len(delta.deletes)
+    return delta
+
+def import_directory(db, path: str) -> Dict[str, Any]:
+    """Brings db's Employee_Directory in line with the HR export at path. Blocking; returns a report."""
+    start = time.perf_counter()
+    with open(path, newline="", encoding="utf-8-sig") as export:
+        delta = compute_directory_delta(db, export)
+    db.update_rows("Employee_Directory", upserts=delta.upserts, deletes=delta.deletes)
+    elapsed = time.perf_counter() - start
+    report = dict(delta.counts, elapsed_ms=round(elapsed * 1000, 1),
+                  rows_per_second=round(delta.counts["rows"] / elapsed) if elapsed else None)
+    logger.info("[DIRECTORY] imported %s: %d rows, %d added, %d updated, %d removed, %d invalid in %.1f ms (%s rows/s)",
+                path, report["rows"], report["added"], report["updated"], report["removed"], report["invalid"],
+                report["elapsed_ms"], report["rows_per_second"])
+    return report
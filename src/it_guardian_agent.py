@@ -6,46 +6,112 @@ warnings.filterwarnings("ignore", category=UserWarning, message=".*protected nam
 warnings.filterwarnings("ignore", category=UserWarning, message=".*model_.*")
 
 import os
+import sys
+import json
+import time
 import uuid
+import asyncio
 import datetime
 import logging
-from typing import Optional, Dict, Any
+import re
+import threading
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 
-from google.adk.agents import Agent
-
-import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+# Allow `python src/it_guardian_agent.py` to import sibling modules as src.*
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.audit_store import open_audit_log
+from src.bulk_requests import BulkFormatError, BulkRequestParser, bulk_format, read_batches
+from src.coordination import RequestCoalescer, SessionLocks
+from src.directory_import import import_directory
+from src.log_sink import channel_logger, configure_logging, parse_channel_spec
+from src.metrics import AgentMetrics
+from src.tracing import RequestTracer, maybe_span
+from src.outbox import EmailOutbox
+from src.rate_limit import AdmissionController, AdmissionRejected, ModelRateLimiter
+from src.recertification import Recertifier
+from src.sheet_cache import VersionedCache
+from src.sheet_rows import make_row, to_dict
+from src.text_patterns import DEPROVISION_WORDS, EMAIL_PATTERN, find_software_name, message_words
+
+if TYPE_CHECKING:
+    from google.adk.agents import LlmAgent
+    from src.policy_matrix import PolicyMatrix
+
 # Load environment variables from .env
 load_dotenv()
 
-# Get Google API key from environment
+# Model provider: "gemini" (default) or the offline "scripted" stand-in (see src/llm_providers.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+# Optional cassette: "record" model calls to LLM_CASSETTE_PATH, or "replay" them from it
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").lower() or None
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH")
+# Whether model calls actually reach Gemini (and count against its quota)
+CALLS_GEMINI = LLM_PROVIDER == "gemini" and LLM_CASSETTE_MODE != "replay"
+
+# Get Google API key from environment (only Gemini needs it)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY not set. Set it in environment or .env file.")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-
-# ADK imports (1.18.0)
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.tools.function_tool import FunctionTool
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-Part = types.Part
+if CALLS_GEMINI:
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY not set. Set it in environment or .env file.")
+    os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+
+# ADK (1.18.0) is imported where the agent is built, not here: importing it
+# pulls in google.genai and vertexai and takes most of the start-up time.
 
 # ---------- Logging ----------
-logging.basicConfig(level=logging.INFO)
+# Records are written by a background thread; [MOCK_SHEETS] and [MOCK_GMAIL]
+# log on their own channels so they can be sampled or silenced separately.
+# Audit_Log appends log on the audit_log channel, which is never sampled,
+# silenced or dropped:
+# without AUDIT_LOG_DIR those lines are the only record of the decisions.
+log_sink = configure_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    channel_levels=parse_channel_spec(os.getenv("LOG_CHANNEL_LEVELS", "")),
+    sample_rates=parse_channel_spec(os.getenv("LOG_SAMPLE_RATES", "mock_sheets=0.1")),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+)
 logger = logging.getLogger("it-access-guardian")
+sheets_logger = channel_logger("mock_sheets")
+gmail_logger = channel_logger("mock_gmail")
+audit_logger = channel_logger("audit_log")
 
 # Suppress ADK runner warnings
 logging.getLogger("google_adk.google.adk.runners").setLevel(logging.ERROR)
 
 # ---------- Mock services ----------
+# Secondary indexes kept per sheet: sheet name -> key columns.
+# Email columns are indexed lower-cased so lookups are case-insensitive.
+SHEET_INDEXES = {
+    "Employee_Directory": ("Employee_Email",),
+    "Software_Access_Policy": ("Software_Name", "Role"),
+}
+
+# How many changes per indexed sheet are remembered for changed_keys()
+SHEET_JOURNAL_MAX_CHANGES = 10000
+
+# Audit_Log statuses that mean a grant is still in flight or already given
+# ("Pending Deprovisioning" is a removal, so a new grant request is not a duplicate)
+OPEN_GRANT_STATUSES = frozenset({"Approved", "Pending Manager Approval"})
+
+def _normalize_key_value(column: str, value: Any):
+    if column.endswith("_Email") and isinstance(value, str):
+        return value.lower()
+    return value
+
 class MockGoogleSheets:
-    def __init__(self):
+    def __init__(self, audit_log=None, cache_staleness_seconds: float = 5.0, cache_max_entries: int = 10000):
+        # Audit_Log storage backend (see src/audit_store.py); in-memory by default
+        self.audit_log = audit_log if audit_log is not None else open_audit_log()
         self.sheets = {
             "Employee_Directory": [
                 {"Employee_Email": "sam.sales@company.demo", "Employee_Name": "Sam Sales", "Role": "Sales", "Manager_Email": "sales.manager@company.demo"},
@@ -57,71 +123,367 @@ class MockGoogleSheets:
                 {"Software_Name": "GitHub", "Role": "Engineering", "Requires_Manager_Approval": "No", "Approval_Contact_Email": "it-support@company.demo"},
                 {"Software_Name": "Figma", "Role": "Design", "Requires_Manager_Approval": "No", "Approval_Contact_Email": "it-support@company.demo"},
             ],
-            "Audit_Log": []  # Start with empty log for clean demo
+            "Audit_Log": self.audit_log.rows  # Empty for a clean demo unless recovered from disk
         }
-        self.next_request_id = 1001  # Start from 1001 since log is empty
+        # Rows are held as compact slotted rows (see src/sheet_rows.py); recovered rows are converted in place
+        for sheet_name, rows in self.sheets.items():
+            rows[:] = [make_row(sheet_name, row) for row in rows]
+        # Continue numbering after any recovered rows; start from 1001 for an empty log
+        self.next_request_id = max((int(row["Request_ID"]) for row in self.audit_log.rows), default=1000) + 1
+        self._lock = threading.Lock()
+        self.indexes: Dict[str, Dict[tuple, Dict[str, str]]] = {name: {} for name in SHEET_INDEXES}
+        # Lower-cased Software_Name -> name as written in the policy sheet
+        self.software_names: Dict[str, str] = {}
+        for sheet_name in SHEET_INDEXES:
+            for row in self.sheets.get(sheet_name, []):
+                self._index_row(sheet_name, row)
+        # (lower-cased Employee_Email, lower-cased Software_Name) -> latest Audit_Log row
+        self.audit_index: Dict[tuple, Dict[str, str]] = {}
+        for row in self.sheets["Audit_Log"]:
+            self._index_audit_row(row)
+        # Bumped on every change to a sheet; etag() stands in for the backend's ETag/revision
+        self.versions: Dict[str, int] = {name: 0 for name in self.sheets}
+        # Read-through caches for lookups on the indexed sheets (see src/sheet_cache.py)
+        self.caches = {
+            name: VersionedCache(partial(self._read_indexed, name), partial(self.etag, name), cache_staleness_seconds,
+                                 max_entries=cache_max_entries)
+            for name in SHEET_INDEXES
+        }
+        # (version, index keys changed by it) for each indexed sheet; see changed_keys()
+        self.journal = {name: deque(maxlen=SHEET_JOURNAL_MAX_CHANGES) for name in SHEET_INDEXES}
+        # Role × software decisions for access reviews (see src/policy_matrix.py), compiled on first use
+        self._policy_matrix: Optional["PolicyMatrix"] = None
+        # (directory version, matrix, roles interned) -> emails, role IDs, email -> position
+        self._directory_codes = None
+
+    def _index_key(self, sheet_name: str, values) -> tuple:
+        columns = SHEET_INDEXES[sheet_name]
+        return tuple(_normalize_key_value(col, val) for col, val in zip(columns, values))
+
+    def _index_row(self, sheet_name: str, row: Dict[str, str]):
+        key = self._index_key(sheet_name, [row.get(col) for col in SHEET_INDEXES[sheet_name]])
+        # First row wins, matching the top-down scan order of find_row_matching
+        self.indexes[sheet_name].setdefault(key, row)
+        if sheet_name == "Software_Access_Policy":
+            self.software_names.setdefault(row["Software_Name"].lower(), row["Software_Name"])
+
+    def _audit_key(self, employee_email: str, software_name: str) -> tuple:
+        # Normalized like RequestCoalescer.key, so "github" finds a "GitHub" request
+        return RequestCoalescer.key(employee_email, software_name)
+
+    def _index_audit_row(self, row: Dict[str, str]):
+        # Rows only ever arrive in log order, so the last write is the latest entry
+        self.audit_index[self._audit_key(row.get("Employee_Email"), row.get("Software_Name"))] = row
+
+    def etag(self, sheet_name: str) -> str:
+        return f'"{sheet_name}-{self.versions.get(sheet_name, 0)}"'
+
+    def _read_indexed(self, sheet_name: str, key: tuple):
+        # The backend read behind the cache; a copy, as a remote read would return
+        sheets_logger.debug("[MOCK_SHEETS] cache miss %s %s", sheet_name, key)
+        row = self.indexes[sheet_name].get(key)
+        return to_dict(row) if row is not None else None
 
     def read_sheet(self, sheet_name: str):
-        logger.info("[MOCK_SHEETS] read %s", sheet_name)
+        sheets_logger.info("[MOCK_SHEETS] read %s", sheet_name)
         return self.sheets.get(sheet_name, [])
 
+    def lookup(self, sheet_name: str, *key_values):
+        """
+        Returns the row whose index columns match key_values, or None.
+        Only sheets listed in SHEET_INDEXES can be looked up.
+        """
+        sheets_logger.info("[MOCK_SHEETS] lookup %s %s", sheet_name, key_values)
+        return self.caches[sheet_name].get(self._index_key(sheet_name, key_values))
+
+    def latest_audit_entry(self, employee_email: str, software_name: str, open_only: bool = False):
+        """
+        Returns the most recent Audit_Log row for this employee and software.
+        With open_only, returns it only if its Status is in OPEN_GRANT_STATUSES.
+        """
+        sheets_logger.info("[MOCK_SHEETS] audit lookup %s / %s", employee_email, software_name)
+        row = self.audit_index.get(self._audit_key(employee_email, software_name))
+        if row is not None and open_only and row.get("Status") not in OPEN_GRANT_STATUSES:
+            return None
+        return row
+
     def find_row_matching(self, sheet_name: str, match_criteria: Dict[str, str]):
-        logger.info("[MOCK_SHEETS] search %s for %s", sheet_name, match_criteria)
+        sheets_logger.info("[MOCK_SHEETS] search %s for %s", sheet_name, match_criteria)
+        columns = SHEET_INDEXES.get(sheet_name)
+        if columns and set(match_criteria) == set(columns):
+            row = self.caches[sheet_name].get(self._index_key(sheet_name, [match_criteria[col] for col in columns]))
+            if row is None:
+                sheets_logger.debug("[MOCK_SHEETS] no row found")
+                return None
+            if all(row.get(k) == v for k, v in match_criteria.items()):
+                sheets_logger.debug("[MOCK_SHEETS] found row: %s", row)
+                return row
+            # Normalized key matched but the exact values differ (e.g. email case); scan instead
         sheet = self.sheets.get(sheet_name)
         if sheet:
             for row in sheet:
                 if all(row.get(k) == v for k, v in match_criteria.items()):
-                    logger.info("[MOCK_SHEETS] found row: %s", row)
+                    sheets_logger.debug("[MOCK_SHEETS] found row: %s", row)
                     return row
-        logger.info("[MOCK_SHEETS] no row found")
+        sheets_logger.debug("[MOCK_SHEETS] no row found")
         return None
 
+    def update_rows(self, sheet_name: str, upserts: List[Dict[str, str]] = (), deletes: List[tuple] = ()) -> Dict[str, int]:
+        """
+        Applies upserts (each replaces the row with the same index key, or is
+        appended) and deletes (index key values) to an indexed sheet as one
+        change. The new rows and index are built without holding the lock and
+        swapped in if the sheet's version is unchanged (else built again), so
+        neither lookups nor appends wait for the build.
+        Returns how many rows were added, updated and deleted.
+        """
+        columns = SHEET_INDEXES[sheet_name]
+
+        def key_of(row):
+            return self._index_key(sheet_name, [row.get(col) for col in columns])
+
+        pending_rows = {key_of(row): make_row(sheet_name, row) for row in upserts}
+        removed = {self._index_key(sheet_name, values) for values in deletes}
+        while True:
+            with self._lock:
+                version, current, length = self.versions[sheet_name], self.sheets[sheet_name], len(self.sheets[sheet_name])
+            # Built outside the lock; appends only extend the list past `length`
+            counts = {"added": 0, "updated": 0, "deleted": 0}
+            pending = dict(pending_rows)
+            rows, index, changed = [], {}, set()
+            for row in current[:length]:
+                key = key_of(row)
+                if key in removed:
+                    counts["deleted"] += 1
+                    changed.add(key)
+                    continue
+                replacement = pending.pop(key, None)
+                if replacement is not None and replacement != row:
+                    counts["updated"] += 1
+                    changed.add(key)
+                    row = replacement
+                rows.append(row)
+                index.setdefault(key, row)
+            for key, row in pending.items():
+                if key not in removed:
+                    counts["added"] += 1
+                    changed.add(key)
+                    rows.append(row)
+                    index.setdefault(key, row)
+            if not changed:
+                return counts
+            names = None
+            if sheet_name == "Software_Access_Policy":
+                names = {}
+                for row in rows:
+                    names.setdefault(row["Software_Name"].lower(), row["Software_Name"])
+            with self._lock:
+                if self.versions[sheet_name] != version:
+                    continue  # the sheet changed while building; build again from the new rows
+                self.sheets[sheet_name] = rows
+                self.indexes[sheet_name] = index
+                if names is not None:
+                    # In place: ScriptedLlm holds this dict by reference
+                    self.software_names.update(names)
+                    for stale in self.software_names.keys() - names.keys():
+                        del self.software_names[stale]
+                self.versions[sheet_name] += 1
+                self.journal[sheet_name].append((self.versions[sheet_name], frozenset(changed)))
+                self.caches[sheet_name].invalidate()
+            break
+        sheets_logger.info("[MOCK_SHEETS] update %s: %s", sheet_name, counts)
+        return counts
+
+    def changed_keys(self, sheet_name: str, since_version: int) -> Optional[set]:
+        """
+        Index keys of the rows added, changed or removed in an indexed sheet
+        after since_version. None if that is unknown: the journal no longer
+        reaches back that far, or the sheet was changed directly.
+        """
+        with self._lock:
+            current = self.versions[sheet_name]
+            entries = [entry for entry in self.journal[sheet_name] if entry[0] > since_version]
+        if [version for version, _ in entries] != list(range(since_version + 1, current + 1)):
+            return None
+        return set().union(*(keys for _, keys in entries))
+
+    # ----- Whole-population queries for access reviews -----
+    # src.policy_matrix (and NumPy) is imported on first use, not at start-up
+    def policy_matrix(self) -> "PolicyMatrix":
+        """Software_Access_Policy compiled to a role × software decision matrix."""
+        version = self.versions["Software_Access_Policy"]
+        matrix = self._policy_matrix
+        if matrix is None or matrix.version != version:
+            from src.policy_matrix import PolicyMatrix
+
+            # First use, or the sheet was edited other than by append_rows: compile it again
+            with self._lock:
+                matrix = self._policy_matrix = PolicyMatrix(self.sheets["Software_Access_Policy"],
+                                                            version=self.versions["Software_Access_Policy"])
+        return matrix
+
+    def directory_codes(self):
+        """
+        Returns (emails, role_ids, positions) for the whole Employee_Directory:
+        role IDs are in policy_matrix() terms, and positions maps a lower-cased
+        email to its index. Re-encoded only when the directory or the matrix changes.
+        """
+        matrix = self.policy_matrix()
+        key = (self.versions["Employee_Directory"], matrix, len(matrix.roles))
+        if self._directory_codes is None or self._directory_codes[0] != key:
+            rows = self.sheets["Employee_Directory"]
+            emails = [row["Employee_Email"] for row in rows]
+            role_ids = matrix.roles.encode((row.get("Role") for row in rows), len(rows))
+            positions = {}
+            for i, email in enumerate(emails):
+                positions.setdefault(email.lower(), i)  # first row wins, as in the index
+            self._directory_codes = (key, emails, role_ids, positions)
+        return self._directory_codes[1:]
+
+    def employees_with_decision(self, software_name: str, decision: int) -> List[str]:
+        """Emails of everyone whose current role gets `decision` (e.g. AUTO_APPROVE) for software_name."""
+        from src.policy_matrix import select
+
+        matrix = self.policy_matrix()
+        emails, role_ids, _ = self.directory_codes()
+        return select(emails, matrix.decide(role_ids, matrix.software_id(software_name)) == decision)
+
+    def policy_violations(self, grants: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Approved grants that current policy no longer allows, out of `grants`
+        (default: the latest Audit_Log entry per employee and software). Each
+        result carries the grant row, the employee's current role and the reason:
+          - "employee_not_in_directory": the employee has left
+          - "no_policy_for_role": their current role has no policy for the software
+          - "requires_manager_approval": their current role needs a manager's
+            approval, which an Approved grant never had
+        """
+        if grants is None:
+            grants = list(self.audit_index.values())  # one C-level copy, safe against concurrent appends
+        grants = [row for row in grants if row.get("Status") == "Approved"]
+        if not grants:
+            return []
+        import numpy as np
+        from src.policy_matrix import AUTO_APPROVE, NO_POLICY, UNKNOWN_ID
+
+        matrix = self.policy_matrix()
+        _, role_ids, positions = self.directory_codes()
+        count = len(grants)
+        grant_positions = np.fromiter((positions.get(row["Employee_Email"].lower(), -1) for row in grants), np.int64, count)
+        in_directory = grant_positions >= 0
+        grant_roles = np.full(count, UNKNOWN_ID, dtype=np.int32)
+        grant_roles[in_directory] = role_ids[grant_positions[in_directory]]
+        decisions = matrix.decide(grant_roles, matrix.software.encode((row["Software_Name"] for row in grants), count))
+        # Only policy auto-approves: requests needing a manager stay Pending in the Audit_Log
+        violating = decisions != AUTO_APPROVE
+
+        violations = []
+        found = np.flatnonzero(violating)
+        for i, role_id, decision in zip(found.tolist(), grant_roles[found].tolist(), decisions[found].tolist()):
+            grant = grants[i]
+            if not in_directory[i]:
+                role, reason = None, "employee_not_in_directory"
+            else:
+                role = matrix.roles.names[role_id] if role_id >= 0 else \
+                    (self.indexes["Employee_Directory"].get((grant["Employee_Email"].lower(),)) or {}).get("Role")
+                reason = "no_policy_for_role" if decision == NO_POLICY else "requires_manager_approval"
+            violations.append({"grant": grant, "role": role, "reason": reason})
+        return violations
+
     def append_to_sheet(self, sheet_name: str, row_data: Dict[str, str]):
-        logger.info("[MOCK_SHEETS] append %s -> %s", sheet_name, row_data)
+        if sheet_name != "Audit_Log":
+            sheets_logger.info("[MOCK_SHEETS] append %s -> %s", sheet_name, row_data)
+        row = self._append(sheet_name, [row_data])[0]
+        if sheet_name == "Audit_Log":
+            audit_logger.info("[AUDIT_LOG] append %s", row)
+        return row
+
+    def append_rows(self, sheet_name: str, rows: List[Dict[str, str]]):
+        """Appends several rows in order; Audit_Log rows share one sync to disk."""
+        rows = self._append(sheet_name, rows)
+        if sheet_name != "Audit_Log":
+            sheets_logger.info("[MOCK_SHEETS] append %d rows to %s", len(rows), sheet_name)
+        elif self.audit_log.durable:
+            audit_logger.info("[AUDIT_LOG] append %d rows", len(rows))
+        else:
+            # Nothing else keeps these rows past a restart, so log every one
+            for row in rows:
+                audit_logger.info("[AUDIT_LOG] append %s", row)
+        return rows
+
+    def _append(self, sheet_name: str, rows: List[Dict[str, str]]):
+        rows = [make_row(sheet_name, row) for row in rows]
+        if not rows:
+            return rows
+        with self._lock:
+            if sheet_name == "Audit_Log":
+                timestamp = datetime.datetime.now().isoformat()
+                for row_data in rows:
+                    row_data["Request_ID"] = str(self.next_request_id)
+                    self.next_request_id += 1
+                    row_data["Timestamp"] = timestamp
+                    ticket = self.audit_log.append(row_data)
+                    self._index_audit_row(row_data)
+            else:
+                self.sheets.setdefault(sheet_name, []).extend(rows)
+                if sheet_name in SHEET_INDEXES:
+                    for row_data in rows:
+                        self._index_row(sheet_name, row_data)
+                    self.caches[sheet_name].invalidate()
+            self.versions[sheet_name] = self.versions.get(sheet_name, 0) + 1
+            if sheet_name in SHEET_INDEXES:
+                self.journal[sheet_name].append((self.versions[sheet_name], frozenset(
+                    self._index_key(sheet_name, [row.get(col) for col in SHEET_INDEXES[sheet_name]]) for row in rows)))
+            matrix = self._policy_matrix
+            if sheet_name == "Software_Access_Policy" and matrix is not None and matrix.version == self.versions[sheet_name] - 1:
+                # Appended rows only add decisions, so the matrix is updated in place
+                matrix.apply(rows)
+                matrix.version = self.versions[sheet_name]
         if sheet_name == "Audit_Log":
-            row_data = row_data.copy()
-            row_data["Request_ID"] = str(self.next_request_id)
-            self.next_request_id += 1
-            row_data["Timestamp"] = datetime.datetime.now().isoformat()
-            self.sheets["Audit_Log"].append(row_data)
-        return row_data
+            # Outside the lock so concurrent appends can share one group commit
+            self.audit_log.sync(ticket)
+        return rows
 
 class MockGmail:
     def send_email(self, to: str, subject: str, body: str, cc: Optional[str] = None):
-        logger.info("[MOCK_GMAIL] To: %s Cc: %s Subject: %s Body: %s", to, cc, subject, body)
+        gmail_logger.info("[MOCK_GMAIL] To: %s Cc: %s Subject: %s (%d chars)", to, cc, subject, len(body))
+        gmail_logger.debug("[MOCK_GMAIL] Body: %s", body)
         return {"status": "success", "to": to, "subject": subject}
 
-mock_sheets_db = MockGoogleSheets()
+mock_sheets_db = MockGoogleSheets(
+    audit_log=open_audit_log(os.getenv("AUDIT_LOG_DIR")),
+    cache_staleness_seconds=float(os.getenv("SHEET_CACHE_MAX_STALENESS_SECONDS", "5")),
+    cache_max_entries=int(os.getenv("SHEET_CACHE_MAX_ENTRIES", "10000")),
+)
 mock_gmail_service = MockGmail()
+# Notifications are queued here and delivered by a background worker (see lifespan)
+email_outbox = EmailOutbox(mock_gmail_service.send_email, path=os.getenv("OUTBOX_PATH", ":memory:"))
 
 # ---------- Tools ----------
 def find_employee_by_email(email: str) -> str:
     """
     Looks up an employee by their email address and returns their role.
     """
-    employees = mock_sheets_db.read_sheet("Employee_Directory")
-    for emp in employees:
-        if emp["Employee_Email"].lower() == email.lower():
-            return f"Employee found: {emp['Employee_Name']}, Role: {emp['Role']}"
+    emp = mock_sheets_db.lookup("Employee_Directory", email)
+    if emp:
+        return f"Employee found: {emp['Employee_Name']}, Role: {emp['Role']}"
     return "Employee not found."
 
 def find_policy_for_user(software_name: str, user_role: str):
     """
     Looks up access policy for a given software and user role.
     """
-    return mock_sheets_db.find_row_matching("Software_Access_Policy", {"Software_Name": software_name, "Role": user_role})
+    policy = mock_sheets_db.find_row_matching("Software_Access_Policy", {"Software_Name": software_name, "Role": user_role})
+    return to_dict(policy) if policy is not None else None
 
 def check_audit_log_for_duplicate(employee_email: str, software_name: str):
     """
-    Checks if there's already a pending request for this employee and software.
+    Checks if there's already a pending or approved request for this employee and software.
     """
-    log = mock_sheets_db.read_sheet("Audit_Log")
-    for row in log:
-        if row.get("Employee_Email") == employee_email and row.get("Software_Name") == software_name:
-            return row
-    return None
+    entry = mock_sheets_db.latest_audit_entry(employee_email, software_name, open_only=True)
+    return to_dict(entry) if entry is not None else None
 
-def append_to_audit_log(employee_email: str, request_type: str, software_name: str, status: str, notes: str):
+async def append_to_audit_log(employee_email: str, request_type: str, software_name: str, status: str, notes: str):
     """
     Adds a new entry to the audit log.
     """
@@ -132,35 +494,49 @@ def append_to_audit_log(employee_email: str, request_type: str, software_name: s
         "Status": status,
         "Notes": notes
     }
-    return mock_sheets_db.append_to_sheet("Audit_Log", row)
+    if mock_sheets_db.audit_log.durable:
+        # Wait for the fsync off the event loop so concurrent requests share a group commit
+        return to_dict(await asyncio.to_thread(mock_sheets_db.append_to_sheet, "Audit_Log", row))
+    return to_dict(mock_sheets_db.append_to_sheet("Audit_Log", row))
+
+async def append_rows_to_audit_log(rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    # Batch form of append_to_audit_log for /requests/bulk (not an agent tool): one lock, one fsync
+    if mock_sheets_db.audit_log.durable:
+        return await asyncio.to_thread(mock_sheets_db.append_rows, "Audit_Log", rows)
+    return mock_sheets_db.append_rows("Audit_Log", rows)
 
-def send_gmail(to: str, subject: str, body: str, cc: Optional[str] = None):
+async def send_gmail(to: str, subject: str, body: str, cc: Optional[str] = None):
     """
-    Sends an email notification.
+    Sends an email notification. The email is queued for delivery and a message ID is returned.
     """
-    return mock_gmail_service.send_email(to=to, subject=subject, body=body, cc=cc)
+    if email_outbox.durable:
+        # The outbox commit syncs to disk; keep it off the event loop
+        message_id = await asyncio.to_thread(email_outbox.enqueue, to=to, subject=subject, body=body, cc=cc)
+    else:
+        message_id = email_outbox.enqueue(to=to, subject=subject, body=body, cc=cc)
+    return {"status": "queued", "message_id": message_id, "to": to, "subject": subject}
 
 def find_manager_email(employee_email: str) -> str:
     """
     Looks up the manager's email for a given employee.
     """
-    employees = mock_sheets_db.read_sheet("Employee_Directory")
-    for emp in employees:
-        if emp["Employee_Email"].lower() == employee_email.lower():
-            manager_email = emp.get("Manager_Email", "")
-            if manager_email:
-                return f"Manager email: {manager_email}"
-            else:
-                return "Manager email not found."
+    emp = mock_sheets_db.lookup("Employee_Directory", employee_email)
+    if emp:
+        manager_email = emp.get("Manager_Email", "")
+        if manager_email:
+            return f"Manager email: {manager_email}"
+        else:
+            return "Manager email not found."
     return "Employee not found."
 
-ALL_TOOLS = [
-    FunctionTool(func=find_employee_by_email),
-    FunctionTool(func=find_policy_for_user),
-    FunctionTool(func=check_audit_log_for_duplicate),
-    FunctionTool(func=append_to_audit_log),
-    FunctionTool(func=send_gmail),
-    FunctionTool(func=find_manager_email),
+# Wrapped as FunctionTools when the agent is built
+TOOL_FUNCTIONS = [
+    find_employee_by_email,
+    find_policy_for_user,
+    check_audit_log_for_duplicate,
+    append_to_audit_log,
+    send_gmail,
+    find_manager_email,
 ]
 
 # ---------- Agent ----------
@@ -231,29 +607,251 @@ Your role is to streamline the approval process by checking company policies and
 - Keep responses concise and professional
 """
 
+# Folds older turns into a summary once the workflow facts are known (see src/compaction.py).
+# Created with the first agent, since src.compaction imports google.genai.
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "2"))
+HISTORY_COMPACTION = os.getenv("HISTORY_COMPACTION", "on").lower() not in ("0", "off", "false", "no")
+history_compactor = None
+
+# One quota shared by every model call in the process (see src/rate_limit.py)
+model_rate_limiter = ModelRateLimiter(
+    rpm=int(os.getenv("GEMINI_RPM", "15")),
+    tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+)
+
+# Latency histograms and counters served at /metrics (see src/metrics.py)
+agent_metrics = AgentMetrics()
+email_outbox.observe_latency = lambda stage, seconds: agent_metrics.outbox_seconds.observe(seconds, stage)
+# Opt-in per-request span timelines (see src/tracing.py); TRACE_DIR also saves them as Chrome traces
+request_tracer = RequestTracer(trace_dir=os.getenv("TRACE_DIR"))
+
+# Concurrent identical requests share one workflow; turns on one session run one at a time (see src/coordination.py)
+request_coalescer = RequestCoalescer(timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "30")))
+session_locks = SessionLocks()
+
 def create_it_guardian_agent():
-    llm_provider = Gemini()
+    global history_compactor
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.function_tool import FunctionTool
+    from src.compaction import HistoryCompactor
+    from src.llm_providers import create_llm
+
+    if history_compactor is None:
+        history_compactor = HistoryCompactor(
+            keep_turns=HISTORY_KEEP_TURNS, enabled=HISTORY_COMPACTION,
+            observe_prompt=lambda stage, tokens: agent_metrics.prompt_tokens.observe(tokens, stage))
+    llm_provider = create_llm(
+        LLM_PROVIDER,
+        software_names=mock_sheets_db.software_names,
+        latency_seconds=float(os.getenv("SCRIPTED_LLM_LATENCY_MS", "0")) / 1000,
+        jitter_seconds=float(os.getenv("SCRIPTED_LLM_JITTER_MS", "0")) / 1000,
+        cassette_path=LLM_CASSETTE_PATH,
+        cassette_mode=LLM_CASSETTE_MODE,
+    )
     return LlmAgent(
         name="AccessBot",
         model=llm_provider,
-        tools=ALL_TOOLS,
-        instruction=AGENT_INSTRUCTIONS
+        tools=[FunctionTool(func=f) for f in TOOL_FUNCTIONS],
+        instruction=AGENT_INSTRUCTIONS,
+        # Compaction runs first so the limiter charges the compacted prompt;
+        # the Gemini quota does not apply to the scripted model or a replay.
+        # Metrics run last so model-call latency excludes rate-limit waits.
+        before_model_callback=[request_tracer.before_model_start, history_compactor.before_model]
+        + ([model_rate_limiter.before_model] if CALLS_GEMINI else [])
+        + [agent_metrics.before_model, request_tracer.before_model],
+        after_model_callback=[history_compactor.after_model]
+        + ([model_rate_limiter.after_model] if CALLS_GEMINI else [])
+        + [agent_metrics.after_model, request_tracer.after_model],
+        # The single-flight wait is not counted as tool latency
+        before_tool_callback=[request_coalescer.before_tool, agent_metrics.before_tool, request_tracer.before_tool],
+        after_tool_callback=[request_coalescer.after_tool, agent_metrics.after_tool, request_tracer.after_tool],
+        on_tool_error_callback=[agent_metrics.on_tool_error, request_tracer.on_tool_error],
+        after_agent_callback=request_coalescer.after_agent,
     )
 
-def build_agent() -> Agent:
+def build_agent() -> "LlmAgent":
     """
     Factory function to return an instance of your IT Guardian Agent.
     Used by local evaluation scripts.
     """
     return create_it_guardian_agent()
 
+# ---------- Fast path ----------
+# Complete "I am <email>, I need <software>" grant requests are resolved in
+# plain Python with the same tools the agent would call, and answered from a
+# template. Anything unusual (unknown employee, no policy, de-provisioning,
+# missing manager) returns None and goes through the LLM as before.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "").lower() in ("1", "true", "yes")
+
+# A fast-path message must ask for access in so many words...
+ACCESS_REQUEST_WORDS = {"need", "needs", "want", "wants", "request", "requesting", "give", "grant", "get", "access"}
+# ...and must not take it away, ask about it or be about anyone else
+NOT_A_GRANT_WORDS = DEPROVISION_WORDS | {"away", "drop", "stop", "withdraw", "suspend", "terminate", "status", "pending", "approved"}
+QUESTION_WORDS = {"what", "whats", "does", "do", "did", "is", "are", "has", "have", "can", "could", "will", "would",
+                  "should", "when", "where", "why", "who", "which", "how"}
+NEGATION_PATTERN = re.compile(r"\b(?:no|not|never|without|cannot|nothing)\b|n['’]t\b")
+# The email must introduce the speaker: at the start, or after "I am", "this is", "my email is", ...
+SELF_INTRODUCTION_PATTERN = re.compile(r"(?:^|\b(?:i am|i'm|im|this is|it's|it is|it's me|it is me|my email is|my email))\W*$")
+
+def extract_fast_path_request(text: str):
+    """
+    Pulls (email, software_name) out of a plain "I am <email>, I need <software>"
+    request. Returns None for anything else: removals, negations, questions,
+    messages naming someone else's email, or no software the policy knows.
+    """
+    emails = {m.group(0).rstrip(".").lower() for m in EMAIL_PATTERN.finditer(text)}
+    if len(emails) != 1:
+        return None
+    email_match = EMAIL_PATTERN.search(text)
+    if not SELF_INTRODUCTION_PATTERN.search(text[:email_match.start()].lower()):
+        return None
+    words = message_words(text)
+    if ("?" in text or NEGATION_PATTERN.search(EMAIL_PATTERN.sub(" ", text).lower()) or NOT_A_GRANT_WORDS.intersection(words)
+            or not ACCESS_REQUEST_WORDS.intersection(words) or (words and words[0] in QUESTION_WORDS)):
+        return None
+    software_name = find_software_name(words, mock_sheets_db.software_names)
+    return (email_match.group(0).rstrip("."), software_name) if software_name else None
+
+async def run_fast_path(employee_email: str, software_name: str) -> Optional[str]:
+    """
+    Runs Workflow A/B (plus the duplicate check) without the LLM.
+    Returns the reply text, or None if the request needs the agent.
+    """
+    emp = mock_sheets_db.lookup("Employee_Directory", employee_email)
+    if not emp:
+        return None
+    # Same single-flight claim the agent takes at its duplicate check
+    owner = f"fast-{uuid.uuid4()}"
+    await request_coalescer.acquire(request_coalescer.key(emp["Employee_Email"], software_name), owner)
+    try:
+        return await fast_path_workflow(emp, software_name)
+    finally:
+        request_coalescer.release_owner(owner)
+
+async def fast_path_workflow(emp: Dict[str, str], software_name: str) -> Optional[str]:
+    employee_email = emp["Employee_Email"]
+    existing = check_audit_log_for_duplicate(employee_email, software_name)
+    if existing:
+        return (f"You already have a request for {software_name} (Request ID {existing['Request_ID']}, "
+                f"status: {existing['Status']}). I haven't created a new one.")
+
+    policy = find_policy_for_user(software_name, emp["Role"])
+    if not policy:
+        return None
+    it_contact = policy["Approval_Contact_Email"]
+    details = (f"Employee: {emp['Employee_Name']} ({employee_email})\n"
+               f"Role: {emp['Role']}\nSoftware: {software_name}\n")
+
+    if policy["Requires_Manager_Approval"] == "No":
+        entry = await append_to_audit_log(employee_email, "Grant", software_name, "Approved", "Auto-approved by policy")
+        await send_gmail(
+            to=it_contact,
+            subject=f"Access Request Approved: {software_name} for {emp['Employee_Name']}",
+            body=f"{details}Request ID: {entry['Request_ID']}\nAuto-approved per the {emp['Role']} access policy. Please provision access.",
+        )
+        return (f"Hi {emp['Employee_Name']}, your request for {software_name} has been approved automatically "
+                f"under the {emp['Role']} policy. IT support has been notified to provision access. "
+                f"Request ID: {entry['Request_ID']}.")
+
+    manager_email = emp.get("Manager_Email", "")
+    if not manager_email:
+        return None
+    entry = await append_to_audit_log(employee_email, "Grant", software_name, "Pending Manager Approval", "Policy requires manager approval")
+    await send_gmail(
+        to=manager_email,
+        cc=it_contact,
+        subject=f"Access Request Requires Your Approval: {software_name} for {emp['Employee_Name']}",
+        body=f"{details}Request ID: {entry['Request_ID']}\nPolicy requires manager approval. Please approve or reject this request.",
+    )
+    return (f"Hi {emp['Employee_Name']}, {software_name} access requires manager approval for the {emp['Role']} role. "
+            f"I've sent the request to your manager ({manager_email}) and copied IT support. "
+            f"Request ID: {entry['Request_ID']}.")
+
 # ---------- FastAPI App ----------
-app = FastAPI(title="IT Access Guardian Agent")
+@asynccontextmanager
+def _log_warmup_failure(task: asyncio.Task):
+    # Requests still build the agent on first use, but the cause is logged here
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("[STARTUP] agent warm-up failed", exc_info=task.exception())
+
+async def lifespan(app: FastAPI):
+    email_outbox.start()
+    # Build the agent in the background so the server accepts connections (and
+    # answers /healthz) at once; requests arriving earlier wait for it.
+    warmup = asyncio.create_task(get_runner())
+    warmup.add_done_callback(_log_warmup_failure)
+    jobs = []
+    if HR_DIRECTORY_CSV:
+        jobs.append(asyncio.create_task(refresh_directory_periodically(HR_DIRECTORY_CSV, HR_DIRECTORY_REFRESH_SECONDS)))
+    if RECERTIFICATION_INTERVAL_SECONDS > 0:
+        jobs.append(asyncio.create_task(recertifier.run_periodically(RECERTIFICATION_INTERVAL_SECONDS)))
+    yield
+    for job in jobs:
+        job.cancel()
+    if jobs:
+        await asyncio.wait(jobs)
+    warmup.cancel()  # the build thread finishes on its own; shutdown need not wait for it
+    await asyncio.wait([warmup])
+    close_sessions = getattr(_session_store, "close", None)
+    if close_sessions is not None:
+        await close_sessions()
+    await email_outbox.stop()
+
+app = FastAPI(title="IT Access Guardian Agent", lifespan=lifespan)
 APP_NAME = "it-access-guardian"
 
-session_store = InMemorySessionService()
-agent = create_it_guardian_agent()
-runner = Runner(agent=agent, app_name=APP_NAME, session_service=session_store)
+# Bounds concurrent and queued agent runs in front of the model quota
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+    observe_wait=agent_metrics.admission_wait_seconds.observe,
+)
+
+# ---------- Agent runtime ----------
+# The session store, agent and Runner all need ADK, so they are built on first
+# use (normally by the lifespan warm-up) instead of at import time. Reading
+# `session_store`, `agent` or `runner` from this module builds them.
+RUNTIME_ATTRIBUTES = ("session_store", "agent", "runner")
+_session_store = None
+_agent = None
+_runner = None
+_runtime_lock = threading.Lock()
+
+def create_session_store():
+    from src.session_services import BoundedSessionService, SqliteSessionService
+
+    if os.getenv("SESSION_DB_PATH"):
+        # Shared by every uvicorn worker on this machine
+        return SqliteSessionService(os.getenv("SESSION_DB_PATH"))
+    return BoundedSessionService(
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+        idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
+
+def build_runtime():
+    """Builds the session store, agent and Runner once. Blocking; safe to call from any thread."""
+    global _session_store, _agent, _runner
+    with _runtime_lock:
+        if _runner is None:
+            start = time.perf_counter()
+            from google.adk.runners import Runner
+
+            _session_store = create_session_store()
+            _agent = create_it_guardian_agent()
+            _runner = Runner(agent=_agent, app_name=APP_NAME, session_service=_session_store)
+            logger.info("[STARTUP] agent ready in %.2fs", time.perf_counter() - start)
+    return _runner
+
+async def get_runner():
+    """The Runner, built off the event loop if it does not exist yet."""
+    return _runner if _runner is not None else await asyncio.to_thread(build_runtime)
+
+def __getattr__(name: str):
+    if name in RUNTIME_ATTRIBUTES:
+        build_runtime()
+        return globals()["_" + name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---------- Request Models ----------
 class AdkInvokeIn(BaseModel):
@@ -264,88 +862,485 @@ class AdkInvokeIn(BaseModel):
 class InvokeOut(BaseModel):
     text: str
     session_id: str
+    trace: Optional[Dict[str, Any]] = None  # span timeline, only when tracing was requested
 
 # Optional endpoint to create session explicitly
 @app.post("/session")
 async def create_session():
-    session = await session_store.create_session(app_name=APP_NAME, user_id="default_user")
+    await get_runner()
+    session = await _session_store.create_session(app_name=APP_NAME, user_id="default_user")
     return {"session_id": session.id}
 
+async def get_or_create_session_id(session_id: Optional[str], user_id: str) -> str:
+    """
+    Returns a usable session ID. A session that was evicted from the bounded
+    store is recreated under the same ID so the client can keep using it.
+    """
+    await get_runner()
+    if session_id and await _session_store.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id):
+        return session_id
+    if session_id:
+        logger.info("Session %s expired or unknown; starting a new conversation under the same ID", session_id)
+    new_sess = await _session_store.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    return new_sess.id
+
+async def try_fast_path(session_id: str, user_id: str, text: str) -> Optional[str]:
+    """
+    Answers a complete grant request without the LLM and records the turn in
+    the session so later LLM turns still see it. Returns None to fall back.
+    """
+    from google.adk.events import Event
+    from google.genai import types
+
+    request = extract_fast_path_request(text)
+    if not request:
+        return None
+    session = await _session_store.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if session is None:
+        return None
+    reply = await run_fast_path(*request)
+    if reply is None:
+        return None
+    invocation_id = f"fast-{uuid.uuid4()}"
+    await _session_store.append_event(session, Event(
+        invocation_id=invocation_id, author="user",
+        content=types.Content(role="user", parts=[types.Part(text=text)]),
+    ))
+    await _session_store.append_event(session, Event(
+        invocation_id=invocation_id, author=_agent.name,
+        content=types.Content(role="model", parts=[types.Part(text=reply)]),
+    ))
+    logger.info("[FAST_PATH] handled %s / %s without the LLM", *request)
+    return reply
+
 # ---------- /invoke endpoint ----------
-@app.post("/invoke", response_model=InvokeOut)
-async def invoke_agent(input: AdkInvokeIn):
-    import asyncio
-    
-    # Retry configuration
+def is_quota_error(e: Exception) -> bool:
+    return getattr(e, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(e)
+
+async def run_agent_turn(session_id: str, user_id: str, text: str) -> InvokeOut:
+    """Runs one agent turn, retrying when the model returns nothing or fails."""
+    from google.genai import types
+
     max_retries = 3
-    retry_delay = 2  # seconds
-    
+    quota_pause = 2  # seconds; all model calls wait this long after a 429
+
     for attempt in range(max_retries):
         try:
-            # 1️⃣ Get or create session
-            session_id = input.session_id
-            if not session_id:
-                # Only create new session if no session_id was provided
-                new_sess = await session_store.create_session(app_name=APP_NAME, user_id="default_user")
-                session_id = new_sess.id
-            # If session_id was provided, use it as-is (Runner handles session persistence)
-
-            # 2️⃣ Build Content
-            new_message = types.Content(role="user", parts=[Part(text=input.text)])
-
-            # 3️⃣ Run agent
+            # Build Content and run the agent; model calls are paced by model_rate_limiter
+            new_message = types.Content(role="user", parts=[types.Part(text=text)])
             response_text = ""
-            user_id = "default_user"
-            agen = runner.run_async(session_id=session_id, user_id=user_id, new_message=new_message)
-            try:
-                async for event in agen:
-                    if getattr(event, "content", None) and getattr(event.content, "parts", None):
-                        for p in event.content.parts:
-                            if getattr(p, "text", None):
-                                response_text += p.text
-                    if getattr(event, "is_final", None) and event.is_final():
-                        break
-            finally:
+            invocation_id = None
+            agen = _runner.run_async(session_id=session_id, user_id=user_id, new_message=new_message)
+            with maybe_span("agent_run", attempt=attempt + 1) as span:
                 try:
-                    await agen.aclose()
-                except Exception:
-                    pass
+                    async for event in agen:
+                        invocation_id = event.invocation_id
+                        request_tracer.record_event(event)
+                        if getattr(event, "content", None) and getattr(event.content, "parts", None):
+                            for p in event.content.parts:
+                                if getattr(p, "text", None):
+                                    response_text += p.text
+                        if getattr(event, "is_final", None) and event.is_final():
+                            break
+                except Exception as e:
+                    if span is not None:
+                        span["error"] = str(e)
+                    raise
+                finally:
+                    try:
+                        await agen.aclose()
+                    except Exception:
+                        pass
+                    # Closing the run early skips after_agent_callback, so release claims here
+                    if invocation_id:
+                        request_coalescer.release_owner(invocation_id)
 
             if not response_text:
-                error_msg = f"Agent returned no text (attempt {attempt + 1}/{max_retries})"
-                logger.warning(error_msg)
-                
+                logger.warning(f"Agent returned no text (attempt {attempt + 1}/{max_retries})")
                 if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
+                    agent_metrics.invoke_retries.inc("empty_response")
                     continue
-                else:
-                    # Provide a helpful error message instead of failing
-                    return InvokeOut(
-                        text="I apologize, but I'm having trouble processing your request right now. This might be due to API rate limits. Please try again in a moment.",
-                        session_id=session_id
-                    )
+                # Provide a helpful error message instead of failing
+                return InvokeOut(
+                    text="I apologize, but I'm having trouble processing your request right now. This might be due to API rate limits. Please try again in a moment.",
+                    session_id=session_id
+                )
 
             return InvokeOut(text=response_text, session_id=session_id)
-            
+
         except Exception as e:
-            error_msg = f"Error in invoke_agent (attempt {attempt + 1}/{max_retries}): {str(e)}"
-            logger.error(error_msg)
-            
+            logger.error(f"Error in invoke_agent (attempt {attempt + 1}/{max_retries}): {str(e)}")
             if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                await asyncio.sleep(retry_delay)
-                retry_delay *= 2
+                if is_quota_error(e):
+                    # Quota estimate was off; hold back every caller, not just this one
+                    model_rate_limiter.pause(quota_pause)
+                    quota_pause *= 2
+                agent_metrics.invoke_retries.inc("quota" if is_quota_error(e) else "error")
                 continue
+            raise HTTPException(
+                status_code=500,
+                detail=f"Agent failed after {max_retries} attempts: {str(e)}"
+            )
+
+def busy_response(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def trace_requested(request: Request) -> bool:
+    flag = request.headers.get("X-Trace") or request.query_params.get("trace") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+@app.post("/invoke", response_model=InvokeOut, response_model_exclude_none=True)
+async def invoke_agent(input: AdkInvokeIn, request: Request):
+    with agent_metrics.track_request("/invoke") as request_metrics, \
+            request_tracer.trace("/invoke", trace_requested(request)) as trace:
+        try:
+            result = await handle_invoke(input, request_metrics)
+        except HTTPException as e:
+            agent_metrics.invoke_errors.inc("/invoke", str(e.status_code))
+            if trace is not None:
+                logger.info("[TRACE] failed request: %s", json.dumps(request_tracer.finish(trace)))
+            raise
+        if trace is not None:
+            result.trace = request_tracer.finish(trace)
+        return result
+
+async def handle_invoke(input: AdkInvokeIn, request_metrics: Dict[str, Any]) -> InvokeOut:
+    # Turns on the same session run one at a time, so their events never interleave
+    async with session_locks.hold(input.session_id):
+        # 1️⃣ Get or create session (Runner handles persistence of an existing one)
+        user_id = "default_user"
+        with maybe_span("session"):
+            session_id = await get_or_create_session_id(input.session_id, user_id)
+
+        # 2️⃣ Deterministic fast path: no model calls, so no admission needed
+        if FAST_PATH_ENABLED:
+            with maybe_span("fast_path") as span:
+                reply = await try_fast_path(session_id, user_id, input.text)
+                if span is not None:
+                    span["answered"] = bool(reply)
+            if reply:
+                request_metrics["route"] = "fast_path"
+                return InvokeOut(text=reply, session_id=session_id)
+
+        # 3️⃣ Run the agent once admitted; overflow gets an immediate 429 + Retry-After
+        try:
+            async with admission.slot():
+                return await run_agent_turn(session_id, user_id, input.text)
+        except AdmissionRejected as e:
+            request_metrics["route"] = "rejected"
+            raise busy_response(e)
+
+# ---------- /invoke/stream endpoint (Server-Sent Events) ----------
+# Progress messages shown while a tool call is in flight
+TOOL_PROGRESS = {
+    "find_employee_by_email": "Looking up your employee record…",
+    "find_policy_for_user": "Checking policy…",
+    "check_audit_log_for_duplicate": "Checking for existing requests…",
+    "append_to_audit_log": "Logging request…",
+    "send_gmail": "Sending notification…",
+    "find_manager_email": "Finding your manager…",
+}
+
+def sse_event(name: str, data: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/invoke/stream")
+async def invoke_agent_stream(input: AdkInvokeIn):
+    """
+    Same as /invoke, but streams `session`, `progress` and `text` events while
+    the agent runs, then a `done` event carrying the full reply, time to first
+    byte and total latency (ms). Failures are reported as an `error` event.
+    """
+    start = time.perf_counter()
+    user_id = "default_user"
+    async with AsyncExitStack() as stack:
+        # Taken before admission so a queued turn on a busy session does not hold a slot
+        await stack.enter_async_context(session_locks.hold(input.session_id))
+        session_id = await get_or_create_session_id(input.session_id, user_id)
+        # Deterministic fast path: no model calls, so no admission needed (as in /invoke)
+        fast_reply = await try_fast_path(session_id, user_id, input.text) if FAST_PATH_ENABLED else None
+        if not fast_reply:
+            try:
+                await stack.enter_async_context(admission.slot())
+            except AdmissionRejected as e:
+                agent_metrics.invoke_errors.inc("/invoke/stream", "429")
+                raise busy_response(e)
+        # Handed to the stream: the slot and session lock are held until it is finished or abandoned
+        held = stack.pop_all()
+
+    async def event_stream():
+        async with held:
+            with agent_metrics.track_request("/invoke/stream", start=start) as request_metrics:
+                async for chunk in run_stream(request_metrics):
+                    yield chunk
+
+    async def run_stream(request_metrics: Dict[str, Any]):
+        first_byte_ms = None
+        response_text = ""
+
+        def emit(name: str, data: Dict[str, Any]) -> str:
+            nonlocal first_byte_ms
+            if first_byte_ms is None and name in ("progress", "text"):
+                first_byte_ms = (time.perf_counter() - start) * 1000
+            return sse_event(name, data)
+
+        yield sse_event("session", {"session_id": session_id})
+        try:
+            if fast_reply:
+                request_metrics["route"] = "fast_path"
+                response_text = fast_reply
+                yield emit("text", {"text": fast_reply})
             else:
-                # Last attempt failed
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Agent failed after {max_retries} attempts: {str(e)}"
-                )
+                from google.adk.agents.run_config import RunConfig, StreamingMode
+                from google.genai import types
+
+                new_message = types.Content(role="user", parts=[types.Part(text=input.text)])
+                run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+                streamed_partial = False
+                invocation_id = None
+                agen = _runner.run_async(session_id=session_id, user_id=user_id, new_message=new_message, run_config=run_config)
+                try:
+                    async for event in agen:
+                        invocation_id = event.invocation_id
+                        parts = event.content.parts if event.content and event.content.parts else []
+                        for p in parts:
+                            if p.function_call:
+                                message = TOOL_PROGRESS.get(p.function_call.name, f"Running {p.function_call.name}…")
+                                yield emit("progress", {"tool": p.function_call.name, "message": message})
+                            elif p.text:
+                                # With SSE streaming the final event repeats the partial chunks
+                                if event.partial:
+                                    streamed_partial = True
+                                elif streamed_partial:
+                                    continue
+                                response_text += p.text
+                                yield emit("text", {"text": p.text})
+                        if not event.partial:
+                            streamed_partial = False
+                finally:
+                    try:
+                        await agen.aclose()
+                    except Exception:
+                        pass
+                    if invocation_id:
+                        request_coalescer.release_owner(invocation_id)
+        except Exception as e:
+            logger.error("Error in invoke_agent_stream: %s", e)
+            agent_metrics.invoke_errors.inc("/invoke/stream", "error")
+            yield sse_event("error", {"detail": str(e), "session_id": session_id})
+            return
+
+        total_ms = (time.perf_counter() - start) * 1000
+        logger.info("[STREAM] session=%s ttfb_ms=%.1f total_ms=%.1f", session_id, first_byte_ms or total_ms, total_ms)
+        yield sse_event("done", {
+            "text": response_text,
+            "session_id": session_id,
+            "ttfb_ms": round(first_byte_ms if first_byte_ms is not None else total_ms, 1),
+            "total_ms": round(total_ms, 1),
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# ---------- /requests/bulk endpoint ----------
+# Bulk uploads (onboarding waves, reorganizations) run the agent's workflow in
+# plain Python, like the fast path. Each batch of rows is decided in order with
+# the same lookups and duplicate check, then its Audit_Log rows are appended
+# together and its notifications queued together. Unknown employees and
+# malformed rows are reported back to the uploader, who can fix the file,
+# instead of being logged and mailed to IT and HR one by one.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+# Copied on removals, which have no policy to name a contact
+BULK_IT_CONTACT = "it-support@company.demo"
+
+async def run_bulk_batch(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Processes one batch of parsed rows and returns one outcome per row, in order."""
+    # Same single-flight claims the agent takes, held until the batch is appended
+    owner = f"bulk-{uuid.uuid4()}"
+    try:
+        return await bulk_batch_workflow(records, owner)
+    finally:
+        request_coalescer.release_owner(owner)
+
+async def bulk_batch_workflow(records: List[Dict[str, Any]], owner: str) -> List[Dict[str, Any]]:
+    outcomes = []
+    appends = []      # (outcome, audit row, notification or None)
+    in_batch = {}     # coalescer key -> outcome of a Grant row appended earlier in this batch
+    policies = {}     # (software, role) -> policy row; each pair is evaluated once per batch
+    for record in records:
+        outcome = {"line": record["line"]}
+        outcomes.append(outcome)
+        if "error" in record:
+            outcome.update(outcome="invalid", detail=record["error"])
+            continue
+        software_name = mock_sheets_db.software_names.get(record["software"].lower(), record["software"])
+        request_type = record["request_type"]
+        outcome.update(employee_email=record["employee_email"], software=software_name, request_type=request_type)
+        emp = mock_sheets_db.lookup("Employee_Directory", record["employee_email"])
+        if not emp:
+            outcome.update(outcome="employee_not_found", detail="Email not in Employee_Directory")
+            continue
+        employee_email = emp["Employee_Email"]
+        key = request_coalescer.key(employee_email, software_name)
+        await request_coalescer.acquire(key, owner)
+
+        if request_type == "Grant":
+            earlier = in_batch.get(key)
+            existing = check_audit_log_for_duplicate(employee_email, software_name)
+            if earlier is not None or existing:
+                outcome.update(outcome="duplicate", detail=(
+                    f"Same request as line {earlier['line']}" if earlier is not None
+                    else f"Request ID {existing['Request_ID']} is {existing['Status']}"))
+                continue
+            policy_key = (software_name, emp["Role"])
+            if policy_key not in policies:
+                policies[policy_key] = find_policy_for_user(software_name, emp["Role"])
+            policy = policies[policy_key]
+            it_contact = policy["Approval_Contact_Email"] if policy else BULK_IT_CONTACT
+            if policy and policy["Requires_Manager_Approval"] == "No":
+                status, notes = "Approved", "Auto-approved by policy"
+                notification = {"to": it_contact, "subject": f"Access Request Approved: {software_name} for {emp['Employee_Name']}",
+                                "tail": f"Auto-approved per the {emp['Role']} access policy. Please provision access."}
+            else:
+                status = "Pending Manager Approval"
+                notes = "Policy requires manager approval" if policy else "No policy for role"
+                notification = {"to": emp.get("Manager_Email") or it_contact, "cc": it_contact,
+                                "subject": f"Access Request Requires Your Approval: {software_name} for {emp['Employee_Name']}",
+                                "tail": f"{notes}. Please approve or reject this request."}
+        else:
+            status, notes = "Pending Deprovisioning", "Removal requested in bulk upload"
+            notification = {"to": emp.get("Manager_Email") or BULK_IT_CONTACT, "cc": BULK_IT_CONTACT,
+                            "subject": f"Access Removal Confirmation: {software_name} for {emp['Employee_Name']}",
+                            "tail": "Removal requested in a bulk upload. Please confirm."}
+        outcome.update(outcome=status.lower().replace(" ", "_"), detail=notes)
+        if request_type == "Grant":
+            in_batch[key] = outcome
+        notification["details"] = (f"Employee: {emp['Employee_Name']} ({employee_email})\n"
+                                   f"Role: {emp['Role']}\nSoftware: {software_name}\n")
+        appends.append((outcome, {"Employee_Email": employee_email, "Request_Type": request_type,
+                                  "Software_Name": software_name, "Status": status, "Notes": notes}, notification))
+
+    entries = await append_rows_to_audit_log([row for _, row, _ in appends])
+    messages = []
+    for (outcome, _, notification), entry in zip(appends, entries):
+        outcome["request_id"] = entry["Request_ID"]
+        messages.append({"to": notification["to"], "cc": notification.get("cc"), "subject": notification["subject"],
+                         "body": f"{notification['details']}Request ID: {entry['Request_ID']}\n{notification['tail']}"})
+    if email_outbox.durable:
+        await asyncio.to_thread(email_outbox.enqueue_many, messages)
+    else:
+        email_outbox.enqueue_many(messages)
+    return outcomes
+
+@app.post("/requests/bulk")
+async def bulk_access_requests(request: Request):
+    """
+    Processes a CSV or JSON-lines upload of access requests without the model
+    (see src/bulk_requests.py for the formats) and streams back one NDJSON
+    outcome per row, in input order, followed by a `summary` line.
+    """
+    fmt = bulk_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+    start = time.perf_counter()
+    batches = read_batches(request.stream(), BulkRequestParser(fmt), BULK_BATCH_SIZE)
+    # Read the first batch up front so a bad CSV header is a 400, not a broken stream
+    try:
+        first = await anext(batches, None)
+    except BulkFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def outcome_stream():
+        counts: Dict[str, int] = {}
+        batch = first
+        try:
+            while batch is not None:
+                outcomes = await run_bulk_batch(batch)
+                for outcome in outcomes:
+                    counts[outcome["outcome"]] = counts.get(outcome["outcome"], 0) + 1
+                yield "".join(json.dumps(o) + "\n" for o in outcomes)
+                batch = await anext(batches, None)
+        except Exception as e:
+            logger.error("[BULK] upload failed after %d rows: %s", sum(counts.values()), e)
+            yield json.dumps({"error": str(e)}) + "\n"
+        for name, count in counts.items():
+            agent_metrics.bulk_rows.inc(name, amount=count)
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        logger.info("[BULK] %d rows in %.2fs: %s", rows, elapsed, counts)
+        yield json.dumps({"summary": {"rows": rows, "outcomes": counts, "elapsed_ms": round(elapsed * 1000, 1),
+                                      "rows_per_second": round(rows / elapsed) if elapsed else None}}) + "\n"
+
+    return StreamingResponse(outcome_stream(), media_type="application/x-ndjson")
+
+# ---------- Directory import ----------
+# Employee_Directory is loaded from the HR export at HR_DIRECTORY_CSV at
+# startup and again every HR_DIRECTORY_REFRESH_SECONDS, as a delta against
+# the current rows (see src/directory_import.py).
+HR_DIRECTORY_CSV = os.getenv("HR_DIRECTORY_CSV")
+HR_DIRECTORY_REFRESH_SECONDS = float(os.getenv("HR_DIRECTORY_REFRESH_SECONDS", "86400"))
+
+async def refresh_directory_periodically(path: str, interval_seconds: float):
+    """Imports the HR export now and then every interval_seconds; a failed import keeps the current directory."""
+    while True:
+        try:
+            await asyncio.to_thread(import_directory, mock_sheets_db, path)
+        except Exception as e:
+            logger.error("[DIRECTORY] import of %s failed: %s", path, e)
+        await asyncio.sleep(interval_seconds)
+
+# ---------- Access recertification ----------
+# Flags Approved grants that current directory and policy no longer allow and
+# batches the removal notices (see src/recertification.py). Runs every
+# RECERTIFICATION_INTERVAL_SECONDS while the server is up; 0 disables it.
+RECERTIFICATION_INTERVAL_SECONDS = float(os.getenv("RECERTIFICATION_INTERVAL_SECONDS", "0"))
+recertifier = Recertifier(mock_sheets_db, append_rows_to_audit_log, send_gmail, BULK_IT_CONTACT)
+
+# ---------- /healthz endpoint ----------
+@app.get("/healthz")
+async def healthz():
+    """Readiness probe: 503 while the agent is still being built, 200 once requests run without waiting."""
+    if _runner is None:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
+# ---------- /metrics endpoint ----------
+agent_metrics.gauge("accessbot_sessions", "Sessions held by the session store.",
+                    lambda: _session_store.stats()["sessions"] if _session_store is not None else None)
+agent_metrics.gauge("accessbot_audit_log_rows", "Rows in the Audit_Log.",
+                    lambda: len(mock_sheets_db.audit_log.rows))
+agent_metrics.gauge("accessbot_outbox_queue_depth", "Emails waiting in the outbox.", email_outbox.queue_depth)
+agent_metrics.gauge("accessbot_admission_active", "Agent requests running.", lambda: admission.active)
+agent_metrics.gauge("accessbot_admission_queued", "Agent requests waiting for a slot.", lambda: admission.queued)
+for cache_name, sheet_name in (("policy", "Software_Access_Policy"), ("directory", "Employee_Directory")):
+    agent_metrics.gauge(f"accessbot_{cache_name}_cache_hits_total", f"{sheet_name} lookups answered from the cache.",
+                        lambda sheet=sheet_name: mock_sheets_db.caches[sheet].hits, kind="counter")
+    agent_metrics.gauge(f"accessbot_{cache_name}_cache_misses_total", f"{sheet_name} lookups read from the sheet.",
+                        lambda sheet=sheet_name: mock_sheets_db.caches[sheet].misses, kind="counter")
+    agent_metrics.gauge(f"accessbot_{cache_name}_cache_invalidations_total", f"Times the {sheet_name} cache was dropped after a change.",
+                        lambda sheet=sheet_name: mock_sheets_db.caches[sheet].invalidations, kind="counter")
+    agent_metrics.gauge(f"accessbot_{cache_name}_cache_evictions_total", f"{sheet_name} entries evicted to stay within SHEET_CACHE_MAX_ENTRIES.",
+                        lambda sheet=sheet_name: mock_sheets_db.caches[sheet].evictions, kind="counter")
+    agent_metrics.gauge(f"accessbot_{cache_name}_cache_staleness_seconds", f"Seconds since the {sheet_name} version was last checked.",
+                        lambda sheet=sheet_name: mock_sheets_db.caches[sheet].staleness())
+agent_metrics.gauge("accessbot_recertification_last_run_seconds", "Duration of the last recertification run.",
+                    lambda: recertifier.last_report["elapsed_ms"] / 1000 if recertifier.last_report else None)
+agent_metrics.gauge("accessbot_recertification_grants_evaluated", "Grants checked by the last recertification run.",
+                    lambda: recertifier.last_report["evaluated"] if recertifier.last_report else None)
+agent_metrics.gauge("accessbot_recertification_revocations_total", "Grants flagged for deprovisioning by recertification.",
+                    lambda: recertifier.revoked_total, kind="counter")
+agent_metrics.gauge("accessbot_log_records_dropped", "Log records dropped because the log queue was full.", lambda: log_sink.dropped)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of latency histograms, retry counters and store sizes."""
+    refresh_session_stats = getattr(_session_store, "refresh_stats", None)
+    if refresh_session_stats is not None:
+        await refresh_session_stats()
+    return PlainTextResponse(agent_metrics.render(), media_type="text/plain; version=0.0.4")
 
 # ---------- Run ----------
 if __name__ == "__main__":
+    import uvicorn
+
     logger.info("Starting IT Access Guardian Agent server on http://127.0.0.1:8000")
     uvicorn.run(app, host="127.0.0.1", port=8000)
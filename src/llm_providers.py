@@ -0,0 +1,299 @@
+# Model providers for the agent.
+#
+# "gemini" is the real model. "scripted" is a deterministic stand-in that
+# plays the access request workflow from AGENT_INSTRUCTIONS with plain rules:
+# it reads the conversation in the LlmRequest, issues the FunctionTool calls
+# the real agent would make for the known intents, and answers from
+# templates. With injectable latency it lets the server (FastAPI, Runner,
+# tools, storage) be tested and load-tested offline, without an API key.
+#
+# Either provider can be wrapped in a CassetteLlm, which records every model
+# request/response pair to a JSONL cassette, or replays them from it with no
+# network at all.
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+from src.text_patterns import (CHARS_PER_TOKEN, DEPROVISION_WORDS, EMAIL_PATTERN, EMPLOYEE_FOUND_PATTERN, WORD_PATTERN,
+                               find_software_name, message_words, tool_result)
+
+logger = logging.getLogger("it-access-guardian")
+
+LLM_PROVIDERS = ("gemini", "scripted")
+
+IT_SUPPORT_EMAIL = "it-support@company.demo"
+HR_ONBOARDING_EMAIL = "hr-onboarding@company.demo"
+
+def _user_texts(contents: List[types.Content]) -> List[str]:
+    return [p.text for c in contents if c.role == "user" for p in c.parts or [] if p.text]
+
+class ScriptedLlm(BaseLlm):
+    """
+    Deterministic rule-based model for offline runs and load tests.
+
+    software_names maps lower-cased software names to their canonical form
+    (MockGoogleSheets.software_names). latency_seconds (+/- jitter_seconds) is
+    slept before every response to imitate model round-trips.
+    """
+
+    model: str = "scripted"
+    software_names: Any = None  # kept by reference so later policy changes are seen
+    latency_seconds: float = 0.0
+    jitter_seconds: float = 0.0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        delay = self.latency_seconds + random.uniform(-self.jitter_seconds, self.jitter_seconds)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        part = self.next_step(llm_request.contents)
+        prompt_chars = sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents)
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_chars // CHARS_PER_TOKEN,
+            candidates_token_count=len(part.text or "") // CHARS_PER_TOKEN + 1,
+            total_token_count=(prompt_chars + len(part.text or "")) // CHARS_PER_TOKEN + 1,
+        )
+        if stream and part.text:
+            # Mimic Gemini SSE: partial chunks first, then the aggregated final response
+            words = part.text.split(" ")
+            step = max(1, len(words) // 3)
+            for i in range(0, len(words), step):
+                chunk = " ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[part]), usage_metadata=usage,
+                          turn_complete=True)
+
+    # ----- the scripted workflow -----
+    def next_step(self, contents: List[types.Content]) -> types.Part:
+        """Decides the next tool call (or the reply) from the conversation so far."""
+        turn_start = max((i for i, c in enumerate(contents) if c.role == "user" and any(p.text for p in c.parts or [])), default=0)
+        texts = _user_texts(contents)
+        turn = self._tool_results(contents[turn_start:])
+
+        email = next((m.group(0).rstrip(".") for t in reversed(texts) for m in [EMAIL_PATTERN.search(t)] if m), None)
+        if not email:
+            return types.Part(text="Hello! I can help you request access to software. What is your work email address?")
+
+        looked_up = [p.function_call.args.get("email") for c in contents for p in c.parts or []
+                     if p.function_call and p.function_call.name == "find_employee_by_email"]
+        employee = self._tool_results(contents).get("find_employee_by_email")
+        if employee is None or not looked_up or looked_up[-1] != email:
+            return self._call("find_employee_by_email", email=email)
+        match = EMPLOYEE_FOUND_PATTERN.match(employee) if isinstance(employee, str) else None
+        if not match:
+            return self._unknown_employee(email, turn)
+        name, role = match["name"], match["role"]
+
+        software = next((s for t in reversed(texts) for s in [find_software_name(message_words(t), self.software_names)] if s), None)
+        if not software:
+            return types.Part(text=f"Thanks {name}, I've verified you ({role}). Which software do you need access to?")
+
+        current_words = set(WORD_PATTERN.findall(" ".join(texts[-2:]).lower()))
+        if DEPROVISION_WORDS.intersection(current_words):
+            return self._deprovision(email, name, software, turn)
+        return self._grant(email, name, role, software, turn)
+
+    @staticmethod
+    def _tool_results(contents: List[types.Content]) -> Dict[str, object]:
+        results = {}
+        for c in contents:
+            for p in c.parts or []:
+                if p.function_response:
+                    results[p.function_response.name] = tool_result(p.function_response.response)
+        return results
+
+    @staticmethod
+    def _call(name: str, **args) -> types.Part:
+        return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+    def _unknown_employee(self, email: str, turn: Dict[str, object]) -> types.Part:
+        if "append_to_audit_log" not in turn:
+            return self._call("append_to_audit_log", employee_email=email, request_type="Grant", software_name="Unknown",
+                              status="Error - Employee Not Found", notes="Email not in Employee_Directory")
+        if "send_gmail" not in turn:
+            return self._call("send_gmail", to=IT_SUPPORT_EMAIL, cc=HR_ONBOARDING_EMAIL,
+                              subject=f"Unknown employee requested access: {email}",
+                              body=f"{email} is not in the Employee Directory. Please check onboarding status.")
+        return types.Part(text=f"I couldn't find {email} in the employee directory. I've notified IT support and HR onboarding "
+                               "so they can check your onboarding status.")
+
+    def _deprovision(self, email: str, name: str, software: str, turn: Dict[str, object]) -> types.Part:
+        if "append_to_audit_log" not in turn:
+            return self._call("append_to_audit_log", employee_email=email, request_type="Deprovision", software_name=software,
+                              status="Pending Deprovisioning", notes="Removal requested by employee")
+        if "find_manager_email" not in turn:
+            return self._call("find_manager_email", employee_email=email)
+        manager = self._manager(turn)
+        if "send_gmail" not in turn and manager:
+            return self._call("send_gmail", to=manager, cc=IT_SUPPORT_EMAIL,
+                              subject=f"Access Removal Confirmation: {software} for {name}",
+                              body=f"{name} ({email}) asked to remove their {software} access. Please confirm.")
+        entry = turn["append_to_audit_log"]
+        return types.Part(text=f"Your request to remove {software} access is logged (Request ID {entry['Request_ID']}) "
+                               "and your manager has been asked to confirm.")
+
+    def _grant(self, email: str, name: str, role: str, software: str, turn: Dict[str, object]) -> types.Part:
+        if "check_audit_log_for_duplicate" not in turn:
+            return self._call("check_audit_log_for_duplicate", employee_email=email, software_name=software)
+        existing = turn["check_audit_log_for_duplicate"]
+        if existing:
+            return types.Part(text=f"You already have a request for {software} (Request ID {existing['Request_ID']}, "
+                                   f"status: {existing['Status']}). I haven't created a new one.")
+        if "find_policy_for_user" not in turn:
+            return self._call("find_policy_for_user", software_name=software, user_role=role)
+        policy = turn["find_policy_for_user"]
+        auto_approve = bool(policy) and policy["Requires_Manager_Approval"] == "No"
+        if "append_to_audit_log" not in turn:
+            status = "Approved" if auto_approve else "Pending Manager Approval"
+            notes = "Auto-approved by policy" if auto_approve else (
+                "Policy requires manager approval" if policy else "No policy for role")
+            return self._call("append_to_audit_log", employee_email=email, request_type="Grant", software_name=software,
+                              status=status, notes=notes)
+        request_id = turn["append_to_audit_log"]["Request_ID"]
+        it_contact = policy["Approval_Contact_Email"] if policy else IT_SUPPORT_EMAIL
+        details = f"Employee: {name} ({email})\nRole: {role}\nSoftware: {software}\nRequest ID: {request_id}\n"
+        if auto_approve:
+            if "send_gmail" not in turn:
+                return self._call("send_gmail", to=it_contact, subject=f"Access Request Approved: {software} for {name}",
+                                  body=f"{details}Auto-approved per the {role} access policy. Please provision access.")
+            return types.Part(text=f"Hi {name}, your request for {software} has been approved automatically. "
+                                   f"IT support has been notified. Request ID: {request_id}.")
+        if "find_manager_email" not in turn:
+            return self._call("find_manager_email", employee_email=email)
+        manager = self._manager(turn)
+        if "send_gmail" not in turn and manager:
+            reason = "Policy requires manager approval." if policy else f"No {software} policy exists for the {role} role."
+            return self._call("send_gmail", to=manager, cc=it_contact,
+                              subject=f"Access Request Requires Your Approval: {software} for {name}",
+                              body=f"{details}{reason} Please approve or reject this request.")
+        return types.Part(text=f"Hi {name}, {software} access requires manager approval for the {role} role. "
+                               f"I've sent the request to your manager; it is pending their approval. Request ID: {request_id}.")
+
+    @staticmethod
+    def _manager(turn: Dict[str, object]) -> Optional[str]:
+        result = turn.get("find_manager_email")
+        if isinstance(result, str) and result.startswith("Manager email:"):
+            return result[len("Manager email:"):].strip()
+        return None
+
+# ----- record / replay -----
+CASSETTE_MODES = ("record", "replay")
+
+# Values that differ between otherwise identical runs and must not change the key
+VOLATILE_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?"), "<timestamp>"),
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"), "<uuid>"),
+]
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when the cassette has no recording for a prompt."""
+
+def prompt_key(llm_request: LlmRequest) -> str:
+    """
+    Hash of the normalized prompt: system instruction, tool names and contents,
+    without function call IDs, timestamps or UUIDs.
+    """
+    contents = [c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents]
+    for content in contents:
+        for part in content.get("parts", []):
+            for field in ("function_call", "function_response"):
+                if field in part:
+                    part[field].pop("id", None)
+    system = str(llm_request.config.system_instruction or "") if llm_request.config else ""
+    text = json.dumps({"system": system, "tools": sorted(llm_request.tools_dict), "contents": contents}, sort_keys=True)
+    for pattern, placeholder in VOLATILE_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CassetteLlm(BaseLlm):
+    """
+    Record/replay wrapper around another model.
+
+    In "record" mode every call goes to `inner` and the responses are appended
+    to the JSONL cassette at `path`, keyed by prompt_key(). In "replay" mode
+    responses are served from the cassette; a prompt that was recorded several
+    times replays its recordings in order (then repeats the last one), and an
+    unknown prompt raises CassetteMiss.
+    """
+
+    model: str = "cassette"
+    path: str
+    mode: str = "replay"
+    inner: Optional[BaseLlm] = None
+    hits: int = 0
+    misses: int = 0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _recordings: Dict[str, Deque[list]] = PrivateAttr(default_factory=lambda: collections.defaultdict(collections.deque))
+
+    def model_post_init(self, __context):
+        if self.mode == "replay":
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._recordings[entry["key"]].append(entry["responses"])
+            logger.info("[CASSETTE] replaying %d prompts from %s", len(self._recordings), self.path)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        key = prompt_key(llm_request)
+        if self.mode == "replay":
+            for response in self._replay(key):
+                if stream or not response.get("partial"):
+                    yield LlmResponse.model_validate(response)
+            return
+
+        responses = []
+        async for response in self.inner.generate_content_async(llm_request, stream=stream):
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            yield response
+        line = json.dumps({"key": key, "model": self.inner.model, "responses": responses})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _replay(self, key: str) -> list:
+        with self._lock:
+            recordings = self._recordings.get(key)
+            if not recordings:
+                self.misses += 1
+                raise CassetteMiss(f"No recording for prompt {key[:12]} in {self.path}; re-record with LLM_CASSETTE_MODE=record")
+            self.hits += 1
+            return recordings.popleft() if len(recordings) > 1 else recordings[0]
+
+def create_llm(provider: str, software_names: Optional[Dict[str, str]] = None,
+               latency_seconds: float = 0.0, jitter_seconds: float = 0.0,
+               cassette_path: Optional[str] = None, cassette_mode: Optional[str] = None) -> BaseLlm:
+    """
+    Builds the model for LLM_PROVIDER ("gemini" or "scripted"), wrapped in a
+    CassetteLlm when a cassette mode ("record" or "replay") is given.
+    """
+    if cassette_mode:
+        if cassette_mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown LLM_CASSETTE_MODE {cassette_mode!r}; expected one of {', '.join(CASSETTE_MODES)}")
+        if not cassette_path:
+            raise ValueError("LLM_CASSETTE_MODE requires LLM_CASSETTE_PATH")
+        if cassette_mode == "replay":
+            return CassetteLlm(path=cassette_path, mode="replay")
+        os.makedirs(os.path.dirname(os.path.abspath(cassette_path)), exist_ok=True)
+        inner = create_llm(provider, software_names, latency_seconds, jitter_seconds)
+        logger.info("[CASSETTE] recording %s calls to %s", provider, cassette_path)
+        return CassetteLlm(path=cassette_path, mode="record", inner=inner)
+    if provider == "gemini":
+        from google.adk.models.google_llm import Gemini
+        return Gemini()
+    if provider == "scripted":
+        logger.info("[LLM] using scripted model (latency %.0f ms +/- %.0f ms)", latency_seconds * 1000, jitter_seconds * 1000)
+        return ScriptedLlm(software_names=software_names, latency_seconds=latency_seconds, jitter_seconds=jitter_seconds)
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}; expected one of {', '.join(LLM_PROVIDERS)}")
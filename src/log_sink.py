@@ -0,0 +1,186 @@
+# Structured, sampled, non-blocking logging.
+#
+# configure_logging() replaces logging.basicConfig. Callers only put records
+# on a bounded queue; a QueueListener thread formats them (JSON by default)
+# and writes them out, so the event loop never waits on a disk or pipe write.
+# When the queue is full a record is dropped and counted instead of blocking.
+#
+# Chatty subsystems log on channel loggers, children of the app logger named
+# after their "[TAG]" prefix (it-access-guardian.mock_sheets for
+# [MOCK_SHEETS]). Each channel can get its own level and sample rate, e.g.
+#   channel_levels={"mock_gmail": "WARNING"}, sample_rates={"mock_sheets": 0.01}
+# A level check happens before the record is built, so a silenced channel
+# costs one isEnabledFor() call; sampling never drops warnings or errors.
+# Channels in UNSAMPLED_CHANNELS (the audit_log record of every Audit_Log
+# append) are never lost: they refuse a sample rate or level, always log at
+# INFO whatever LOG_LEVEL says, and wait for room on a full queue instead of
+# being dropped.
+import atexit
+import datetime
+import json
+import logging
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional, TextIO
+
+APP_LOGGER = "it-access-guardian"
+LOG_FORMATS = ("json", "text")
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+UNSAMPLED_CHANNELS = frozenset({"audit_log"})
+
+_CHANNEL_TAG = re.compile(r"\[([A-Z_]+)\]\s*")
+
+def channel_logger(channel: str) -> logging.Logger:
+    return logging.getLogger(f"{APP_LOGGER}.{channel}")
+
+def parse_channel_spec(spec: str) -> Dict[str, str]:
+    """Parses "mock_sheets=0.01,mock_gmail=0.5" into {"mock_sheets": "0.01", ...}."""
+    pairs = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip() or not value.strip():
+            raise ValueError(f"Expected channel=value, got {item.strip()!r}")
+        pairs[name.strip().lower()] = value.strip()
+    return pairs
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; a leading "[TAG]" becomes the channel field."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        tag = _CHANNEL_TAG.match(message)
+        if tag:
+            entry["channel"] = tag.group(1)
+            message = message[tag.end():]
+        entry["msg"] = message
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SampleFilter(logging.Filter):
+    """Keeps a random fraction of records below WARNING."""
+
+    def __init__(self, rate: float, rng=random.random):
+        super().__init__()
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Sample rate must be between 0 and 1, got {rate}")
+        self.rate = rate
+        self._random = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self._random() < self.rate
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records rather than block when the queue is full.
+    Records from the loggers named in keep_loggers wait for room instead.
+    """
+
+    def __init__(self, log_queue: queue.Queue, keep_loggers: Iterable[str] = ()):
+        super().__init__(log_queue)
+        self.keep_loggers = frozenset(keep_loggers)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.name in self.keep_loggers:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogSink:
+    """The installed queue handler and the listener thread that drains it."""
+
+    def __init__(self, handler: DroppingQueueHandler, listener: QueueListener, channels: Dict[str, logging.Logger]):
+        self.handler = handler
+        self.listener = listener
+        self.channels = channels
+        self.running = True
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    @property
+    def queued(self) -> int:
+        return self.handler.queue.qsize()
+
+    def flush(self):
+        """Blocks until every queued record has been written."""
+        self.handler.queue.join()
+        for handler in self.listener.handlers:
+            handler.flush()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+        for logger in self.channels.values():
+            logger.setLevel(logging.NOTSET)
+            for sample_filter in [f for f in logger.filters if isinstance(f, SampleFilter)]:
+                logger.removeFilter(sample_filter)
+
+_installed: Optional[LogSink] = None
+
+def configure_logging(level: str = "INFO", fmt: str = "json",
+                      channel_levels: Optional[Dict[str, str]] = None,
+                      sample_rates: Optional[Dict[str, str]] = None,
+                      queue_size: int = 10000, stream: Optional[TextIO] = None) -> LogSink:
+    """
+    Routes root logging through a bounded queue to a background writer.
+    Calling it again replaces the previous sink.
+    """
+    global _installed
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {fmt!r}; expected one of {', '.join(LOG_FORMATS)}")
+    unsampled = UNSAMPLED_CHANNELS.intersection(sample_rates or {})
+    if unsampled:
+        raise ValueError(f"The {', '.join(sorted(unsampled))} channel is never sampled")
+    unsampled = UNSAMPLED_CHANNELS.intersection(channel_levels or {})
+    if unsampled:
+        raise ValueError(f"The {', '.join(sorted(unsampled))} channel always logs at INFO")
+    if _installed is not None:
+        _installed.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size),
+                                   keep_loggers=[channel_logger(channel).name for channel in UNSAMPLED_CHANNELS])
+    listener = QueueListener(handler.queue, output, respect_handler_level=True)
+
+    channels: Dict[str, logging.Logger] = {}
+    for channel, channel_level in (channel_levels or {}).items():
+        channels[channel] = channel_logger(channel)
+        channels[channel].setLevel(channel_level.upper())
+    for channel, rate in (sample_rates or {}).items():
+        channels.setdefault(channel, channel_logger(channel)).addFilter(SampleFilter(float(rate)))
+    for channel in UNSAMPLED_CHANNELS:
+        channels[channel] = channel_logger(channel)
+        channels[channel].setLevel(logging.INFO)
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(handler)
+    listener.start()
+    _installed = LogSink(handler, listener, channels)
+    return _installed
+
+@atexit.register
+def _drain_on_exit():
+    if _installed is not None:
+        _installed.stop()
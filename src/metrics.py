@@ -0,0 +1,212 @@
+# Prometheus-style metrics for the agent server.
+#
+# A small dependency-free registry: counters, histograms and gauges rendered
+# in the Prometheus text exposition format by the /metrics endpoint.
+# Recording an observation is a bisect and two additions under a lock, so the
+# hot path stays cheap; gauges are callables evaluated only at scrape time.
+#
+# AgentMetrics bundles the server's metrics and the LlmAgent callbacks that
+# time model calls and FunctionTools. Model round-trips are counted per
+# request through a context variable set by track_request().
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000, 1000000)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((values, list(counts), total) for values, (counts, total) in self._series.items())
+        for values, counts, total in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+class Gauge:
+    """
+    Gauge whose value is read from a callable when metrics are scraped. With
+    kind="counter" it exposes a running total kept elsewhere as a counter.
+    """
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Optional[float]], kind: str = "gauge"):
+        self.name, self.help, self.read, self.kind = name, help_text, read, kind
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {_format_value(value)}"]
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Per-request state: number of model calls and when the current one started
+_request_state: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("metrics_request", default=None)
+
+class AgentMetrics:
+    """
+    The server's metrics plus LlmAgent callbacks that feed them.
+
+    Register before_model/after_model last in the agent's callback lists so the
+    model-call latency excludes compaction and rate-limit waits.
+    """
+
+    def __init__(self):
+        self.registry = Registry()
+        self.invoke_seconds = self.registry.register(Histogram(
+            "accessbot_invoke_seconds", "End-to-end latency of agent requests.", ("endpoint", "route")))
+        self.model_round_trips = self.registry.register(Histogram(
+            "accessbot_model_round_trips", "Model calls made to answer one request.", ("endpoint",), COUNT_BUCKETS))
+        self.model_call_seconds = self.registry.register(Histogram(
+            "accessbot_model_call_seconds", "Latency of a single model call."))
+        self.prompt_tokens = self.registry.register(Histogram(
+            "accessbot_prompt_tokens", "Prompt tokens per model call: estimated before and after history compaction, "
+            "and as reported by the model.", ("stage",), TOKEN_BUCKETS))
+        self.tool_seconds = self.registry.register(Histogram(
+            "accessbot_tool_seconds", "Latency of each FunctionTool call.", ("tool",)))
+        self.tool_errors = self.registry.register(Counter(
+            "accessbot_tool_errors_total", "FunctionTool calls that raised, by tool.", ("tool",)))
+        self.invoke_retries = self.registry.register(Counter(
+            "accessbot_invoke_retries_total", "Agent runs retried by /invoke, by reason.", ("reason",)))
+        self.invoke_errors = self.registry.register(Counter(
+            "accessbot_invoke_errors_total", "Agent requests that failed, by status code.", ("endpoint", "status")))
+        self.admission_wait_seconds = self.registry.register(Histogram(
+            "accessbot_admission_wait_seconds", "Time agent requests waited for an admission slot."))
+        self.outbox_seconds = self.registry.register(Histogram(
+            "accessbot_outbox_seconds", "Outbox latency: committing an enqueue, and enqueue to delivery.", ("stage",)))
+        self.bulk_rows = self.registry.register(Counter(
+            "accessbot_bulk_rows_total", "Rows processed by /requests/bulk, by outcome.", ("outcome",)))
+        self._tool_started: Dict[str, float] = {}
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], Optional[float]], kind: str = "gauge"):
+        self.registry.register(Gauge(name, help_text, read, kind))
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    @contextmanager
+    def track_request(self, endpoint: str, start: Optional[float] = None):
+        """
+        Times one request and counts its model calls. The body may set
+        state["route"] (e.g. "fast_path"); the default is "agent". start
+        (a perf_counter() value) backdates the request, for work done before
+        the body runs, e.g. ahead of a streamed response.
+        """
+        state = {"model_calls": 0, "model_started": 0.0, "route": "agent"}
+        token = _request_state.set(state)
+        start = time.perf_counter() if start is None else start
+        try:
+            yield state
+        finally:
+            _request_state.reset(token)
+            self.invoke_seconds.observe(time.perf_counter() - start, endpoint, state["route"])
+            if state["route"] == "agent":
+                self.model_round_trips.observe(state["model_calls"], endpoint)
+
+    # ----- LlmAgent callbacks -----
+    def before_model(self, callback_context, llm_request):
+        state = _request_state.get()
+        if state is not None:
+            state["model_calls"] += 1
+            state["model_started"] = time.perf_counter()
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        state = _request_state.get()
+        # Streaming calls report once per chunk; time the call at its final response
+        if state is not None and state["model_started"] and not llm_response.partial:
+            self.model_call_seconds.observe(time.perf_counter() - state["model_started"])
+            state["model_started"] = 0.0
+        return None
+
+    def before_tool(self, tool, args, tool_context):
+        self._tool_started[tool_context.function_call_id or tool.name] = time.perf_counter()
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        started = self._tool_started.pop(tool_context.function_call_id or tool.name, None)
+        if started is not None:
+            self.tool_seconds.observe(time.perf_counter() - started, tool.name)
+        return None
+
+    def on_tool_error(self, tool, args, tool_context, error):
+        # after_tool is not called when a tool raises, so its start time is dropped here
+        started = self._tool_started.pop(tool_context.function_call_id or tool.name, None)
+        if started is not None:
+            self.tool_seconds.observe(time.perf_counter() - started, tool.name)
+        self.tool_errors.inc(tool.name)
+        return None
@@ -0,0 +1,240 @@
+# Outbox for email notifications.
+#
+# send_gmail used to call the mail service inline, so every SMTP/Gmail API
+# round-trip added to the user-facing latency of the agent's tool loop. Now the
+# tool only records the message in a local SQLite outbox and returns a message
+# ID; a background asyncio worker drains the outbox in batches, retrying
+# failed sends with exponential backoff. A file-backed outbox commits each
+# insert with synchronous=FULL, so callers on the event loop enqueue from a
+# worker thread when `durable` is set, and the worker's reads and commits run
+# in threads too. Due rows are claimed atomically (status 'sending') before
+# they are sent, so several processes sharing one outbox file never send the
+# same email twice; claims older than claim_timeout are taken to belong to a
+# worker that died and are put back to 'pending' when a worker starts.
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("it-access-guardian")
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL, cc TEXT, subject TEXT NOT NULL, body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL, next_attempt_at REAL NOT NULL, sent_at REAL,
+    last_error TEXT, claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+class EmailOutbox:
+    """
+    Durable email queue drained by a background worker.
+
+    `sender` is a blocking callable with MockGmail.send_email's signature; it
+    runs in worker threads so a slow mail API never blocks the event loop.
+    Pass path=":memory:" for a non-durable outbox (tests, demos).
+    `observe_latency(stage, seconds)`, if given, is called with the time each
+    enqueue took to commit ("enqueue") and each message's time from enqueue
+    to delivery ("send").
+    """
+
+    def __init__(self, sender: Callable[..., Any], path: str = ":memory:", batch_size: int = 50,
+                 max_attempts: int = 5, base_backoff: float = 1.0, poll_interval: float = 1.0,
+                 observe_latency: Optional[Callable[[str, float], None]] = None, claim_timeout: float = 300.0):
+        self.sender = sender
+        self.durable = path != ":memory:"
+        self.observe_latency = observe_latency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if self.durable:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(OUTBOX_SCHEMA)
+        if "claimed_at" not in {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")  # outbox files from before claims
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_send_latency = 0.0    # seconds from enqueue to delivery
+        self.total_send_latency = 0.0
+
+    # ----- producer side -----
+    def enqueue(self, to: str, subject: str, body: str, cc: Optional[str] = None) -> str:
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        start = time.perf_counter()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (id, recipient, cc, subject, body, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (message_id, to, cc, subject, body, now, now),
+            )
+        self._observe("enqueue", time.perf_counter() - start)
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return message_id
+
+    def enqueue_many(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """Queues several messages (dicts of enqueue's arguments) in one transaction."""
+        now = time.time()
+        rows = [(str(uuid.uuid4()), m["to"], m.get("cc"), m["subject"], m["body"], now, now) for m in messages]
+        if not rows:
+            return []
+        start = time.perf_counter()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO outbox (id, recipient, cc, subject, body, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        self._observe("enqueue", time.perf_counter() - start)
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return [row[0] for row in rows]
+
+    def _observe(self, stage: str, seconds: float):
+        if self.observe_latency is not None:
+            self.observe_latency(stage, seconds)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM outbox WHERE id = ?", (message_id,))
+            row = cur.fetchone()
+            return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "last_send_latency_seconds": round(self.last_send_latency, 4),
+            "avg_send_latency_seconds": round(self.total_send_latency / self.sent, 4) if self.sent else 0.0,
+        }
+
+    # ----- worker side -----
+    async def _db(self, fn, *args):
+        # A durable outbox commits with an fsync; keep that off the event loop
+        if self.durable:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _claim_due(self) -> List[tuple]:
+        """Marks up to batch_size due messages as 'sending' in one statement and returns them."""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?) "
+                "RETURNING id, recipient, cc, subject, body, attempts, created_at",
+                (now, now, self.batch_size),
+            ).fetchall()
+
+    def _requeue_stale_claims(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE outbox SET status = 'pending', claimed_at = NULL WHERE status = 'sending' AND claimed_at < ?",
+                (time.time() - self.claim_timeout,),
+            ).rowcount
+
+    def _record_results(self, updates_sent: List[tuple], updates_retry: List[tuple], updates_failed: List[tuple]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1 WHERE id = ?", updates_sent)
+            self._conn.executemany("UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ? "
+                                   "WHERE id = ?", updates_retry)
+            self._conn.executemany("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", updates_failed)
+            self._conn.execute("COMMIT")
+
+    async def _send(self, message: tuple):
+        _, to, cc, subject, body, _, _ = message
+        try:
+            await asyncio.to_thread(self.sender, to=to, subject=subject, body=body, cc=cc)
+            return None
+        except Exception as e:
+            return e
+
+    async def drain_once(self) -> int:
+        """Sends one batch of due messages. Returns how many were attempted."""
+        batch = await self._db(self._claim_due)
+        if not batch:
+            return 0
+        errors = await asyncio.gather(*(self._send(m) for m in batch))
+        now = time.time()
+        updates_sent, updates_retry, updates_failed = [], [], []
+        for (message_id, _, _, _, _, attempts, created_at), error in zip(batch, errors):
+            if error is None:
+                updates_sent.append((now, message_id))
+                self.sent += 1
+                self.last_send_latency = now - created_at
+                self.total_send_latency += self.last_send_latency
+                self._observe("send", self.last_send_latency)
+            elif attempts + 1 >= self.max_attempts:
+                updates_failed.append((attempts + 1, str(error), message_id))
+                self.failed += 1
+                logger.error("[OUTBOX] giving up on %s after %d attempts: %s", message_id, attempts + 1, error)
+            else:
+                delay = self.base_backoff * (2 ** attempts) * random.uniform(0.8, 1.2)
+                updates_retry.append((attempts + 1, now + delay, str(error), message_id))
+                self.retries += 1
+                logger.warning("[OUTBOX] send %s failed (%s); retrying in %.1fs", message_id, error, delay)
+        await self._db(self._record_results, updates_sent, updates_retry, updates_failed)
+        return len(batch)
+
+    async def run(self):
+        requeued = await self._db(self._requeue_stale_claims)
+        if requeued:
+            logger.warning("[OUTBOX] re-queued %d messages claimed by a worker that stopped", requeued)
+        while True:
+            # Clear before draining so an enqueue during the drain is not missed
+            self._wakeup.clear()
+            try:
+                if await self.drain_once():
+                    continue
+            except Exception as e:
+                logger.error("[OUTBOX] worker error: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Starts the background worker on the running event loop; it first re-queues stale claims."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self):
+        """Stops the worker after one last attempt to send everything that is due."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+            self._wakeup = None
+        while await self.drain_once():
+            pass
@@ -0,0 +1,108 @@
+# Role × software decision matrix compiled from Software_Access_Policy.
+#
+# Access reviews ask whole-population questions ("who would be auto-approved
+# for GitHub", "which grants does current policy no longer allow"). Answering
+# them with find_row_matching means one sheet search per employee or grant.
+# Here role and software names are interned to integer IDs, and the policy
+# sheet becomes a dense int8 array: decisions[role_id, software_id] is
+# NO_POLICY, AUTO_APPROVE or MANAGER_APPROVAL. Callers encode their population
+# to ID arrays once, and each question is then one NumPy gather and compare.
+#
+# apply() adds appended policy rows in place, growing the array as new roles
+# or software appear. As in the sheet's index, the first row for a
+# (software, role) pair wins.
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+NO_POLICY = 0
+AUTO_APPROVE = 1
+MANAGER_APPROVAL = 2
+
+UNKNOWN_ID = -1  # encoded name that is not in the matrix; always decides NO_POLICY
+
+class Interner:
+    """Assigns dense integer IDs to names in first-seen order."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        id_ = self.ids.get(name)
+        if id_ is None:
+            id_ = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id_
+
+    def encode(self, names: Iterable[str], count: int = -1) -> np.ndarray:
+        """Maps names to IDs (UNKNOWN_ID for names never interned) without adding them."""
+        get = self.ids.get
+        return np.fromiter((get(name, UNKNOWN_ID) for name in names), dtype=np.int32, count=count)
+
+class PolicyMatrix:
+    def __init__(self, rows: Iterable[Dict[str, str]] = (), version=None):
+        self.roles = Interner()
+        self.software = Interner()
+        self.decisions = np.zeros((4, 4), dtype=np.int8)  # capacity; only [:len(roles), :len(software)] is used
+        self.version = version  # sheet version the matrix reflects, set by the owner
+        self.apply(rows)
+
+    @property
+    def shape(self):
+        return len(self.roles), len(self.software)
+
+    def apply(self, rows: Iterable[Dict[str, str]]):
+        """Adds policy rows; a pair that already has a decision keeps it."""
+        for row in rows:
+            role_id = self.roles.intern(row["Role"])
+            software_id = self.software.intern(row["Software_Name"])
+            self._reserve(role_id + 1, software_id + 1)
+            if self.decisions[role_id, software_id] == NO_POLICY:
+                self.decisions[role_id, software_id] = (
+                    MANAGER_APPROVAL if row.get("Requires_Manager_Approval") == "Yes" else AUTO_APPROVE)
+
+    def _reserve(self, roles: int, software: int):
+        capacity_roles, capacity_software = self.decisions.shape
+        if roles <= capacity_roles and software <= capacity_software:
+            return
+        # Grow geometrically so appending n policy rows costs O(n) copies overall
+        if roles > capacity_roles:
+            roles = max(roles, 2 * capacity_roles)
+        if software > capacity_software:
+            software = max(software, 2 * capacity_software)
+        grown = np.zeros((max(roles, capacity_roles), max(software, capacity_software)), dtype=np.int8)
+        grown[:capacity_roles, :capacity_software] = self.decisions
+        self.decisions = grown
+
+    def decision(self, role: str, software_name: str) -> int:
+        role_id = self.roles.ids.get(role)
+        software_id = self.software.ids.get(software_name)
+        if role_id is None or software_id is None:
+            return NO_POLICY
+        return int(self.decisions[role_id, software_id])
+
+    def software_id(self, software_name: str) -> int:
+        return self.software.ids.get(software_name, UNKNOWN_ID)
+
+    def decide(self, role_ids: np.ndarray, software_ids) -> np.ndarray:
+        """
+        Vectorized decision(): role_ids and software_ids are ID arrays (or a
+        single software ID) that broadcast together. UNKNOWN_ID decides NO_POLICY.
+        """
+        role_ids = np.asarray(role_ids)
+        software_ids = np.asarray(software_ids)
+        known = (role_ids >= 0) & (software_ids >= 0)
+        return np.where(known, self.decisions[np.maximum(role_ids, 0), np.maximum(software_ids, 0)], NO_POLICY)
+
+    def table(self) -> np.ndarray:
+        """The decisions actually in use, shape (roles, software)."""
+        roles, software = self.shape
+        return self.decisions[:roles, :software]
+
+def select(items: Sequence, mask: np.ndarray) -> list:
+    """Items where mask is True, in order."""
+    return [items[i] for i in np.flatnonzero(mask)]
@@ -0,0 +1,185 @@
+# Process-wide model quota limiting and request admission control.
+#
+# Every model call reserves capacity from two token buckets (requests per
+# minute and tokens per minute) before it is sent. Reservations are taken in
+# arrival order and a caller simply sleeps until its reserved slot, so
+# concurrent conversations share the quota fairly without blind retries.
+# In front of that, AdmissionController bounds how many /invoke requests may
+# run or wait at once and rejects the overflow with a Retry-After hint.
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional
+
+from src.text_patterns import CHARS_PER_TOKEN
+from src.tracing import maybe_span
+
+logger = logging.getLogger("it-access-guardian")
+
+ESTIMATE_STATE_KEY = "temp:rate_limit_estimate"
+
+class TokenBucket:
+    """Token bucket whose balance may go negative to hold reservations for waiting callers."""
+
+    def __init__(self, rate_per_second: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` tokens and returns how long to wait before they may be used."""
+        self._refill()
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """Charges (positive) or refunds (negative) tokens after the fact."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class ModelRateLimiter:
+    """
+    RPM/TPM limiter shared by every model call in the process.
+
+    Use before_model/after_model as LlmAgent callbacks: the prompt's token
+    count is estimated up front and corrected with the usage the model reports.
+    """
+
+    def __init__(self, rpm: int, tpm: int, clock: Callable[[], float] = time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self.requests = TokenBucket(rpm / 60.0, rpm, clock)
+        self.tokens = TokenBucket(tpm / 60.0, tpm, clock)
+        self._paused_until = 0.0
+        self.calls = 0
+        self.throttled_calls = 0
+        self.total_wait_seconds = 0.0
+
+    def reserve(self, estimated_tokens: int) -> float:
+        wait = max(
+            self.requests.reserve(1),
+            self.tokens.reserve(min(estimated_tokens, self.tpm)),
+            self._paused_until - self._clock(),
+        )
+        self.calls += 1
+        if wait > 0:
+            self.throttled_calls += 1
+            self.total_wait_seconds += wait
+        return wait
+
+    async def acquire(self, estimated_tokens: int):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            logger.info("[RATE_LIMIT] waiting %.2fs for model quota", wait)
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Holds back all model calls, e.g. after the API reports quota exhaustion anyway."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {"calls": self.calls, "throttled_calls": self.throttled_calls,
+                "total_wait_seconds": round(self.total_wait_seconds, 3)}
+
+    async def before_model(self, callback_context, llm_request):
+        chars = sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents)
+        if llm_request.config and llm_request.config.system_instruction:
+            chars += len(str(llm_request.config.system_instruction))
+        estimate = chars // CHARS_PER_TOKEN
+        if callback_context is not None:
+            callback_context.state[ESTIMATE_STATE_KEY] = estimate
+        await self.acquire(estimate)
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage and usage.total_token_count and callback_context is not None:
+            estimate = callback_context.state.get(ESTIMATE_STATE_KEY, 0)
+            self.tokens.adjust(usage.total_token_count - estimate)
+        return None
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Lets at most max_concurrent requests run and max_queue wait (FIFO).
+    Anything beyond that is rejected at once with AdmissionRejected, whose
+    retry_after is estimated from the queue length and recent request times.
+    The wait for a slot is traced as an "admission_wait" span and passed to
+    `observe_wait(seconds)`, if given.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, observe_wait: Optional[Callable[[float], None]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.observe_wait = observe_wait
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_seconds = 5.0  # moving average of request duration
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.queued + 1) * self._avg_seconds / max(1, self.max_concurrent)))
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # hand the slot straight to the next waiter
+                return
+        self.active -= 1
+
+    async def _admit(self):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+        elif len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after())
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # we were handed a slot but will not use it
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+
+    @asynccontextmanager
+    async def slot(self):
+        queued_at = time.monotonic()
+        with maybe_span("admission_wait"):
+            await self._admit()
+        start = time.monotonic()
+        self.admitted += 1
+        if self.observe_wait is not None:
+            self.observe_wait(start - queued_at)
+        try:
+            yield
+        finally:
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - start)
+            self._release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self.active, "queued": self.queued, "admitted": self.admitted, "rejected": self.rejected}
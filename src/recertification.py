@@ -0,0 +1,149 @@
+# Periodic, incremental access recertification (Workflow E for the whole Audit_Log).
+#
+# A grant is the latest Audit_Log entry for an employee and software with
+# Status "Approved". It remains valid while the employee is in the directory
+# and their current role is still auto-approved for the software
+# (MockGoogleSheets.policy_violations). Checking every grant on every run does
+# not fit a nightly window at millions of grants, so after the first run a
+# recertification only checks the grants that could have changed since its
+# checkpoint:
+#   - grants of employees whose Employee_Directory rows were added, changed or removed
+#   - grants of software whose Software_Access_Policy rows changed
+#   - grants recorded in the Audit_Log since the checkpoint
+# The sheets' change journal (MockGoogleSheets.changed_keys) names the changed
+# rows; when it cannot, the run checks everything again.
+#
+# Each grant that is no longer allowed gets a "Pending Deprovisioning" entry,
+# so later runs do not flag it again, and the notices are batched: one email
+# per manager listing all of their reports' grants, copied to IT. Grants of
+# employees who left go to IT.
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger("it-access-guardian")
+
+APPEND_CHUNK_ROWS = 10000  # deprovisioning rows per Audit_Log append
+
+REASON_TEXT = {
+    "employee_not_in_directory": "no longer in the Employee_Directory",
+    "no_policy_for_role": "no policy for the {role} role",
+    "requires_manager_approval": "the {role} role requires manager approval",
+}
+
+class Recertifier:
+    """
+    Recertifies grants against the current directory and policy.
+
+    `db` is a MockGoogleSheets; `append_rows` appends Audit_Log rows (e.g.
+    append_rows_to_audit_log) and the coroutine `send_gmail` queues an email. The checkpoint
+    is kept in memory, so the first run in a process checks every grant.
+    """
+
+    def __init__(self, db, append_rows: Callable[[List[Dict[str, str]]], Awaitable[List[Dict[str, str]]]],
+                 send_gmail: Callable[..., Awaitable[Any]], it_contact: str):
+        self.db = db
+        self.append_rows = append_rows
+        self.send_gmail = send_gmail
+        self.it_contact = it_contact
+        self.checkpoint: Optional[Dict[str, int]] = None  # sheet versions and Audit_Log rows seen
+        self.audit_position = 0
+        # Audit_Log keys (lower-cased email, software) per employee and per lower-cased software
+        self.by_employee: Dict[str, Set[tuple]] = {}
+        self.by_software: Dict[str, Set[tuple]] = {}
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.revoked_total = 0
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> Dict[str, Any]:
+        """One recertification: flags grants that are no longer allowed and sends the notices."""
+        async with self._lock:
+            start = time.perf_counter()
+            mode, evaluated, violations = await asyncio.to_thread(self._evaluate)
+            entries = []
+            for i in range(0, len(violations), APPEND_CHUNK_ROWS):
+                entries.extend(await self.append_rows([self._deprovision_row(v) for v in violations[i:i + APPEND_CHUNK_ROWS]]))
+            notices = await self._send_notices(violations, entries)
+            self.revoked_total += len(violations)
+            self.last_report = {"mode": mode, "evaluated": evaluated, "revoked": len(violations), "notices": notices,
+                                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+            logger.info("[RECERT] %s run: %d grants checked, %d flagged, %d emails in %.1f ms",
+                        mode, evaluated, len(violations), notices, self.last_report["elapsed_ms"])
+            return self.last_report
+
+    async def run_periodically(self, interval_seconds: float):
+        """Runs every interval_seconds until cancelled; a failed run is logged and retried next time."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error("[RECERT] run failed: %s", e)
+
+    def _evaluate(self):
+        db = self.db
+        # Snapshot first: anything changed after this is seen again by the next run
+        checkpoint = {"Employee_Directory": db.versions["Employee_Directory"],
+                      "Software_Access_Policy": db.versions["Software_Access_Policy"]}
+        rows = db.audit_log.rows
+        position = len(rows)
+        new_keys = set()
+        for row in rows[self.audit_position:position]:
+            key = db._audit_key(row.get("Employee_Email"), row.get("Software_Name"))
+            new_keys.add(key)
+            self.by_employee.setdefault(key[0], set()).add(key)
+            self.by_software.setdefault(key[1], set()).add(key)
+
+        keys = self._changed_grant_keys(new_keys)
+        if keys is None:
+            mode, grants = "full", list(db.audit_index.values())
+        else:
+            mode = "incremental"
+            index = db.audit_index
+            grants = [row for row in map(index.get, keys) if row is not None]
+        violations = db.policy_violations(grants)
+        self.checkpoint, self.audit_position = checkpoint, position
+        return mode, len(grants), violations
+
+    def _changed_grant_keys(self, new_keys: Set[tuple]) -> Optional[Set[tuple]]:
+        """Audit_Log keys to check again, or None when everything must be checked."""
+        if self.checkpoint is None:
+            return None
+        employees = self.db.changed_keys("Employee_Directory", self.checkpoint["Employee_Directory"])
+        policies = self.db.changed_keys("Software_Access_Policy", self.checkpoint["Software_Access_Policy"])
+        if employees is None or policies is None:
+            return None
+        keys = set(new_keys)
+        for (email,) in employees:
+            keys.update(self.by_employee.get(email, ()))
+        for software in {software.lower() for software, _ in policies}:
+            keys.update(self.by_software.get(software, ()))
+        return keys
+
+    @staticmethod
+    def _deprovision_row(violation: Dict[str, Any]) -> Dict[str, str]:
+        grant = violation["grant"]
+        return {"Employee_Email": grant["Employee_Email"], "Request_Type": "Deprovision",
+                "Software_Name": grant["Software_Name"], "Status": "Pending Deprovisioning",
+                "Notes": f"Recertification: {violation['reason']}"}
+
+    async def _send_notices(self, violations: List[Dict[str, Any]], entries: List[Dict[str, str]]) -> int:
+        """Sends one email per recipient listing all of their grants to remove; returns how many."""
+        by_recipient: Dict[str, List[str]] = {}
+        for violation, entry in zip(violations, entries):
+            emp = self.db.lookup("Employee_Directory", entry["Employee_Email"])
+            recipient = (emp or {}).get("Manager_Email") or self.it_contact
+            name = emp["Employee_Name"] if emp else entry["Employee_Email"]
+            reason = REASON_TEXT[violation["reason"]].format(role=violation["role"])
+            by_recipient.setdefault(recipient, []).append(
+                f"- {name} ({entry['Employee_Email']}): {entry['Software_Name']}, {reason}. "
+                f"Request ID: {entry['Request_ID']}")
+        for recipient, lines in by_recipient.items():
+            await self.send_gmail(
+                to=recipient,
+                cc=None if recipient == self.it_contact else self.it_contact,
+                subject=f"Access Recertification: {len(lines)} grant(s) to remove",
+                body="Current policy no longer allows these grants. Please confirm their removal.\n\n" + "\n".join(lines),
+            )
+        return len(by_recipient)
@@ -0,0 +1,382 @@
+# Session services for the ADK Runner.
+#
+# InMemorySessionService keeps every session and its full event history for
+# the life of the process. BoundedSessionService keeps the same behaviour for
+# live conversations but evicts idle and least-recently-used sessions so the
+# server's memory stays flat under steady traffic. SqliteSessionService keeps
+# sessions in a local SQLite file so several uvicorn workers can share them.
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+logger = logging.getLogger("it-access-guardian")
+
+SessionKey = Tuple[str, str, str]
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    InMemorySessionService with LRU + idle-TTL eviction and a memory cap.
+
+    Resident size is estimated from the serialized size of each session's
+    events. Eviction runs inline on every call, so there is no background task.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, idle_ttl_seconds: float = 3600.0,
+                 max_bytes: int = 256 * 1024 * 1024, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self._clock = clock
+        # Least recently used first: key -> (last_used, estimated bytes)
+        self._lru: "OrderedDict[SessionKey, Tuple[float, int]]" = OrderedDict()
+        self.resident_bytes = 0
+        self.evictions = {"idle": 0, "lru": 0, "memory": 0}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._lru),
+            "resident_bytes": self.resident_bytes,
+            "evictions_idle": self.evictions["idle"],
+            "evictions_lru": self.evictions["lru"],
+            "evictions_memory": self.evictions["memory"],
+        }
+
+    def _touch(self, key: SessionKey, added_bytes: int = 0):
+        _, size = self._lru.pop(key, (0.0, 0))
+        self._lru[key] = (self._clock(), size + added_bytes)
+        self.resident_bytes += added_bytes
+
+    def _drop(self, key: SessionKey, reason: Optional[str] = None):
+        _, size = self._lru.pop(key)
+        self.resident_bytes -= size
+        app_name, user_id, session_id = key
+        user_sessions = self.sessions.get(app_name, {}).get(user_id)
+        if user_sessions is not None:
+            user_sessions.pop(session_id, None)
+            if not user_sessions:
+                del self.sessions[app_name][user_id]
+        if reason:
+            self.evictions[reason] += 1
+            logger.debug("[SESSIONS] evicted %s (%s)", session_id, reason)
+
+    def _evict(self):
+        now = self._clock()
+        while self._lru:
+            key, (last_used, _) = next(iter(self._lru.items()))
+            if now - last_used > self.idle_ttl_seconds:
+                self._drop(key, "idle")
+            elif len(self._lru) > self.max_sessions:
+                self._drop(key, "lru")
+            elif self.resident_bytes > self.max_bytes and len(self._lru) > 1:
+                self._drop(key, "memory")
+            else:
+                break
+
+    async def create_session(self, *, app_name: str, user_id: str,
+                             state: Optional[Dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._touch((app_name, user_id, session.id))
+        self._evict()
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        # Evict first so an expired session is not revived by this read
+        self._evict()
+        if key in self._lru:
+            self._touch(key)
+        return await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        event = await super().append_event(session=session, event=event)
+        if key in self._lru and not event.partial:
+            self._touch(key, len(event.model_dump_json(exclude_none=True)))
+            self._evict()
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        if key in self._lru:
+            self._drop(key)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+
+def _split_state_delta(state: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Splits a state dict into app:, user: and session-scoped parts (temp: is dropped)."""
+    deltas = {"app": {}, "user": {}, "session": {}}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            deltas["app"][key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            deltas["user"][key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            deltas["session"][key] = value
+    return deltas
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    state TEXT NOT NULL, update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_state (app_name TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS user_state (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+class SqliteSessionService(BaseSessionService):
+    """
+    ADK session service backed by a local SQLite database in WAL mode.
+
+    Several processes (uvicorn workers) can open the same file: WAL lets
+    readers run alongside the single writer, and busy_timeout queues writers.
+    Events are buffered and written in one transaction per batch: when a final
+    response arrives (end of a turn), when batch_size events are queued, or
+    after max_delay seconds. Reads flush pending events first, so a worker
+    always sees its own writes and others see every completed turn.
+    SQLite calls run in worker threads, one connection per thread.
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, max_delay: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._local = threading.local()
+        self._pending: List[Tuple[Session, Event]] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.batches_written = 0
+        conn = self._connect()
+        conn.executescript(SQLITE_SCHEMA)
+        self.session_count = self._count_sessions_sync()
+
+    def stats(self) -> Dict[str, int]:
+        """Sessions as of the last refresh_stats() (other workers write to the same file)."""
+        return {"sessions": self.session_count, "pending_events": len(self._pending), "batches_written": self.batches_written}
+
+    def _count_sessions_sync(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def refresh_stats(self):
+        """Re-counts the sessions in a worker thread; called before each /metrics scrape."""
+        self.session_count = await self._run(self._count_sessions_sync)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    # ----- batched event writes -----
+    def _write_batch(self, batch: List[Tuple[Session, Event]]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO events (app_name, user_id, session_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+                [(s.app_name, s.user_id, s.id, e.timestamp, e.model_dump_json(exclude_none=True)) for s, e in batch],
+            )
+            for session, event in batch:
+                deltas = _split_state_delta(event.actions.state_delta if event.actions else None)
+                self._merge_state_row(conn, "sessions", ("app_name", "user_id", "id"),
+                                      (session.app_name, session.user_id, session.id), deltas["session"],
+                                      update_time=event.timestamp)
+                if deltas["app"]:
+                    self._merge_state_row(conn, "app_state", ("app_name",), (session.app_name,), deltas["app"])
+                if deltas["user"]:
+                    self._merge_state_row(conn, "user_state", ("app_name", "user_id"),
+                                          (session.app_name, session.user_id), deltas["user"])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.batches_written += 1
+
+    def _merge_state_row(self, conn: sqlite3.Connection, table: str, key_columns: Tuple[str, ...],
+                         key: Tuple[str, ...], delta: Dict[str, Any], update_time: Optional[float] = None):
+        where = " AND ".join(f"{col} = ?" for col in key_columns)
+        row = conn.execute(f"SELECT state FROM {table} WHERE {where}", key).fetchone()
+        if row is None:
+            if table == "sessions":
+                return  # deleted while the event was queued
+            conn.execute(f"INSERT INTO {table} ({', '.join(key_columns)}, state) VALUES ({', '.join('?' for _ in key)}, ?)",
+                         (*key, json.dumps(delta)))
+            return
+        if delta:
+            state = json.loads(row[0])
+            state.update(delta)
+            conn.execute(f"UPDATE {table} SET state = ? WHERE {where}", (json.dumps(state), *key))
+        if update_time is not None:
+            conn.execute(f"UPDATE {table} SET update_time = MAX(update_time, ?) WHERE {where}", (update_time, *key))
+
+    async def flush(self):
+        """Writes all queued events to the database."""
+        async with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            batch, self._pending = self._pending, []
+            if batch:
+                await self._run(self._write_batch, batch)
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush)
+
+    def _start_flush(self):
+        # Kept until done, so the task isn't garbage collected and close() can wait for it
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("[SESSIONS] background flush failed", exc_info=task.exception())
+
+    async def close(self):
+        """Waits for background flushes, then writes any events still queued."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_tasks:
+            await asyncio.wait(list(self._flush_tasks))
+        await self.flush()
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        self._pending.append((session, event))
+        if (event.author != "user" and event.is_final_response()) or len(self._pending) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule_flush()
+        return event
+
+    # ----- sessions -----
+    def _create_session_sync(self, app_name: str, user_id: str, session_id: str,
+                             state: Optional[Dict[str, Any]]) -> Session:
+        deltas = _split_state_delta(state)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO sessions (app_name, user_id, id, state, update_time) VALUES (?, ?, ?, ?, ?)",
+                         (app_name, user_id, session_id, json.dumps(deltas["session"]), now))
+            if deltas["app"]:
+                self._merge_state_row(conn, "app_state", ("app_name",), (app_name,), deltas["app"])
+            if deltas["user"]:
+                self._merge_state_row(conn, "user_state", ("app_name", "user_id"), (app_name, user_id), deltas["user"])
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        session = Session(app_name=app_name, user_id=user_id, id=session_id,
+                          state=deltas["session"], last_update_time=now)
+        return self._merge_scoped_state(conn, session)
+
+    async def create_session(self, *, app_name: str, user_id: str,
+                             state: Optional[Dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        return await self._run(self._create_session_sync, app_name, user_id, session_id, state)
+
+    def _merge_scoped_state(self, conn: sqlite3.Connection, session: Session) -> Session:
+        row = conn.execute("SELECT state FROM app_state WHERE app_name = ?", (session.app_name,)).fetchone()
+        for key, value in (json.loads(row[0]) if row else {}).items():
+            session.state[State.APP_PREFIX + key] = value
+        row = conn.execute("SELECT state FROM user_state WHERE app_name = ? AND user_id = ?",
+                           (session.app_name, session.user_id)).fetchone()
+        for key, value in (json.loads(row[0]) if row else {}).items():
+            session.state[State.USER_PREFIX + key] = value
+        return session
+
+    def _get_session_sync(self, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig]) -> Optional[Session]:
+        conn = self._connect()
+        row = conn.execute("SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                           (app_name, user_id, session_id)).fetchone()
+        if row is None:
+            return None
+        query = "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+        params: List[Any] = [app_name, user_id, session_id]
+        if config and config.after_timestamp:
+            query += " AND timestamp >= ?"
+            params.append(config.after_timestamp)
+        if config and config.num_recent_events:
+            params.append(config.num_recent_events)
+            rows = conn.execute(query + " ORDER BY seq DESC LIMIT ?", params).fetchall()[::-1]
+        else:
+            rows = conn.execute(query + " ORDER BY seq", params).fetchall()
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=json.loads(row[0]),
+                          events=[Event.model_validate_json(r[0]) for r in rows], last_update_time=row[1])
+        return self._merge_scoped_state(conn, session)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        if self._pending:
+            await self.flush()
+        return await self._run(self._get_session_sync, app_name, user_id, session_id, config)
+
+    def _list_sessions_sync(self, app_name: str, user_id: Optional[str]) -> ListSessionsResponse:
+        conn = self._connect()
+        query = "SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ?"
+        params: List[Any] = [app_name]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        sessions = [
+            self._merge_scoped_state(conn, Session(app_name=app_name, user_id=uid, id=sid,
+                                                   state=json.loads(state), last_update_time=update_time))
+            for uid, sid, state, update_time in conn.execute(query, params).fetchall()
+        ]
+        return ListSessionsResponse(sessions=sessions)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await self._run(self._list_sessions_sync, app_name, user_id)
+
+    def _delete_session_sync(self, app_name: str, user_id: str, session_id: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", (app_name, user_id, session_id))
+        conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id))
+        conn.execute("COMMIT")
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.flush()
+        await self._run(self._delete_session_sync, app_name, user_id, session_id)
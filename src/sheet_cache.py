@@ -0,0 +1,90 @@
+# Versioned read-through cache for sheet lookups.
+#
+# Policy and directory lookups are pure functions of the key and the sheet's
+# contents, so their results are cached and tagged with the sheet version
+# (ETag) they were read at. The version itself is re-read at most every
+# max_staleness seconds; when it has changed, every entry is dropped and
+# reloaded on demand. A steady-state lookup is therefore a dict hit and a
+# clock read, and a change made elsewhere shows up within max_staleness.
+# Writes made through this process call invalidate() and show up at once.
+# Entries are kept in LRU order up to max_entries; a lookup that finds no row
+# (None) is not cached, so unknown keys cannot fill the cache.
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+class VersionedCache:
+    def __init__(self, loader: Callable[[Hashable], Any], version: Callable[[], Hashable],
+                 max_staleness: float = 5.0, clock: Callable[[], float] = time.monotonic, max_entries: int = 10000):
+        self.loader = loader
+        self.version = version
+        self.max_staleness = max_staleness
+        self.clock = clock
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._etag: Hashable = None
+        self._generation = 0  # bumped on every clear, so a load racing with it is not stored
+        self._checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.version_checks = 0
+
+    def get(self, key: Hashable):
+        now = self.clock()
+        if now - self._checked_at >= self.max_staleness:
+            self._revalidate(now)
+        value = self._entries.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:  # dropped by a concurrent clear or eviction
+                pass
+            return value
+        self.misses += 1
+        generation = self._generation
+        value = self.loader(key)
+        if value is None:
+            return value
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def _revalidate(self, now: float):
+        etag = self.version()
+        with self._lock:
+            self.version_checks += 1
+            self._checked_at = now
+            if etag != self._etag:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation += 1
+                self._etag = etag
+
+    def invalidate(self):
+        """Drops every entry and forces a version check on the next lookup."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._checked_at = float("-inf")
+            self.invalidations += 1
+
+    def staleness(self) -> float:
+        """Seconds since the version was last confirmed: the most a cached answer can lag behind."""
+        return max(0.0, self.clock() - self._checked_at) if self._checked_at != float("-inf") else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "invalidations": self.invalidations, "evictions": self.evictions, "version_checks": self.version_checks,
+                "staleness_seconds": self.staleness()}
@@ -0,0 +1,130 @@
+# Compact rows for the three known sheets.
+#
+# A row kept as a dict carries a hash table of its own (~360 bytes for the
+# Audit_Log's seven columns) on top of the values, and rows decoded from disk
+# or an HR export each hold their own copy of strings like "Approved" or
+# "Engineering". Rows of the known sheets are instead instances of a
+# __slots__ class per sheet: the columns are fixed slots, and values from
+# low-cardinality columns (Role, Status, Request_Type, ...) are interned so
+# every row shares one string object per distinct value.
+#
+# The rows still read and write like dicts (row["Role"], row.get(...),
+# row[...] = ..., iteration in column order, == with a dict), so code that
+# handles rows is unchanged. A column the row never had is missing, as in a
+# dict; columns outside the sheet's schema are kept in a per-row dict. Anything
+# handed outside MockGoogleSheets (tool results) is converted with to_dict().
+import sys
+from collections.abc import MutableMapping
+from operator import attrgetter
+from typing import Any, Dict, Iterator, Mapping
+
+_MISSING = object()
+
+class SheetRow(MutableMapping):
+    __slots__ = ("_extra",)
+    COLUMNS: tuple = ()            # slots, in the order a dict row would list them
+    INTERNED: frozenset = frozenset()
+    _COLUMN_SET: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.COLUMNS = cls.__slots__
+        cls._COLUMN_SET = frozenset(cls.__slots__)
+        cls._all_values = staticmethod(attrgetter(*cls.__slots__))  # raises AttributeError if any is unset
+
+    def __init__(self, values: Mapping[str, Any] = {}):
+        self._extra = None
+        columns, interned = self._COLUMN_SET, self.INTERNED
+        for column, value in values.items():
+            if column in columns:
+                # Inlined __setitem__: rows are built on every append
+                setattr(self, column, sys.intern(value) if column in interned and type(value) is str else value)
+            else:
+                self[column] = value
+
+    def __getitem__(self, column: str):
+        if column in self._COLUMN_SET:
+            value = getattr(self, column, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and column in self._extra:
+            return self._extra[column]
+        raise KeyError(column)
+
+    def get(self, column: str, default=None):
+        if column in self._COLUMN_SET:
+            return getattr(self, column, default)
+        return self._extra.get(column, default) if self._extra is not None else default
+
+    def __setitem__(self, column: str, value):
+        if column in self._COLUMN_SET:
+            setattr(self, column, sys.intern(value) if column in self.INTERNED and type(value) is str else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[column] = value
+
+    def __delitem__(self, column: str):
+        try:
+            if column in self._COLUMN_SET:
+                delattr(self, column)
+            else:
+                del self._extra[column]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(column) from None
+
+    def __iter__(self) -> Iterator[str]:
+        for column in self.COLUMNS:
+            if getattr(self, column, _MISSING) is not _MISSING:
+                yield column
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        try:
+            values = dict(zip(self.COLUMNS, self._all_values(self)))
+        except AttributeError:  # some columns were never set
+            values = {}
+            for column in self.COLUMNS:
+                value = getattr(self, column, _MISSING)
+                if value is not _MISSING:
+                    values[column] = value
+        if self._extra:
+            values.update(self._extra)
+        return values
+
+    def copy(self) -> "SheetRow":
+        return type(self)(self.to_dict())
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+class DirectoryRow(SheetRow):
+    __slots__ = ("Employee_Email", "Employee_Name", "Role", "Manager_Email")
+    INTERNED = frozenset({"Role", "Manager_Email"})
+
+class PolicyRow(SheetRow):
+    __slots__ = ("Software_Name", "Role", "Requires_Manager_Approval", "Approval_Contact_Email")
+    INTERNED = frozenset(__slots__)
+
+class AuditRow(SheetRow):
+    __slots__ = ("Employee_Email", "Request_Type", "Software_Name", "Status", "Notes", "Request_ID", "Timestamp")
+    INTERNED = frozenset({"Request_Type", "Software_Name", "Status", "Notes"})
+
+SHEET_ROW_TYPES = {
+    "Employee_Directory": DirectoryRow,
+    "Software_Access_Policy": PolicyRow,
+    "Audit_Log": AuditRow,
+}
+
+def make_row(sheet_name: str, values: Mapping[str, Any]):
+    """A new row for sheet_name holding a copy of values (a plain dict for sheets without a row type)."""
+    row_type = SHEET_ROW_TYPES.get(sheet_name)
+    return row_type(values) if row_type is not None else dict(values)
+
+def to_dict(row):
+    """A plain dict copy of any row, as tools return it."""
+    return row.to_dict() if isinstance(row, SheetRow) else dict(row)
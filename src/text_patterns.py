@@ -0,0 +1,42 @@
+# Text patterns shared by the fast path, the scripted model and compaction.
+#
+# The fast path (src/it_guardian_agent.py) and ScriptedLlm
+# (src/llm_providers.py) read emails and software names out of user messages
+# the same way, and ScriptedLlm and HistoryCompactor (src/compaction.py) read
+# tool results the same way. Keeping the patterns here keeps them in step.
+# Nothing here imports ADK, so the server can import it at start-up.
+import re
+from typing import Any, Dict, List, Optional
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+WORD_PATTERN = re.compile(r"[\w.+#-]+")
+# What find_employee_by_email returns for a known employee
+EMPLOYEE_FOUND_PATTERN = re.compile(r"Employee found: (?P<name>.+), Role: (?P<role>.+)")
+DEPROVISION_WORDS = {"remove", "revoke", "deprovision", "de-provision", "cancel", "disable", "delete", "offboard"}
+MAX_SOFTWARE_NAME_WORDS = 3
+CHARS_PER_TOKEN = 4  # rough prompt size estimate before the model reports usage
+
+def tool_result(response: Optional[Dict[str, Any]]):
+    # ADK wraps non-dict tool results as {"result": value}
+    if isinstance(response, dict) and set(response) == {"result"}:
+        return response["result"]
+    return response
+
+def message_words(text: str) -> List[str]:
+    """Lower-cased words of text with emails left out and trailing punctuation stripped."""
+    return [w.strip(".,!?:;") for w in WORD_PATTERN.findall(EMAIL_PATTERN.sub(" ", text).lower())]
+
+def find_software_name(words: List[str], software_names: Optional[Dict[str, str]]) -> Optional[str]:
+    """
+    Returns the canonical name of the longest known software name in words
+    (see message_words), so "google workspace" beats "google".
+    software_names maps lower-cased names to canonical ones.
+    """
+    if not software_names:
+        return None
+    for size in range(MAX_SOFTWARE_NAME_WORDS, 0, -1):
+        for i in range(len(words) - size + 1):
+            name = software_names.get(" ".join(words[i:i + size]))
+            if name:
+                return name
+    return None
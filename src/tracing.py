@@ -0,0 +1,191 @@
+# Opt-in per-request tracing.
+#
+# A request traced with `X-Trace: 1` (or `?trace=1`) records spans for the
+# session read, the fast path, admission, each agent run attempt, every Runner
+# event, each model call (with prompt/completion token counts) and each tool
+# execution. The timeline is returned compactly in the response and can be
+# saved in Chrome trace-event format, which chrome://tracing, Perfetto and
+# speedscope open directly.
+#
+# The active trace lives in a context variable, so untraced requests pay only
+# one ContextVar lookup per callback.
+import contextvars
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Chrome trace "threads" used to lay spans out in separate lanes
+LANES = {"request": 1, "runner": 1, "model": 2, "tool": 3}
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    """Spans of one request, timed relative to its start."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self._start = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[Any, Dict[str, Any]] = {}
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def begin(self, key: Any, name: str, cat: str, **args):
+        self._open[key] = {"name": name, "cat": cat, "start_ms": self._now_ms(), "args": args}
+
+    def end(self, key: Any, **args) -> Optional[Dict[str, Any]]:
+        span = self._open.pop(key, None)
+        if span is not None:
+            span["dur_ms"] = self._now_ms() - span["start_ms"]
+            span["args"].update(args)
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, cat: str = "request", **args):
+        key = object()
+        self.begin(key, name, cat, **args)
+        try:
+            yield self._open[key]["args"]
+        finally:
+            self.end(key)
+
+    def instant(self, name: str, cat: str = "runner", **args):
+        self.spans.append({"name": name, "cat": cat, "start_ms": self._now_ms(), "dur_ms": 0.0, "args": args})
+
+    def timeline(self) -> Dict[str, Any]:
+        """Compact form returned in API responses."""
+        spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self._now_ms(), 2),
+            "spans": [{"name": s["name"], "cat": s["cat"], "start_ms": round(s["start_ms"], 2),
+                       "dur_ms": round(s["dur_ms"], 2), **s["args"]} for s in spans],
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+                  for lane, tid in (("request", 1), ("model", 2), ("tools", 3))]
+        for s in sorted(self.spans, key=lambda s: s["start_ms"]):
+            event = {"name": s["name"], "cat": s["cat"], "pid": 1, "tid": LANES.get(s["cat"], 1),
+                     "ts": round(s["start_ms"] * 1000, 1), "args": s["args"]}
+            if s["dur_ms"]:
+                event.update(ph="X", dur=round(s["dur_ms"] * 1000, 1))
+            else:
+                event.update(ph="i", s="t")
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"trace_id": self.trace_id, "request": self.name, "started_at": self.wall_start}}
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace-{self.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+@contextmanager
+def maybe_span(name: str, cat: str = "request", **args):
+    """A span on the current trace, or nothing when the request is not traced."""
+    trace = _current.get()
+    if trace is None:
+        yield None
+    else:
+        with trace.span(name, cat, **args) as span_args:
+            yield span_args
+
+class RequestTracer:
+    """
+    Starts traces and provides the LlmAgent callbacks that record model and
+    tool spans. Register before_model_start first and before_model last in
+    before_model_callback, so the gap between them (history compaction and
+    waiting for quota) shows up as its own "model_prep" span.
+    """
+
+    def __init__(self, trace_dir: Optional[str] = None):
+        self.trace_dir = trace_dir
+
+    @contextmanager
+    def trace(self, name: str, enabled: bool):
+        if not enabled:
+            yield None
+            return
+        trace = Trace(name)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+
+    def finish(self, trace: Trace) -> Dict[str, Any]:
+        timeline = trace.timeline()
+        if self.trace_dir:
+            timeline["file"] = trace.save(self.trace_dir)
+        return timeline
+
+    # ----- Runner events -----
+    @staticmethod
+    def record_event(event):
+        trace = _current.get()
+        if trace is None:
+            return
+        parts = event.content.parts if event.content and event.content.parts else []
+        kinds = ["call:" + p.function_call.name for p in parts if p.function_call]
+        kinds += ["result:" + p.function_response.name for p in parts if p.function_response]
+        if any(p.text for p in parts):
+            kinds.append("text")
+        trace.instant(f"event {event.author}", "runner", parts=",".join(kinds), partial=bool(event.partial))
+
+    # ----- LlmAgent callbacks -----
+    def before_model_start(self, callback_context, llm_request):
+        trace = _current.get()
+        if trace is not None:
+            trace.begin("model_prep", "model_prep", "model", contents=len(llm_request.contents))
+        return None
+
+    def before_model(self, callback_context, llm_request):
+        trace = _current.get()
+        if trace is not None:
+            trace.end("model_prep", prompt_contents=len(llm_request.contents))
+            trace.begin("model_call", "model_call", "model")
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        trace = _current.get()
+        if trace is None or llm_response.partial:
+            return None
+        usage = llm_response.usage_metadata
+        parts = llm_response.content.parts if llm_response.content and llm_response.content.parts else []
+        trace.end("model_call",
+                  prompt_tokens=getattr(usage, "prompt_token_count", None),
+                  completion_tokens=getattr(usage, "candidates_token_count", None),
+                  output=",".join(p.function_call.name for p in parts if p.function_call) or "text")
+        return None
+
+    def before_tool(self, tool, args, tool_context):
+        trace = _current.get()
+        if trace is not None:
+            trace.begin(("tool", tool_context.function_call_id), tool.name, "tool")
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        trace = _current.get()
+        if trace is not None:
+            trace.end(("tool", tool_context.function_call_id))
+        return None
+
+    def on_tool_error(self, tool, args, tool_context, error):
+        # after_tool is not called when a tool raises, so the span is closed here
+        trace = _current.get()
+        if trace is not None:
+            trace.end(("tool", tool_context.function_call_id), error=f"{type(error).__name__}: {error}")
+        return None
@@ -0,0 +1,76 @@
+# --- Audit_Log Backend Throughput Benchmark ---
+# Compares append throughput of the in-memory list against the durable
+# segment-file backend (fsync group commit) under concurrent writers.
+#
+#   python test/bench_audit_backend.py [--writers 1 8 32] [--appends 2000]
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-not-used")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.audit_store import InMemoryAuditLog, SegmentFileAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+def run_writers(db: MockGoogleSheets, writers: int, appends_per_writer: int) -> float:
+    barrier = threading.Barrier(writers)
+
+    def writer(n: int):
+        barrier.wait()
+        for i in range(appends_per_writer):
+            db.append_to_sheet("Audit_Log", {
+                "Employee_Email": f"user{n}@company.demo",
+                "Request_Type": "Grant",
+                "Software_Name": f"App{i}",
+                "Status": "Approved",
+                "Notes": "benchmark",
+            })
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Audit_Log backends")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--appends", type=int, default=2000, help="Appends per writer")
+    parser.add_argument("--dir", default=None, help="Directory for segment files (default: temp dir)")
+    args = parser.parse_args()
+
+    print("=" * 76)
+    print(f"{'backend':<14} {'writers':>8} {'appends':>9} {'rows/s':>12} {'fsyncs':>8} {'rows/fsync':>11}")
+    print("=" * 76)
+    for writers in args.writers:
+        total = writers * args.appends
+
+        db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+        elapsed = run_writers(db, writers, args.appends)
+        print(f"{'in-memory':<14} {writers:>8} {total:>9} {total / elapsed:>12,.0f} {'-':>8} {'-':>11}")
+
+        directory = tempfile.mkdtemp(prefix="audit-bench-", dir=args.dir)
+        try:
+            backend = SegmentFileAuditLog(directory)
+            db = MockGoogleSheets(audit_log=backend)
+            elapsed = run_writers(db, writers, args.appends)
+            backend.close()
+            assert len(SegmentFileAuditLog(directory).rows) == total
+            print(f"{'segment-file':<14} {writers:>8} {total:>9} {total / elapsed:>12,.0f} "
+                  f"{backend.fsync_count:>8} {total / backend.fsync_count:>11.1f}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
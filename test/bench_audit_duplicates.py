@@ -0,0 +1,78 @@
+# --- Audit_Log Duplicate-check Benchmark ---
+# Replays synthetic Audit_Log appends and measures check_audit_log_for_duplicate
+# latency as the log grows.
+#
+#   python test/bench_audit_duplicates.py [--appends 1000000]
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-not-used")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import it_guardian_agent
+from src.it_guardian_agent import MockGoogleSheets, check_audit_log_for_duplicate
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+STATUSES = ["Approved", "Pending Manager Approval", "Rejected", "Pending Deprovisioning", "Deprovisioned"]
+
+def percentile(sorted_values, pct: float) -> float:
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Audit_Log duplicate checks")
+    parser.add_argument("--appends", type=int, default=1_000_000)
+    parser.add_argument("--employees", type=int, default=50_000)
+    parser.add_argument("--software", type=int, default=200)
+    parser.add_argument("--check-every", type=int, default=10, help="Run one duplicate check per N appends")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = MockGoogleSheets()
+    # The tool functions read the module-level database
+    it_guardian_agent.mock_sheets_db = db
+
+    samples = []
+    checkpoints = []
+    start = time.perf_counter()
+    for i in range(1, args.appends + 1):
+        email = f"user{rng.randrange(args.employees)}@company.demo"
+        software = f"App{rng.randrange(args.software)}"
+        db.append_to_sheet("Audit_Log", {
+            "Employee_Email": email,
+            "Request_Type": "Grant",
+            "Software_Name": software,
+            "Status": rng.choice(STATUSES),
+            "Notes": "synthetic",
+        })
+        if i % args.check_every == 0:
+            email = f"user{rng.randrange(args.employees)}@company.demo"
+            software = f"App{rng.randrange(args.software)}"
+            t0 = time.perf_counter_ns()
+            check_audit_log_for_duplicate(email, software)
+            samples.append(time.perf_counter_ns() - t0)
+        if i % (args.appends // 10 or 1) == 0:
+            recent = sorted(samples[-1000:])
+            checkpoints.append((i, percentile(recent, 50) / 1000, percentile(recent, 99) / 1000))
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"{'log rows':>12} {'p50 check (us)':>16} {'p99 check (us)':>16}")
+    print("=" * 60)
+    for rows, p50, p99 in checkpoints:
+        print(f"{rows:>12} {p50:>16.2f} {p99:>16.2f}")
+    ordered = sorted(samples)
+    print("=" * 60)
+    print(f"Appends: {args.appends} in {elapsed:.1f}s ({args.appends / elapsed:,.0f}/s incl. checks)")
+    print(f"Checks: {len(samples)}  p50={percentile(ordered, 50) / 1000:.2f}us  "
+          f"p99={percentile(ordered, 99) / 1000:.2f}us  max={ordered[-1] / 1000:.1f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# --- Bulk Ingestion Throughput Benchmark ---
+# Uploads a generated CSV of access requests to /requests/bulk and reports
+# rows per second, compared with sending a sample of the same requests one at
+# a time through /invoke on the fast path. Pass --audit-dir to use the durable
+# Audit_Log backend (one fsync per batch).
+#
+#   python test/bench_bulk.py [--rows 50000] [--batch-size 500] [--audit-dir /tmp/bulk-audit]
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark /requests/bulk throughput")
+parser.add_argument("--rows", type=int, default=50000)
+parser.add_argument("--employees", type=int, default=20000)
+parser.add_argument("--batch-size", type=int, default=500)
+parser.add_argument("--audit-dir", default=None, help="Durable Audit_Log directory (default: in memory)")
+args = parser.parse_args()
+
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+os.environ["FAST_PATH_ENABLED"] = "1"
+os.environ["BULK_BATCH_SIZE"] = str(args.batch_size)
+if args.audit_dir:
+    os.environ["AUDIT_LOG_DIR"] = args.audit_dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from src import it_guardian_agent
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+ROLES = ["Sales", "Engineering", "Design"]
+AUTO_APPROVED = {"Sales": "Salesforce", "Engineering": "GitHub", "Design": "Figma"}
+SOFTWARE = ["Salesforce", "GitHub", "Figma", "Jira"]
+SAMPLE = 500  # requests sent through /invoke for the baseline
+
+def chunks(data: bytes, size: int = 64 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def main():
+    db = it_guardian_agent.mock_sheets_db
+    db.append_rows("Employee_Directory", [
+        {"Employee_Email": f"hire{i}@company.demo", "Employee_Name": f"Hire {i}",
+         "Role": ROLES[i % len(ROLES)], "Manager_Email": "wave.manager@company.demo"}
+        for i in range(args.employees + SAMPLE)
+    ])
+    rng = random.Random(7)
+    lines = ["employee_email,software,request_type"]
+    lines += [f"hire{rng.randrange(args.employees)}@company.demo,{rng.choice(SOFTWARE)},Grant" for _ in range(args.rows)]
+    body = ("\n".join(lines) + "\n").encode()
+
+    client = TestClient(it_guardian_agent.app)
+    # Baseline: the same kind of request one at a time through /invoke (fast path, no model)
+    client.post("/session")  # build the runtime before timing
+    start = time.perf_counter()
+    for i in range(args.employees, args.employees + SAMPLE):
+        software = AUTO_APPROVED[ROLES[i % len(ROLES)]]
+        resp = client.post("/invoke", json={"text": f"I am hire{i}@company.demo, I need {software}"})
+        assert resp.status_code == 200, resp.text
+    per_request = (time.perf_counter() - start) / SAMPLE
+
+    start = time.perf_counter()
+    resp = client.post("/requests/bulk", content=chunks(body), headers={"Content-Type": "text/csv"})
+    elapsed = time.perf_counter() - start
+    results = [json.loads(line) for line in resp.text.splitlines()]
+    summary = results[-1]["summary"]
+    assert resp.status_code == 200 and summary["rows"] == args.rows, resp.text[-500:]
+
+    print("=" * 60)
+    print(f"{args.rows} rows, batch size {args.batch_size}, audit log {'durable' if args.audit_dir else 'in memory'}")
+    print(f"/invoke one at a time: {1 / per_request:>10,.0f} rows/s ({per_request * 1000:.2f} ms each, {SAMPLE} sampled)")
+    print(f"/requests/bulk:        {args.rows / elapsed:>10,.0f} rows/s ({elapsed:.2f}s incl. upload and parsing)")
+    print(f"outcomes: {summary['outcomes']}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# --- Directory Import Benchmark ---
+# Imports a generated HR export into Employee_Directory: first the full
+# export, then the next day's export with some role and manager changes,
+# hires and leavers, which is applied as a delta. Reports rows per second and
+# the importer's peak Python allocation (tracemalloc, in a separate pass so
+# tracing does not slow the timed run), compared with reading the export into
+# memory first. A thread keeps looking up employees throughout, to show how
+# long lookups wait while an import runs.
+#
+#   python test/bench_directory_import.py [--employees 300000] [--changed 0.02]
+
+import argparse
+import csv
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+
+from src.audit_store import InMemoryAuditLog
+from src.directory_import import compute_directory_delta, import_directory
+from src.it_guardian_agent import MockGoogleSheets
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+ROLES = ["Sales", "Engineering", "Design", "Finance", "Support", "Marketing"]
+
+def write_export(path: str, employees: dict):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Employee_Email", "Employee_Name", "Role", "Manager_Email", "Location"])
+        for i, (role, manager) in employees.items():
+            writer.writerow([f"e{i}@company.demo", f"Employee {i}", role, manager, "Remote"])
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+class LookupProbe(threading.Thread):
+    """Looks up random employees until stopped, recording the slowest lookup."""
+
+    def __init__(self, db, employees: int):
+        super().__init__(daemon=True)
+        self.db, self.employees = db, employees
+        self.stop, self.lookups, self.slowest = threading.Event(), 0, 0.0
+
+    def run(self):
+        rng = random.Random(1)
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            self.db.lookup("Employee_Directory", f"e{rng.randrange(self.employees)}@company.demo")
+            self.slowest = max(self.slowest, time.perf_counter() - start)
+            self.lookups += 1
+            time.sleep(0.0005)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming HR directory import")
+    parser.add_argument("--employees", type=int, default=300000)
+    parser.add_argument("--changed", type=float, default=0.02, help="Share of employees changed in the second export")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    employees = {i: (rng.choice(ROLES), f"m{i % 3000}@company.demo") for i in range(args.employees)}
+    workdir = tempfile.mkdtemp()
+    day1, day2 = os.path.join(workdir, "day1.csv"), os.path.join(workdir, "day2.csv")
+    write_export(day1, employees)
+    for i in rng.sample(range(args.employees), int(args.employees * args.changed)):
+        if rng.random() < 0.25:
+            del employees[i]
+        else:
+            employees[i] = (rng.choice(ROLES), employees[i][1] if rng.random() < 0.5 else f"m{rng.randrange(3000)}@company.demo")
+    for i in range(args.employees, args.employees + int(args.employees * args.changed / 4)):
+        employees[i] = (rng.choice(ROLES), f"m{i % 3000}@company.demo")
+    write_export(day2, employees)
+    print(f"exports: {args.employees} rows ({os.path.getsize(day1) / 1e6:.1f} MB), then {len(employees)} rows")
+
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog(), cache_staleness_seconds=0)
+    probe = LookupProbe(db, args.employees)
+    probe.start()
+    print(f"{'import':<10} {'rows/s':>10} {'added':>8} {'updated':>8} {'removed':>8} {'ms':>8}")
+    for name, path in (("day 1", day1), ("day 2", day2)):
+        report = import_directory(db, path)
+        print(f"{name:<10} {report['rows_per_second']:>10,} {report['added']:>8} {report['updated']:>8} "
+              f"{report['removed']:>8} {report['elapsed_ms']:>8.0f}")
+    probe.stop.set()
+    probe.join()
+    assert len(db.indexes["Employee_Directory"]) == len(employees)
+    print(f"lookups during the imports: {probe.lookups}, slowest {probe.slowest * 1000:.2f} ms")
+
+    def delta_streaming():
+        with open(day2, newline="", encoding="utf-8") as f:
+            compute_directory_delta(db, f)
+
+    def load_whole_export():
+        with open(day2, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        return len(rows)
+
+    print(f"peak allocation reading day 2: streaming delta {peak_mb(delta_streaming):.1f} MB, "
+          f"whole export as dicts {peak_mb(load_whole_export):.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# --- Concurrent Evaluator Benchmark ---
+# Runs a large evaluation suite through AgentEvaluator against the app served
+# in-process with the scripted model (fixed per-call latency), and compares
+# the wall time with the longest single conversation. With enough
+# concurrency the two should be close.
+#
+#   python test/bench_evaluator.py [--scenarios 500] [--concurrency 500] [--latency-ms 50]
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark concurrent scenario evaluation")
+parser.add_argument("--scenarios", type=int, default=500)
+parser.add_argument("--concurrency", type=int, default=500)
+parser.add_argument("--latency-ms", type=int, default=50, help="Simulated latency per model call")
+args = parser.parse_args()
+
+os.environ["LLM_PROVIDER"] = "scripted"
+os.environ["SCRIPTED_LLM_LATENCY_MS"] = str(args.latency_ms)
+os.environ["ADMISSION_MAX_CONCURRENT"] = str(args.concurrency)
+os.environ["ADMISSION_MAX_QUEUE"] = str(args.concurrency)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from src import it_guardian_agent
+from run_evaluation import TEST_SCENARIOS, AgentEvaluator
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+async def run(concurrency: int):
+    scenarios = [TEST_SCENARIOS[i % len(TEST_SCENARIOS)] for i in range(args.scenarios)]
+    evaluator = AgentEvaluator(agent_url="http://bench", concurrency=concurrency,
+                               transport=httpx.ASGITransport(app=it_guardian_agent.app))
+    start = time.perf_counter()
+    try:
+        results = await evaluator.evaluate_all(scenarios, verbose=False)
+    finally:
+        await evaluator.close()
+    return time.perf_counter() - start, results
+
+def main():
+    print(f"{args.scenarios} scenarios, scripted model at {args.latency_ms} ms per call")
+    print(f"{'concurrency':>12} {'wall s':>8} {'longest s':>10} {'errors':>7}")
+    for concurrency in sorted({1, min(8, args.concurrency), args.concurrency}):
+        if concurrency == 1 and args.scenarios > 50:
+            continue  # sequential run of a large suite takes too long to be useful
+        elapsed, results = asyncio.run(run(concurrency))
+        longest = max(r["duration_seconds"] for r in results)
+        errors = sum(1 for r in results if r["status"] == "ERROR")
+        print(f"{concurrency:>12} {elapsed:>8.2f} {longest:>10.2f} {errors:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# --- Fast Path Latency Benchmark ---
+# Measures end-to-end /invoke latency for the common auto-approve case when
+# the deterministic fast path answers without any model round-trip.
+#
+#   python test/bench_fast_path.py [--requests 2000]
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-not-used")
+os.environ["FAST_PATH_ENABLED"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from src import it_guardian_agent
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /invoke on the fast path")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    db = it_guardian_agent.mock_sheets_db
+    for i in range(args.requests):
+        db.append_to_sheet("Employee_Directory", {
+            "Employee_Email": f"rep{i}@company.demo", "Employee_Name": f"Rep {i}",
+            "Role": "Sales", "Manager_Email": "sales.manager@company.demo",
+        })
+
+    client = TestClient(it_guardian_agent.app)
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        resp = client.post("/invoke", json={"text": f"I am rep{i}@company.demo, I need Salesforce"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200 and "approved" in resp.json()["text"].lower(), resp.text
+
+    latencies.sort()
+    print("=" * 60)
+    print(f"Fast-path /invoke auto-approvals: {args.requests}")
+    print(f"p50={statistics.median(latencies):.2f}ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.2f}ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# --- /invoke Load Benchmark ---
+# Starts the server with the scripted model (no Gemini calls) and drives
+# multi-turn conversations at target arrival rates, mixing Workflows A-E.
+# Conversations arrive as a Poisson process; each one runs its turns in order.
+# Reports throughput, p50/p95/p99 turn latency, error rate, peak in-flight
+# conversations and server RSS over time, and writes everything to JSON so
+# runs can be compared across commits.
+#
+#   python test/bench_load.py [--rates 5,20,50] [--duration 20] [--latency-ms 200]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the app with a directory of synthetic employees so grants don't all collapse into duplicates
+SERVER_SCRIPT = """
+import logging, sys, uvicorn
+from src import it_guardian_agent
+port, employees = int(sys.argv[1]), int(sys.argv[2])
+for i in range(employees):
+    role, manager = ("Sales", "sales.manager@company.demo") if i % 2 == 0 else ("Engineering", "eng.manager@company.demo")
+    it_guardian_agent.mock_sheets_db.append_to_sheet("Employee_Directory", {
+        "Employee_Email": f"load{i}@company.demo", "Employee_Name": f"Load User {i}", "Role": role, "Manager_Email": manager})
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+uvicorn.run(it_guardian_agent.app, host="127.0.0.1", port=port, log_level="warning")
+"""
+
+# (workflow, weight, role parity needed, messages); {email} is filled per conversation
+WORKFLOW_MIX = [
+    ("A auto-approval", 40, 0, ["Hi", "I am {email}", "I need to get access", "Salesforce"]),
+    ("B manager approval", 20, 0, ["Hi", "I am {email}", "I need to get access", "GitHub", "Yes, please send it."]),
+    ("C no policy", 15, 0, ["Hi", "I am {email}", "I need to get access", "Figma"]),
+    ("D unknown employee", 10, None, ["Hi", "I am {email}"]),
+    ("E de-provisioning", 15, 1, ["Hi", "I am {email}", "I need to remove my access", "GitHub"]),
+]
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+def read_rss_mb(pid: int):
+    """Resident set size of pid in MB (Linux /proc); None elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+class LoadRun:
+    def __init__(self, base_url: str, server_pid: int, employees: int, seed: int):
+        self.base_url = base_url
+        self.server_pid = server_pid
+        self.employees = employees
+        self.rng = random.Random(seed)
+        self.next_employee = {0: 0, 1: 1}  # next synthetic employee index per role parity
+        self.unknown = 0
+
+    def pick_conversation(self):
+        name, _, parity, messages = self.rng.choices(WORKFLOW_MIX, weights=[w[1] for w in WORKFLOW_MIX])[0]
+        if parity is None:
+            self.unknown += 1
+            email = f"new.hire{self.unknown}@company.demo"
+        else:
+            index = self.next_employee[parity]
+            self.next_employee[parity] = (index + 2) % self.employees
+            email = f"load{index}@company.demo"
+        return name, [m.format(email=email) for m in messages]
+
+    async def conversation(self, client, messages, stats):
+        session_id = None
+        for text in messages:
+            payload = {"text": text, **({"session_id": session_id} if session_id else {})}
+            start = time.perf_counter()
+            try:
+                response = await client.post("/invoke", json=payload)
+                ok = response.status_code == 200
+                if ok:
+                    session_id = response.json()["session_id"]
+            except httpx.HTTPError:
+                ok = False
+            stats["latencies_ms" if ok else "error_latencies_ms"].append((time.perf_counter() - start) * 1000)
+            if not ok:
+                return  # the rest of the conversation can't continue without a session
+
+    async def run_level(self, rate: float, duration: float, drain_timeout: float):
+        stats = {"latencies_ms": [], "error_latencies_ms": [], "workflows": {}}
+        in_flight = 0
+        peak_in_flight = 0
+        rss_samples = []
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=120.0, limits=limits) as client:
+            async def tracked(messages):
+                nonlocal in_flight, peak_in_flight
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                try:
+                    await self.conversation(client, messages, stats)
+                finally:
+                    in_flight -= 1
+
+            async def sample_rss():
+                while True:
+                    rss_samples.append({"t": round(time.perf_counter() - start, 1),
+                                        "rss_mb": read_rss_mb(self.server_pid), "in_flight": in_flight})
+                    await asyncio.sleep(1.0)
+
+            start = time.perf_counter()
+            sampler = asyncio.create_task(sample_rss())
+            tasks = []
+            while time.perf_counter() - start < duration:
+                name, messages = self.pick_conversation()
+                stats["workflows"][name] = stats["workflows"].get(name, 0) + 1
+                tasks.append(asyncio.create_task(tracked(messages)))
+                await asyncio.sleep(self.rng.expovariate(rate))
+            done, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            elapsed = time.perf_counter() - start
+            sampler.cancel()
+            rss_samples.append({"t": round(elapsed, 1), "rss_mb": read_rss_mb(self.server_pid), "in_flight": in_flight})
+
+        ok, errors = stats["latencies_ms"], len(stats["error_latencies_ms"])
+        turns = len(ok) + errors
+        rss = [s["rss_mb"] for s in rss_samples if s["rss_mb"] is not None]
+        return {
+            "arrival_rate_per_s": rate,
+            "conversations": len(tasks),
+            "unfinished_conversations": len(pending),
+            "workflows": stats["workflows"],
+            "turns": turns,
+            "throughput_turns_per_s": round(len(ok) / elapsed, 2),
+            "latency_ms": {"p50": round(percentile(ok, 50), 1), "p95": round(percentile(ok, 95), 1),
+                           "p99": round(percentile(ok, 99), 1), "max": round(max(ok, default=0.0), 1)},
+            "error_rate": round(errors / turns, 4) if turns else 0.0,
+            "peak_in_flight_conversations": peak_in_flight,
+            "rss_mb": {"start": rss[0] if rss else None, "peak": max(rss) if rss else None, "end": rss[-1] if rss else None},
+            "rss_timeline": rss_samples,
+            "elapsed_s": round(elapsed, 2),
+        }
+
+def start_server(args):
+    env = dict(os.environ, LLM_PROVIDER="scripted", SCRIPTED_LLM_LATENCY_MS=str(args.latency_ms),
+               SCRIPTED_LLM_JITTER_MS=str(args.latency_ms // 4),
+               ADMISSION_MAX_CONCURRENT=str(args.admission_concurrent), ADMISSION_MAX_QUEUE=str(args.admission_queue),
+               PYTHONPATH=REPO_ROOT)
+    env.pop("LLM_CASSETTE_MODE", None)
+    server = subprocess.Popen([sys.executable, "-c", SERVER_SCRIPT, str(args.port), str(args.employees)], cwd=REPO_ROOT, env=env)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/healthz", timeout=1.0).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not become ready within 60s")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /invoke with a scripted model")
+    parser.add_argument("--rates", default="5,20,50", help="Comma-separated conversation arrival rates per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of arrivals per rate")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="Max seconds to wait for in-flight conversations")
+    parser.add_argument("--latency-ms", type=int, default=200, help="Simulated model latency per call")
+    parser.add_argument("--employees", type=int, default=5000, help="Synthetic employees seeded into the directory")
+    parser.add_argument("--admission-concurrent", type=int, default=1000)
+    parser.add_argument("--admission-queue", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="JSON results path (default: evidence/load_results/load_<timestamp>.json)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output = args.output or os.path.join(REPO_ROOT, "evidence", "load_results", f"load_{timestamp}.json")
+    server = start_server(args)
+    try:
+        run = LoadRun(f"http://127.0.0.1:{args.port}", server.pid, args.employees, args.seed)
+        levels = []
+        print(f"{'rate/s':>7} {'convs':>6} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'peak conc':>9} {'RSS MB':>7}")
+        for rate in [float(r) for r in args.rates.split(",")]:
+            level = asyncio.run(run.run_level(rate, args.duration, args.drain_timeout))
+            levels.append(level)
+            lat = level["latency_ms"]
+            print(f"{rate:>7g} {level['conversations']:>6} {level['throughput_turns_per_s']:>8} {lat['p50']:>8} {lat['p95']:>8} "
+                  f"{lat['p99']:>8} {level['error_rate']:>7.1%} {level['peak_in_flight_conversations']:>9} {level['rss_mb']['peak']!s:>7}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"commit": git_commit(), "timestamp": timestamp, "config": vars(args), "levels": levels}, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
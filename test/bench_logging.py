@@ -0,0 +1,101 @@
+# --- Logging Overhead Benchmark ---
+# Runs the evaluation scenarios against the app served in-process with the
+# scripted model (no model latency, so logging is a visible share of each
+# request) under two logging setups writing to the same file:
+#
+#   before: synchronous text handler on the event loop thread, every
+#           [MOCK_SHEETS] hit/miss and full [MOCK_GMAIL] bodies logged
+#   after:  the queue-backed JSON sink with the default channel sampling
+#
+# Reports mean cost per turn, wall time and how many lines each setup wrote.
+# --sink-delay-ms makes every write slow, like a full pipe or a busy disk; the
+# before setup pays that delay on the event loop, the after setup does not.
+#
+#   python test/bench_logging.py [--scenarios 300] [--concurrency 50] [--sink-delay-ms 0]
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark per-request logging cost")
+parser.add_argument("--scenarios", type=int, default=300)
+parser.add_argument("--concurrency", type=int, default=50)
+parser.add_argument("--sink-delay-ms", type=float, default=0, help="Extra delay added to every log write")
+args = parser.parse_args()
+
+os.environ["LLM_PROVIDER"] = "scripted"
+os.environ["SCRIPTED_LLM_LATENCY_MS"] = "0"
+os.environ["ADMISSION_MAX_CONCURRENT"] = str(args.concurrency)
+os.environ["ADMISSION_MAX_QUEUE"] = str(args.scenarios)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from src import it_guardian_agent
+from src.log_sink import TEXT_FORMAT, channel_logger, configure_logging
+from run_evaluation import TEST_SCENARIOS, AgentEvaluator
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+class SlowFile:
+    """File wrapper whose writes take at least delay seconds."""
+
+    def __init__(self, f, delay: float):
+        self.f, self.delay = f, delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.f.write(text)
+
+    def flush(self):
+        self.f.flush()
+
+def install_before(stream):
+    """The old setup: basicConfig-style handler, every channel at DEBUG."""
+    it_guardian_agent.log_sink.stop()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    logging.getLogger().addHandler(handler)
+    for channel in ("mock_sheets", "mock_gmail"):
+        channel_logger(channel).setLevel(logging.DEBUG)
+    return lambda: (logging.getLogger().removeHandler(handler), handler.flush(),
+                    [channel_logger(c).setLevel(logging.NOTSET) for c in ("mock_sheets", "mock_gmail")])
+
+def install_after(stream):
+    sink = configure_logging(sample_rates={"mock_sheets": "0.1"}, stream=stream)
+    return lambda: sink.stop()
+
+async def run_scenarios():
+    scenarios = [TEST_SCENARIOS[i % len(TEST_SCENARIOS)] for i in range(args.scenarios)]
+    turns = sum(len(s["messages"]) for s in scenarios)
+    evaluator = AgentEvaluator(agent_url="http://bench", concurrency=args.concurrency,
+                               transport=httpx.ASGITransport(app=it_guardian_agent.app))
+    start = time.perf_counter()
+    try:
+        results = await evaluator.evaluate_all(scenarios, verbose=False)
+    finally:
+        elapsed = time.perf_counter() - start
+        await evaluator.close()
+    errors = sum(1 for r in results if r["status"] == "ERROR")
+    return elapsed, turns, errors
+
+def main():
+    print(f"{args.scenarios} scenarios at concurrency {args.concurrency}, sink delay {args.sink_delay_ms:g} ms per write")
+    print(f"{'setup':>7} {'ms/turn':>8} {'wall s':>7} {'lines':>7} {'errors':>7}")
+    for name, install in (("before", install_before), ("after", install_after)):
+        with tempfile.NamedTemporaryFile("w+", suffix=".log") as f:
+            uninstall = install(SlowFile(f, args.sink_delay_ms / 1000))
+            try:
+                elapsed, turns, errors = asyncio.run(run_scenarios())
+            finally:
+                uninstall()
+            f.seek(0)
+            lines = sum(1 for _ in f)
+        print(f"{name:>7} {elapsed / turns * 1000:>8.3f} {elapsed:>7.2f} {lines:>7} {errors:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# --- Policy Cache Benchmark ---
+# Policy and directory lookups against a simulated remote sheet, where every
+# read and every version (ETag) check costs --read-latency-ms. Compares
+# reading the sheet on every check with the versioned read-through cache, and
+# measures how long an edit made to the sheet takes to become visible.
+#
+#   python test/bench_policy_cache.py [--lookups 2000] [--read-latency-ms 20] [--staleness 1]
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.sheet_cache import VersionedCache
+
+ROLES = ["Sales", "Engineering", "Design", "Finance", "Support"]
+SOFTWARE = ["Salesforce", "GitHub", "Figma", "Jira", "Slack", "Zoom", "Notion", "Tableau"]
+
+class RemoteSheet:
+    """Policy rows behind a simulated network round-trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.version = 1
+        self.rows = {(s, r): {"Software_Name": s, "Role": r, "Requires_Manager_Approval": "No"}
+                     for s in SOFTWARE for r in ROLES}
+
+    def read(self, key):
+        time.sleep(self.latency)
+        row = self.rows.get(key)
+        return dict(row) if row else None
+
+    def etag(self):
+        time.sleep(self.latency)
+        return self.version
+
+def run(lookup, keys):
+    latencies = []
+    for key in keys:
+        start = time.perf_counter()
+        lookup(key)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the versioned policy cache")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--read-latency-ms", type=float, default=20)
+    parser.add_argument("--staleness", type=float, default=1.0, help="Max seconds between version checks")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    keys = [(rng.choice(SOFTWARE), rng.choice(ROLES)) for _ in range(args.lookups)]
+    sheet = RemoteSheet(args.read_latency_ms / 1000)
+    cache = VersionedCache(sheet.read, sheet.etag, max_staleness=args.staleness)
+
+    print(f"{args.lookups} policy checks, {args.read_latency_ms:g} ms per sheet read, version checked every {args.staleness:g}s")
+    print(f"{'setup':>9} {'p50 us':>10} {'p99 us':>10} {'mean us':>10} {'sheet reads':>12}")
+    uncached = run(sheet.read, keys[:200])  # every check is a network read; a sample is enough
+    print(f"{'uncached':>9} {statistics.median(uncached):>10.1f} {statistics.quantiles(uncached, n=100)[98]:>10.1f} "
+          f"{statistics.mean(uncached):>10.1f} {len(uncached):>12}")
+    cached = run(cache.get, keys)
+    stats = cache.stats()
+    print(f"{'cached':>9} {statistics.median(cached):>10.1f} {statistics.quantiles(cached, n=100)[98]:>10.1f} "
+          f"{statistics.mean(cached):>10.1f} {stats['misses'] + stats['version_checks']:>12}")
+
+    # Edit the sheet elsewhere and poll until the cache serves the new value
+    key = keys[0]
+    sheet.rows[key]["Requires_Manager_Approval"] = "Yes"
+    sheet.version += 1
+    edited = time.perf_counter()
+    while cache.get(key)["Requires_Manager_Approval"] != "Yes":
+        time.sleep(0.01)
+    print(f"edit visible after {time.perf_counter() - edited:.2f}s (bound {args.staleness:g}s); "
+          f"hits={cache.hits} misses={cache.misses} invalidations={cache.invalidations}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# --- Policy Matrix Benchmark ---
+# Whole-population access-review questions over a generated directory, policy
+# sheet and Audit_Log: asking the policy sheet once per employee or grant
+# (find_policy_for_user, i.e. the indexed + cached lookup) vs the role ×
+# software decision matrix. Also times adding one policy row to the matrix
+# vs compiling it again.
+#
+#   python test/bench_policy_matrix.py [--employees 100000] [--grants 200000] [--roles 40] [--software 300]
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+
+from src.audit_store import InMemoryAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+from src.policy_matrix import AUTO_APPROVE, PolicyMatrix
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the role x software policy matrix")
+    parser.add_argument("--employees", type=int, default=100000)
+    parser.add_argument("--grants", type=int, default=200000)
+    parser.add_argument("--roles", type=int, default=40)
+    parser.add_argument("--software", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    roles = [f"Role{i}" for i in range(args.roles)]
+    software = [f"App{i}" for i in range(args.software)]
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog(), cache_staleness_seconds=3600)
+    db.append_rows("Software_Access_Policy", [
+        {"Software_Name": s, "Role": r, "Requires_Manager_Approval": rng.choice(["No", "Yes"]),
+         "Approval_Contact_Email": "it-support@company.demo"}
+        for s in software for r in roles if rng.random() < 0.3
+    ])
+    employee_roles = [rng.choice(roles) for _ in range(args.employees)]
+    db.append_rows("Employee_Directory", [
+        {"Employee_Email": f"e{i}@company.demo", "Employee_Name": f"E {i}", "Role": role,
+         "Manager_Email": "m@company.demo"} for i, role in enumerate(employee_roles)
+    ])
+    # Grants that policy auto-approved when they were made...
+    auto = {}
+    for row in db.sheets["Software_Access_Policy"]:
+        if row["Requires_Manager_Approval"] == "No":
+            auto.setdefault(row["Role"], []).append(row["Software_Name"])
+    grants = []
+    while len(grants) < args.grants:
+        i = rng.randrange(args.employees)
+        if auto.get(employee_roles[i]):
+            grants.append({"Employee_Email": f"e{i}@company.demo", "Request_Type": "Grant", "Status": "Approved",
+                           "Software_Name": rng.choice(auto[employee_roles[i]]), "Notes": "Auto-approved by policy"})
+    db.append_rows("Audit_Log", grants)
+    # ...then 5% of employees change role and 1% leave
+    for i in rng.sample(range(args.employees), args.employees // 20):
+        db.sheets["Employee_Directory"][i]["Role"] = rng.choice(roles)
+    del db.sheets["Employee_Directory"][-(args.employees // 100):]
+    db.indexes["Employee_Directory"] = {}
+    for row in db.sheets["Employee_Directory"]:
+        db._index_row("Employee_Directory", row)
+    db.versions["Employee_Directory"] += 1
+    db.caches["Employee_Directory"].invalidate()
+    target = software[0]
+    print(f"{args.employees} employees, {len(db.audit_index)} latest grants, "
+          f"{len(db.sheets['Software_Access_Policy'])} policy rows ({args.roles} roles x {args.software} apps)")
+
+    def auto_approved_per_row():
+        return [row["Employee_Email"] for row in db.sheets["Employee_Directory"]
+                if (p := db.find_row_matching("Software_Access_Policy", {"Software_Name": target, "Role": row["Role"]}))
+                and p["Requires_Manager_Approval"] == "No"]
+
+    def violations_per_row():
+        found = []
+        for row in db.audit_index.values():
+            if row["Status"] != "Approved":
+                continue
+            emp = db.lookup("Employee_Directory", row["Employee_Email"])
+            policy = emp and db.find_row_matching("Software_Access_Policy", {"Software_Name": row["Software_Name"], "Role": emp["Role"]})
+            if not policy or policy["Requires_Manager_Approval"] != "No":
+                found.append(row)
+        return found
+
+    _, compile_ms = timed(db.policy_matrix)
+    _, encode_ms = timed(db.directory_codes)
+    print(f"compile matrix: {compile_ms:.1f} ms, encode directory: {encode_ms:.1f} ms (once per change)")
+    print(f"{'question':<32} {'per-row ms':>11} {'matrix ms':>10}")
+    slow, slow_ms = timed(auto_approved_per_row)
+    fast, fast_ms = timed(lambda: db.employees_with_decision(target, AUTO_APPROVE))
+    assert sorted(slow) == sorted(fast)
+    print(f"{'auto-approved for ' + target:<32} {slow_ms:>11.1f} {fast_ms:>10.1f}   ({len(fast)} employees)")
+    slow, slow_ms = timed(violations_per_row)
+    fast, fast_ms = timed(db.policy_violations)
+    assert len(slow) == len(fast)
+    print(f"{'grants violating policy':<32} {slow_ms:>11.1f} {fast_ms:>10.1f}   ({len(fast)} grants)")
+
+    new_row = {"Software_Name": "NewApp", "Role": roles[0], "Requires_Manager_Approval": "No",
+               "Approval_Contact_Email": "it-support@company.demo"}
+    _, rebuild_ms = timed(lambda: PolicyMatrix(db.sheets["Software_Access_Policy"] + [new_row]))
+    _, apply_ms = timed(lambda: db.append_to_sheet("Software_Access_Policy", new_row))
+    assert db.policy_matrix().decision(roles[0], "NewApp") == AUTO_APPROVE
+    print(f"policy row added: incremental {apply_ms:.2f} ms (append incl.) vs full compile {rebuild_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
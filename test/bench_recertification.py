@@ -0,0 +1,94 @@
+# --- Recertification Benchmark ---
+# Recertifies a generated Audit_Log of Approved grants: the first (full) run
+# checks every grant; after a night's worth of directory and policy changes
+# the incremental run only checks the grants those changes touch. Reports
+# grants checked, flagged and time for each run, plus how long checking every
+# grant again would have taken.
+#
+#   python test/bench_recertification.py [--employees 200000] [--grants 1000000] [--changed 0.01]
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+
+from src.audit_store import InMemoryAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+from src.recertification import Recertifier
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+IT = "it-support@company.demo"
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental access recertification")
+    parser.add_argument("--employees", type=int, default=200000)
+    parser.add_argument("--grants", type=int, default=1000000)
+    parser.add_argument("--roles", type=int, default=40)
+    parser.add_argument("--software", type=int, default=300)
+    parser.add_argument("--changed", type=float, default=0.01, help="Share of employees changed between runs")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    roles = [f"Role{i}" for i in range(args.roles)]
+    software = [f"App{i}" for i in range(args.software)]
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog(), cache_staleness_seconds=3600)
+    db.append_rows("Software_Access_Policy", [
+        {"Software_Name": s, "Role": r, "Requires_Manager_Approval": rng.choice(["No", "Yes"]), "Approval_Contact_Email": IT}
+        for s in software for r in roles if rng.random() < 0.3
+    ])
+    employee_roles = [rng.choice(roles) for _ in range(args.employees)]
+    db.append_rows("Employee_Directory", [
+        {"Employee_Email": f"e{i}@company.demo", "Employee_Name": f"E {i}", "Role": role,
+         "Manager_Email": f"m{i % 2000}@company.demo"} for i, role in enumerate(employee_roles)
+    ])
+    auto = {}
+    for row in db.sheets["Software_Access_Policy"]:
+        if row["Requires_Manager_Approval"] == "No":
+            auto.setdefault(row["Role"], []).append(row["Software_Name"])
+    grants = []
+    while len(grants) < args.grants:
+        i = rng.randrange(args.employees)
+        if auto.get(employee_roles[i]):
+            grants.append({"Employee_Email": f"e{i}@company.demo", "Request_Type": "Grant", "Status": "Approved",
+                           "Software_Name": rng.choice(auto[employee_roles[i]]), "Notes": "Auto-approved by policy"})
+    db.append_rows("Audit_Log", grants)
+
+    notices = []
+    async def append_rows(rows):
+        return db.append_rows("Audit_Log", rows)
+    recertifier = Recertifier(db, append_rows, lambda **message: notices.append(message), IT)
+
+    print(f"{args.employees} employees, {len(db.audit_index)} latest grants")
+    print(f"{'run':<28} {'checked':>9} {'flagged':>8} {'emails':>7} {'ms':>9}")
+    def show(name, report):
+        print(f"{name:<28} {report['evaluated']:>9} {report['revoked']:>8} {report['notices']:>7} {report['elapsed_ms']:>9.1f}")
+
+    show("first run (full)", await recertifier.run())
+
+    # Overnight: some employees change role, half as many leave, one policy row changes
+    changed = rng.sample(range(args.employees), int(args.employees * args.changed))
+    movers, leavers = changed[len(changed) // 3:], changed[:len(changed) // 3]
+    db.update_rows("Employee_Directory",
+                   upserts=[{"Employee_Email": f"e{i}@company.demo", "Employee_Name": f"E {i}", "Role": rng.choice(roles),
+                             "Manager_Email": f"m{i % 2000}@company.demo"} for i in movers],
+                   deletes=[(f"e{i}@company.demo",) for i in leavers])
+    flipped = dict(next(row for row in db.sheets["Software_Access_Policy"] if row["Requires_Manager_Approval"] == "No"))
+    flipped["Requires_Manager_Approval"] = "Yes"
+    db.update_rows("Software_Access_Policy", upserts=[flipped])
+    show(f"next run ({len(changed)} employees)", await recertifier.run())
+
+    start = time.perf_counter()
+    violations = db.policy_violations()
+    print(f"{'checking every grant again':<28} {len(db.audit_index):>9} {len(violations):>8} {'':>7} "
+          f"{(time.perf_counter() - start) * 1000:>9.1f}")
+    assert not violations, "every violation should already be flagged"
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# --- Sheet Row Memory Benchmark ---
+# Bytes per row for each known sheet, held as dicts (before) vs the slotted
+# rows of src/sheet_rows.py (after). Rows are decoded from JSON lines, as the
+# durable Audit_Log recovers them and as HR exports arrive, so every row comes
+# with its own value strings; the slotted rows share interned values. Also
+# reports the whole MockGoogleSheets footprint (rows plus indexes) for the
+# Audit_Log.
+#
+#   python test/bench_row_memory.py [--rows 100000]
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "scripted")
+
+from src.audit_store import InMemoryAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+from src.sheet_rows import make_row
+
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+ROLES = ["Sales", "Engineering", "Design", "Finance", "Support", "Marketing"]
+STATUSES = ["Approved", "Pending Manager Approval", "Pending Deprovisioning", "Rejected"]
+NOTES = ["Auto-approved by policy", "Policy requires manager approval", "No policy for role", ""]
+
+def sample_lines(sheet: str, count: int, rng: random.Random):
+    for i in range(count):
+        if sheet == "Employee_Directory":
+            row = {"Employee_Email": f"e{i}@company.demo", "Employee_Name": f"Employee {i}",
+                   "Role": rng.choice(ROLES), "Manager_Email": f"m{i % 500}@company.demo"}
+        elif sheet == "Software_Access_Policy":
+            row = {"Software_Name": f"App{i % 300}", "Role": rng.choice(ROLES), "Requires_Manager_Approval": rng.choice(["Yes", "No"]),
+                   "Approval_Contact_Email": "it-support@company.demo"}
+        else:
+            row = {"Employee_Email": f"e{rng.randrange(count)}@company.demo", "Request_Type": rng.choice(["Grant", "Deprovision"]),
+                   "Software_Name": f"App{rng.randrange(300)}", "Status": rng.choice(STATUSES), "Notes": rng.choice(NOTES),
+                   "Request_ID": str(1001 + i), "Timestamp": "2026-01-05T09:30:00.123456"}
+        yield json.dumps(row)
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bytes per row of the sheets")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'sheet':<24} {'dict B/row':>11} {'slotted B/row':>14} {'saved':>7}")
+    for sheet in ("Employee_Directory", "Software_Access_Policy", "Audit_Log"):
+        lines = list(sample_lines(sheet, args.rows, random.Random(2)))
+        before = measure(lambda: [json.loads(line) for line in lines]) / args.rows
+        after = measure(lambda: [make_row(sheet, json.loads(line)) for line in lines]) / args.rows
+        print(f"{sheet:<24} {before:>11.0f} {after:>14.0f} {1 - after / before:>7.0%}")
+
+    lines = list(sample_lines("Audit_Log", args.rows, random.Random(2)))
+    rows = [json.loads(line) for line in lines]
+
+    def audit_log_as_dicts():
+        # What recovery held before: the decoded dicts in the log, plus the index
+        log = InMemoryAuditLog()
+        log.rows.extend(json.loads(line) for line in lines)
+        index = {(row["Employee_Email"].lower(), row["Software_Name"]): row for row in log.rows}
+        return log, index
+
+    def audit_log_recovered():
+        log = InMemoryAuditLog()
+        log.rows.extend(json.loads(line) for line in lines)
+        return MockGoogleSheets(audit_log=log)
+
+    before, after = measure(audit_log_as_dicts), measure(audit_log_recovered)
+    print(f"recovered Audit_Log with index: {before / args.rows:.0f} -> {after / args.rows:.0f} bytes per row "
+          f"({before / 1e6:.0f} MB -> {after / 1e6:.0f} MB for {len(rows)} rows)")
+
+if __name__ == "__main__":
+    main()
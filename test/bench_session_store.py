@@ -0,0 +1,75 @@
+# --- Session Store Benchmark ---
+# Simulates N uvicorn workers sharing one SQLite session file. Each worker
+# runs conversation turns (read session, append a user/tool/model event batch)
+# and the aggregate turns/s is reported per worker count.
+#
+#   python test/bench_session_store.py [--workers 1 2 4] [--turns 500]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP = "it-access-guardian"
+USER = "default_user"
+
+def worker(db_path: str, turns: int, ready_queue, start_event, result_queue):
+    from google.adk.events import Event
+    from google.genai import types
+    from src.session_services import SqliteSessionService
+
+    def event(author: str, role: str, text: str) -> Event:
+        return Event(author=author, content=types.Content(role=role, parts=[types.Part(text=text)]))
+
+    async def run():
+        store = SqliteSessionService(db_path)
+        session = await store.create_session(app_name=APP, user_id=USER)
+        ready_queue.put(True)
+        start_event.wait()
+        start = time.perf_counter()
+        for i in range(turns):
+            if i % 4 == 0:
+                # A new conversation every few turns keeps session history short
+                session = await store.create_session(app_name=APP, user_id=USER)
+            session = await store.get_session(app_name=APP, user_id=USER, session_id=session.id)
+            await store.append_event(session, event("user", "user", f"turn {i}"))
+            await store.append_event(session, event("AccessBot", "model", "x" * 400))
+        return time.perf_counter() - start
+
+    result_queue.put(asyncio.run(run()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite session service across processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--turns", type=int, default=500, help="Turns per worker")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print(f"{'workers':>8} {'turns':>8} {'turns/s':>12}")
+    print("=" * 50)
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "sessions.db")
+            ready = multiprocessing.Queue()
+            start_event = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=worker, args=(db_path, args.turns, ready, start_event, results))
+                     for _ in range(workers)]
+            for p in procs:
+                p.start()
+            for _ in procs:
+                ready.get()  # every worker has imported ADK and opened the database
+            start_event.set()
+            elapsed = max(results.get() for _ in procs)
+            for p in procs:
+                p.join()
+            total = workers * args.turns
+            print(f"{workers:>8} {total:>8} {total / elapsed:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# --- MockGoogleSheets Lookup Micro-benchmark ---
+# Shows that indexed lookups stay flat as the sheets grow, compared with
+# the full-sheet scan the tools used to do.
+#
+#   python test/bench_sheet_lookups.py [--sizes 10 1000 100000 1000000]
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-not-used")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.it_guardian_agent import MockGoogleSheets
+
+# Keep the per-call INFO lines out of the timings
+logging.getLogger("it-access-guardian").setLevel(logging.WARNING)
+
+def build_sheets(size: int) -> MockGoogleSheets:
+    db = MockGoogleSheets()
+    for i in range(size):
+        db.append_to_sheet("Employee_Directory", {
+            "Employee_Email": f"user{i}@company.demo",
+            "Employee_Name": f"User {i}",
+            "Role": "Sales",
+            "Manager_Email": "sales.manager@company.demo",
+        })
+        db.append_to_sheet("Software_Access_Policy", {
+            "Software_Name": f"App{i}",
+            "Role": "Sales",
+            "Requires_Manager_Approval": "No",
+            "Approval_Contact_Email": "it-support@company.demo",
+        })
+    return db
+
+def scan_employee(db: MockGoogleSheets, email: str):
+    """The pre-index lookup: walk every row and lower-case both sides."""
+    for emp in db.sheets["Employee_Directory"]:
+        if emp["Employee_Email"].lower() == email.lower():
+            return emp
+    return None
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MockGoogleSheets lookups")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000, 1_000_000])
+    parser.add_argument("--iterations", type=int, default=10_000, help="Indexed lookups per size")
+    parser.add_argument("--scan-iterations", type=int, default=20, help="Full scans per size")
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"{'rows':>10} {'employee idx (us)':>18} {'policy idx (us)':>16} {'employee scan (us)':>20}")
+    print("=" * 72)
+    for size in args.sizes:
+        db = build_sheets(size)
+        # Worst case for a scan: the last row appended
+        email = f"USER{size - 1}@company.demo"
+        software = f"App{size - 1}"
+        assert db.lookup("Employee_Directory", email) is not None
+        employee_us = time_per_call(lambda: db.lookup("Employee_Directory", email), args.iterations)
+        policy_us = time_per_call(
+            lambda: db.find_row_matching("Software_Access_Policy", {"Software_Name": software, "Role": "Sales"}),
+            args.iterations,
+        )
+        scan_us = time_per_call(lambda: scan_employee(db, email), args.scan_iterations)
+        print(f"{size:>10} {employee_us:>18.2f} {policy_us:>16.2f} {scan_us:>20.1f}")
+
+if __name__ == "__main__":
+    main()
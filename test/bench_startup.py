@@ -0,0 +1,90 @@
+# --- Cold Start Benchmark ---
+# Starts fresh server processes with the scripted model and measures, from
+# process spawn:
+#   import:    time to import src.it_guardian_agent (separate process)
+#   listening: first HTTP answer from /healthz (a replica can take traffic)
+#   ready:     /healthz returns 200 (the agent and Runner are built)
+#   first:     a first /invoke sent the moment the server listens completes
+# Reports the median over --runs starts.
+#
+#   python test/bench_startup.py [--runs 5]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = "import sys, uvicorn; from src import it_guardian_agent; " \
+                "uvicorn.run(it_guardian_agent.app, host='127.0.0.1', port=int(sys.argv[1]), log_level='warning')"
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import src.it_guardian_agent; print(time.perf_counter() - start)"
+
+def server_env():
+    env = dict(os.environ, LLM_PROVIDER="scripted", PYTHONPATH=REPO_ROOT, LOG_LEVEL="WARNING")
+    env.pop("LLM_CASSETTE_MODE", None)
+    return env
+
+def measure_import() -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=REPO_ROOT, env=server_env(),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_start(port: int, timeout: float = 120.0):
+    """Seconds from spawn until the server listens, until it is ready, and until a first /invoke returns."""
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", SERVER_SCRIPT, str(port)], cwd=REPO_ROOT, env=server_env())
+    listening = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while listening is None:
+                if server.poll() is not None or time.perf_counter() - start > timeout:
+                    raise RuntimeError("server did not start")
+                try:
+                    status = client.get("/healthz").status_code
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+                listening = time.perf_counter() - start
+                if status == 200:
+                    ready = listening
+            def first_invoke():
+                client.post("/invoke", json={"text": "Hi"}).raise_for_status()
+                return time.perf_counter() - start
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                invoke = pool.submit(first_invoke)
+                while ready is None:
+                    if client.get("/healthz").status_code == 200:
+                        ready = time.perf_counter() - start
+                    else:
+                        time.sleep(0.01)
+                first = invoke.result()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return listening, ready, first
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    imports, starts = [], []
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        starts.append(measure_start(args.port))
+    listening, ready, first = (statistics.median(column) for column in zip(*starts))
+    print(f"median of {args.runs} cold starts (seconds from spawn)")
+    print(f"  import src.it_guardian_agent  {statistics.median(imports):6.2f}")
+    print(f"  listening (/healthz answers)  {listening:6.2f}")
+    print(f"  ready (/healthz 200)          {ready:6.2f}")
+    print(f"  first /invoke done            {first:6.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# The suite runs offline: use the scripted model unless LLM_PROVIDER says otherwise.
+# Set before any test module imports src.it_guardian_agent, which reads it at import.
+os.environ.setdefault("LLM_PROVIDER", "scripted")
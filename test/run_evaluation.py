@@ -2,6 +2,7 @@
 # LLM-as-Judge evaluation for the IT Guardian Agent
 # Run this after starting the agent server
 
+import asyncio
 import httpx
 import json
 import time
@@ -90,13 +91,51 @@ TEST_SCENARIOS = [
 ]
 
 class AgentEvaluator:
-    """Evaluates the IT Guardian Agent using LLM-as-Judge"""
+    """Evaluates the IT Guardian Agent using LLM-as-Judge.
+
+    Scenarios run concurrently on one pooled httpx.AsyncClient: turns within a
+    conversation stay in order, while up to `concurrency` conversations are in
+    flight at once and requests are paced to at most `rate` per second (None =
+    unpaced). The server paces its own Gemini calls, so no fixed sleeps are needed.
+    """
     
-    def __init__(self, agent_url="http://127.0.0.1:8000"):
+    def __init__(self, agent_url="http://127.0.0.1:8000", turn_delay=0, concurrency=8, rate=None, transport=None):
         self.agent_url = agent_url
-        self.client = httpx.Client(timeout=60.0)
+        self.client = httpx.AsyncClient(
+            base_url=agent_url, timeout=60.0, transport=transport,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        # Optional think time between turns of one conversation
+        self.turn_delay = turn_delay
+        self.concurrency = concurrency
+        self.rate = rate
+        self._next_request_at = 0.0
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _pace(self):
+        """Spaces requests 1/rate seconds apart across all conversations"""
+        if not self.rate:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_request_at)
+        self._next_request_at = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def invoke(self, payload: Dict[str, Any], max_attempts: int = 5) -> httpx.Response:
+        """POST /invoke, waiting out 429 responses for as long as the server's Retry-After asks"""
+        for attempt in range(max_attempts):
+            await self._pace()
+            response = await self.client.post("/invoke", json=payload)
+            if response.status_code != 429 or attempt == max_attempts - 1:
+                break
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        response.raise_for_status()
+        return response
         
-    def run_conversation(self, messages: List[str]) -> Dict[str, Any]:
+    async def run_conversation(self, messages: List[str]) -> Dict[str, Any]:
         """Run a conversation with the agent and return the full transcript"""
         session_id = None
         transcript = []
@@ -106,8 +145,7 @@ class AgentEvaluator:
             if session_id:
                 payload["session_id"] = session_id
                 
-            response = self.client.post(f"{self.agent_url}/invoke", json=payload)
-            response.raise_for_status()
+            response = await self.invoke(payload)
             
             data = response.json()
             if not session_id:
@@ -118,23 +156,23 @@ class AgentEvaluator:
                 "agent": data.get("text", ""),
             })
             
-            # Add delay between conversation turns (except after last message)
-            if i < len(messages) - 1:
-                time.sleep(10)  # 10 seconds between turns to stay under rate limit
+            # Optional think time between conversation turns (except after last message)
+            if self.turn_delay and i < len(messages) - 1:
+                await asyncio.sleep(self.turn_delay)
             
         return {
             "session_id": session_id,
             "transcript": transcript
-        }    
-    def evaluate_scenario(self, scenario: Dict[str, Any]) -> Dict[str, Any]:
-        """Evaluate a single test scenario"""
-        print(f"\n{'='*60}")
-        print(f"Testing: {scenario['name']}")
-        print(f"{'='*60}")
+        }
+
+    async def evaluate_scenario(self, scenario: Dict[str, Any], verbose: bool = True) -> Dict[str, Any]:
+        """Evaluate a single test scenario; its report is printed as one block once it finishes"""
+        lines = [f"\n{'='*60}", f"Testing: {scenario['name']}", f"{'='*60}"]
+        start = time.perf_counter()
         
         try:
             # Run the conversation
-            result = self.run_conversation(scenario['messages'])
+            result = await self.run_conversation(scenario['messages'])
             
             # Extract conversation for evaluation
             conversation_text = "\n".join([
@@ -142,8 +180,7 @@ class AgentEvaluator:
                 for turn in result['transcript']
             ])
             
-            print(f"\nConversation:")
-            print(conversation_text)
+            lines += ["\nConversation:", conversation_text]
             
             # Evaluate based on criteria
             last_agent_response = result['transcript'][-1]['agent'] if result['transcript'] else ""
@@ -151,10 +188,9 @@ class AgentEvaluator:
             # Simple keyword-based evaluation (can be enhanced with actual LLM-as-judge)
             criteria_met = self.check_criteria(last_agent_response, scenario)
             
-            print(f"\nCriteria: {scenario['criteria']}")
-            print(f"Evaluation: {'[PASS]' if criteria_met else '[FAIL]'}")
+            lines += [f"\nCriteria: {scenario['criteria']}", f"Evaluation: {'[PASS]' if criteria_met else '[FAIL]'}"]
             
-            return {
+            report = {
                 "scenario": scenario['name'],
                 "status": "PASS" if criteria_met else "FAIL",
                 "conversation": conversation_text,
@@ -162,12 +198,26 @@ class AgentEvaluator:
             }
             
         except Exception as e:
-            print(f"[ERROR]: {str(e)}")
-            return {
+            lines.append(f"[ERROR]: {str(e)}")
+            report = {
                 "scenario": scenario['name'],
                 "status": "ERROR",
                 "error": str(e)
             }
+        report["duration_seconds"] = round(time.perf_counter() - start, 3)
+        if verbose:
+            print("\n".join(lines))
+        return report
+
+    async def evaluate_all(self, scenarios: List[Dict[str, Any]], verbose: bool = True) -> List[Dict[str, Any]]:
+        """Evaluate scenarios concurrently (at most `concurrency` at a time); results keep scenario order"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(scenario):
+            async with semaphore:
+                return await self.evaluate_scenario(scenario, verbose=verbose)
+
+        return list(await asyncio.gather(*(bounded(s) for s in scenarios)))
     
     def check_criteria(self, response: str, scenario: Dict[str, Any]) -> bool:
         """Basic criteria check - can be enhanced with actual LLM-as-judge"""
@@ -176,26 +226,20 @@ class AgentEvaluator:
         return len(response.strip()) > 0
 
     
-def main():
+async def main():
     """Run all evaluation scenarios"""
     print("="*60)
     print("IT Guardian Agent Evaluation")
     print("="*60)
     print("\nEnsure the agent server is running at http://127.0.0.1:8000")
-    print("NOTE: Adding delays between tests to respect Gemini API rate limits (10 requests/min)")
+    print("NOTE: The server paces Gemini calls to its configured quota (GEMINI_RPM/GEMINI_TPM)")
     print("Starting evaluation...\n")
     
     evaluator = AgentEvaluator()
-    results = []
-    
-    for i, scenario in enumerate(TEST_SCENARIOS):
-        result = evaluator.evaluate_scenario(scenario)
-        results.append(result)
-        
-        # Add delay between scenarios to avoid rate limits (except after last test)
-        if i < len(TEST_SCENARIOS) - 1:
-            print("\n[Waiting 15 seconds to respect API rate limits...]")
-            time.sleep(15)  # Wait 15 seconds between scenarios
+    try:
+        results = await evaluator.evaluate_all(TEST_SCENARIOS)
+    finally:
+        await evaluator.close()
     
     # Summary
     print(f"\n{'='*60}")
@@ -220,7 +264,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        results = main()
+        results = asyncio.run(main())
     except httpx.ConnectError:
         print("\n[ERROR] Could not connect to the agent server.")
         print("Please ensure the server is running at http://127.0.0.1:8000")
@@ -1,6 +1,7 @@
 # --- Batch Evaluation Script with Auto-Recording ---
-# Run evaluation in batches + automatically record all output
+# Run evaluation scenarios concurrently + automatically record all output
 
+import asyncio
 import httpx
 import json
 import time
@@ -27,11 +28,10 @@ class TeeOutput:
             output.flush()
 
 def main():
-    parser = argparse.ArgumentParser(description="Run evaluation in batches with auto-recording")
-    parser.add_argument("--batch-size", type=int, default=2, help="Number of scenarios per batch (default: 2)")
-    parser.add_argument("--batch-delay", type=int, default=60, help="Delay between batches in seconds (default: 60)")
-    parser.add_argument("--turn-delay", type=int, default=10, help="Delay between conversation turns (default: 10)")
-    parser.add_argument("--scenario-delay", type=int, default=15, help="Delay between scenarios (default: 15)")
+    parser = argparse.ArgumentParser(description="Run evaluation scenarios concurrently with auto-recording")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scenarios run at the same time (default: 8)")
+    parser.add_argument("--rate", type=float, default=None, help="Max requests per second across all scenarios (default: unlimited)")
+    parser.add_argument("--turn-delay", type=int, default=0, help="Delay between conversation turns (default: 0)")
     parser.add_argument("--start", type=int, default=0, help="Start index (0-based)")
     parser.add_argument("--end", type=int, default=None, help="End index (exclusive)")
     
@@ -53,46 +53,26 @@ def main():
         
         print(f"📹 Recording to: {log_file_path}")
         print("="*60)
-        print("IT Guardian Agent - Batch Evaluation with Recording")
+        print("IT Guardian Agent - Concurrent Evaluation with Recording")
         print("="*60)
         print(f"Running scenarios {args.start} to {end_idx-1} (Total: {len(scenarios_to_run)})")
-        print(f"Batch size: {args.batch_size}")
-        print(f"Batch delay: {args.batch_delay}s")
+        print(f"Concurrency: {args.concurrency}")
+        print(f"Rate limit: {f'{args.rate}/s' if args.rate else 'none'}")
         print(f"Turn delay: {args.turn_delay}s")
-        print(f"Scenario delay: {args.scenario_delay}s")
         print(f"Recording: {log_file_path}")
         print("="*60)
         
-        evaluator = AgentEvaluator()
-        all_results = []
-        
-        # Process in batches
-        for batch_num in range(0, len(scenarios_to_run), args.batch_size):
-            batch = scenarios_to_run[batch_num:batch_num + args.batch_size]
-            batch_idx = batch_num // args.batch_size + 1
-            total_batches = (len(scenarios_to_run) + args.batch_size - 1) // args.batch_size
-            
-            print(f"\n{'='*60}")
-            print(f"📦 BATCH {batch_idx}/{total_batches}")
-            print(f"{'='*60}")
-            
-            batch_results = []
-            for i, scenario in enumerate(batch):
-                result = evaluator.evaluate_scenario(scenario)
-                batch_results.append(result)
-                all_results.append(result)
-                
-                # Delay between scenarios (except last in batch)
-                if i < len(batch) - 1:
-                    print(f"\n⏰ [Waiting {args.scenario_delay}s between scenarios...]")
-                    time.sleep(args.scenario_delay)
-            
-            # Delay between batches (except last batch)
-            if batch_num + args.batch_size < len(scenarios_to_run):
-                print(f"\n{'='*60}")
-                print(f"✅ [BATCH {batch_idx} COMPLETE - Waiting {args.batch_delay}s before next batch...]")
-                print(f"{'='*60}")
-                time.sleep(args.batch_delay)
+        async def run_all():
+            evaluator = AgentEvaluator(turn_delay=args.turn_delay, concurrency=args.concurrency, rate=args.rate)
+            try:
+                # Scenarios run concurrently; each prints its report once it finishes
+                return await evaluator.evaluate_all(scenarios_to_run)
+            finally:
+                await evaluator.close()
+
+        start = time.perf_counter()
+        all_results = asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
         
         # Summary
         print(f"\n{'='*60}")
@@ -107,6 +87,8 @@ def main():
         print(f"Passed: {passed}")
         print(f"Failed: {failed}")
         print(f"Errors: {errors}")
+        longest = max((r["duration_seconds"] for r in all_results), default=0.0)
+        print(f"Wall time: {elapsed:.1f}s (longest scenario {longest:.1f}s)")
         
         # Save results to JSON file
         json_file = f"evidence/evaluation_results/evaluation_batch_results_{args.start}_{end_idx-1}_{timestamp}.json"
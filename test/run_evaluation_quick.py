@@ -26,12 +26,16 @@ class AgentEvaluator:
         session_id = None
         transcript = []
         
-        for i, msg in enumerate(messages):
+        for msg in messages:
             payload = {"text": msg}
             if session_id:
                 payload["session_id"] = session_id
                 
             response = self.client.post(f"{self.agent_url}/invoke", json=payload)
+            if response.status_code == 429:
+                # Server is at capacity; it says when to come back
+                time.sleep(float(response.headers.get("Retry-After", "1")))
+                response = self.client.post(f"{self.agent_url}/invoke", json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -40,9 +44,6 @@ class AgentEvaluator:
                 
             transcript.append({"user": msg, "agent": data.get("text", "")})
             
-            if i < len(messages) - 1:
-                time.sleep(10)
-            
         return {"session_id": session_id, "transcript": transcript}
     
     def evaluate_scenario(self, scenario: Dict[str, Any]) -> Dict[str, Any]:
@@ -73,13 +74,9 @@ def main():
     evaluator = AgentEvaluator()
     results = []
     
-    for i, scenario in enumerate(TEST_SCENARIOS):
+    for scenario in TEST_SCENARIOS:
         result = evaluator.evaluate_scenario(scenario)
         results.append(result)
-        
-        if i < len(TEST_SCENARIOS) - 1:
-            print("\n[Waiting 15 seconds...]")
-            time.sleep(15)
     
     print(f"\n{'='*60}")
     print("SUMMARY")
@@ -13,6 +13,10 @@ from pathlib import Path
 import signal
 import atexit
 
+import httpx
+
+SERVER_URL = "http://127.0.0.1:8000"
+
 class ServerAndClientLogger:
     def __init__(self):
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -22,17 +26,26 @@ class ServerAndClientLogger:
         self.client_log_file = f"evidence/evaluation_results/client_logs_{self.timestamp}.log"
         self.server_process = None
         
-    def start_server(self):
-        """Start the server with logging"""
+    def start_server(self, cassette=None, record=False, startup_timeout=60.0):
+        """Start the server with logging (optionally recording or replaying model calls)"""
         print("🚀 Starting IT Guardian Agent Server...")
         print(f"📝 Server logs: {self.server_log_file}")
         
+        env = dict(os.environ)
+        if cassette:
+            if record and os.path.exists(cassette):
+                os.remove(cassette)  # a fresh recording, not appended to the old one
+            env["LLM_CASSETTE_PATH"] = cassette
+            env["LLM_CASSETTE_MODE"] = "record" if record else "replay"
+            print(f"📼 {'Recording model calls to' if record else 'Replaying model calls from'}: {cassette}")
+        
         # Open log file for server output
         self.server_log = open(self.server_log_file, 'w', encoding='utf-8')
         
         # Start server process with output redirection
         self.server_process = subprocess.Popen(
             [sys.executable, 'src/it_guardian_agent.py'],
+            env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             universal_newlines=True,
@@ -51,18 +64,25 @@ class ServerAndClientLogger:
         self.log_thread = threading.Thread(target=log_server_output, daemon=True)
         self.log_thread.start()
         
-        # Wait for server to start
-        print("⏳ Waiting for server to start (15 seconds)...")
-        time.sleep(15)
-        
-        if self.server_process.poll() is not None:
-            print("❌ Server failed to start!")
-            return False
-        
-        print("✅ Server is running!")
-        return True
+        # Wait until /healthz reports the agent is ready
+        print("⏳ Waiting for server to become ready...")
+        start = time.perf_counter()
+        deadline = start + startup_timeout
+        while time.perf_counter() < deadline:
+            if self.server_process.poll() is not None:
+                print("❌ Server failed to start!")
+                return False
+            try:
+                if httpx.get(f"{SERVER_URL}/healthz", timeout=1.0).status_code == 200:
+                    print(f"✅ Server is ready after {time.perf_counter() - start:.1f}s!")
+                    return True
+            except httpx.HTTPError:
+                pass  # not listening yet
+            time.sleep(0.2)
+        print(f"❌ Server was not ready within {startup_timeout:.0f}s!")
+        return False
     
-    def run_evaluation(self, batch_size=2, start=0, end=None):
+    def run_evaluation(self, concurrency=8, start=0, end=None):
         """Run the evaluation with logging"""
         print(f"\n📊 Starting Evaluation...")
         print(f"📝 Client logs: {self.client_log_file}")
@@ -71,7 +91,7 @@ class ServerAndClientLogger:
         cmd = [
             sys.executable, 
             'test/run_evaluation_batch_recorded.py',
-            '--batch-size', str(batch_size),
+            '--concurrency', str(concurrency),
             '--start', str(start)
         ]
         
@@ -111,10 +131,12 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="Run complete evaluation with server and client logging")
-    parser.add_argument("--batch-size", type=int, default=2, help="Batch size for evaluation")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scenarios evaluated at the same time")
     parser.add_argument("--start", type=int, default=0, help="Start scenario index")
     parser.add_argument("--end", type=int, default=None, help="End scenario index")
     parser.add_argument("--no-server", action="store_true", help="Don't start server (assume already running)")
+    parser.add_argument("--cassette", default=None, help="Replay model calls from this cassette file (no API calls)")
+    parser.add_argument("--record", action="store_true", help="Record model calls to --cassette instead of replaying them")
     
     args = parser.parse_args()
     
@@ -130,7 +152,7 @@ def main():
     try:
         # Start server if needed
         if not args.no_server:
-            if not logger.start_server():
+            if not logger.start_server(cassette=args.cassette, record=args.record):
                 print("❌ Failed to start server. Exiting.")
                 return 1
         else:
@@ -138,7 +160,7 @@ def main():
         
         # Run evaluation
         success = logger.run_evaluation(
-            batch_size=args.batch_size,
+            concurrency=args.concurrency,
             start=args.start,
             end=args.end
         )
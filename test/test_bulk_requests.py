@@ -0,0 +1,43 @@
+import pytest
+
+from src.bulk_requests import BulkFormatError, BulkRequestParser, bulk_format, read_batches
+
+def test_csv_rows_split_across_chunks_keep_their_line_numbers():
+    """Verify that CSV records are parsed incrementally, in any column order, with source line numbers."""
+    parser = BulkRequestParser(bulk_format("text/csv; charset=utf-8"))
+    body = ("﻿Software,Employee_Email,Request_Type\r\n"
+            "Salesforce,sam.sales@company.demo,\r\n"
+            "\r\n"
+            "GitHub, edna.eng@company.demo ,Revoke\r\n"
+            "Figma,,Grant\r\n"
+            "Jira,sam.sales@company.demo,Upgrade\r\n"
+            "Zoom,sam.sales@company.demo").encode()
+    records = []
+    for i in range(0, len(body), 7):
+        records.extend(parser.feed(body[i:i + 7]))
+    records.extend(parser.close())
+    assert records == [
+        {"line": 2, "employee_email": "sam.sales@company.demo", "software": "Salesforce", "request_type": "Grant"},
+        {"line": 4, "employee_email": "edna.eng@company.demo", "software": "GitHub", "request_type": "Deprovision"},
+        {"line": 5, "error": "missing employee_email"},
+        {"line": 6, "error": "unknown request_type 'Upgrade'"},
+        {"line": 7, "employee_email": "sam.sales@company.demo", "software": "Zoom", "request_type": "Grant"},
+    ]
+    with pytest.raises(BulkFormatError):
+        BulkRequestParser("csv").feed(b"email_address,app\n")
+
+async def test_json_lines_are_read_in_batches():
+    """Verify that JSON lines become batches of at most batch_size records, bad lines included as errors."""
+    async def chunks():
+        yield b'{"employee_email": "sam.sales@company.demo", "software_name": "GitHub"}\n[1, 2]\n'
+        yield b'{"employee_email": "edna.eng@company.demo", "software": "GitHub", "request_type": "deprovision"}\n{oops\n'
+        yield b'{"email": "sam.sales@company.demo", "software": "Figma"}'
+
+    batches = [batch async for batch in read_batches(chunks(), BulkRequestParser(bulk_format("application/x-ndjson")), 2)]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    records = [record for batch in batches for record in batch]
+    assert records[0]["software"] == "GitHub" and records[2]["request_type"] == "Deprovision"
+    assert records[1] == {"line": 2, "error": "expected a JSON object"}
+    assert records[3]["error"].startswith("invalid JSON")
+    assert records[4]["employee_email"] == "sam.sales@company.demo"
+    assert bulk_format("text/plain") is None
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from src.compaction import HistoryCompactor, extract_workflow_facts
+
+def user(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+def model(text):
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+def call(name, **args):
+    return types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))])
+
+def result(name, response):
+    return types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name=name, response=response))])
+
+def conversation():
+    return [
+        user("Hi"),
+        model("Hello! What's your email?"),
+        user("I am sam.sales@company.demo"),
+        call("find_employee_by_email", email="sam.sales@company.demo"),
+        result("find_employee_by_email", {"result": "Employee found: Sam Sales, Role: Sales"}),
+        model("Thanks Sam. What software do you need?"),
+        user("Salesforce"),
+        call("find_policy_for_user", software_name="Salesforce", user_role="Sales"),
+        result("find_policy_for_user", {"Software_Name": "Salesforce", "Role": "Sales", "Requires_Manager_Approval": "No", "Approval_Contact_Email": "it-support@company.demo"}),
+        call("append_to_audit_log", employee_email="sam.sales@company.demo", request_type="Grant", software_name="Salesforce", status="Approved", notes=""),
+        result("append_to_audit_log", {"Employee_Email": "sam.sales@company.demo", "Software_Name": "Salesforce", "Status": "Approved", "Request_ID": "1001"}),
+        model("Approved! Request ID 1001."),
+        user("Thanks, what was my request ID again?"),
+    ]
+
+def test_extract_workflow_facts():
+    """Verify that verified employee, role, software and request ID are pulled from tool payloads."""
+    facts = extract_workflow_facts(conversation())
+    assert facts["email"] == "sam.sales@company.demo"
+    assert facts["role"] == "Sales"
+    assert facts["software"] == "Salesforce"
+    assert facts["request_id"] == "1001"
+    assert facts["status"] == "Approved"
+
+def test_compaction_folds_old_turns_and_tool_payloads():
+    """Verify that older turns collapse into a summary while the latest turns stay verbatim."""
+    observed = {}
+    compactor = HistoryCompactor(keep_turns=1, observe_prompt=observed.__setitem__)
+    request = LlmRequest(contents=conversation())
+    request.config.system_instruction = "instructions"
+
+    compactor.before_model(None, request)
+
+    assert len(request.contents) == 1
+    summary, question = request.contents[0].parts
+    assert "Sam Sales <sam.sales@company.demo>, role: Sales" in summary.text
+    assert "Audit log Request ID: 1001" in summary.text
+    assert question.text == "Thanks, what was my request ID again?"
+    assert not any(p.function_call or p.function_response for c in request.contents for p in c.parts)
+    assert compactor.stats["compacted_calls"] == 1
+    assert compactor.stats["chars_saved"] > 0
+    assert 0 < observed["after"] < observed["before"] and "reported" not in observed
+    compactor.after_model(None, SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=42)))
+    assert observed["reported"] == 42
+
+def test_compaction_waits_for_established_facts():
+    """Verify that history is left alone until the employee has been looked up."""
+    compactor = HistoryCompactor(keep_turns=1)
+    contents = [user("Hi"), model("Hello! What's your email?"), user("I need access"), model("Sure, your email?"), user("Salesforce")]
+    request = LlmRequest(contents=list(contents))
+    compactor.before_model(None, request)
+    assert request.contents == contents
+    assert compactor.stats["compacted_calls"] == 0
+    assert compactor.stats["last_prompt_chars"] > 0
+
+def test_prompt_size_stays_flat_as_conversation_grows():
+    """Verify that the compacted prompt does not grow with the number of turns."""
+    compactor = HistoryCompactor(keep_turns=2)
+    history = conversation()
+    sizes = []
+    for i in range(10):
+        history += [model(f"Anything else? ({i})"), user(f"Follow-up question {i}")]
+        compactor.before_model(None, LlmRequest(contents=list(history)))
+        sizes.append(compactor.stats["last_prompt_chars"])
+    assert max(sizes[5:]) - min(sizes[5:]) < 50
@@ -0,0 +1,70 @@
+import asyncio
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from src.coordination import RequestCoalescer, SessionLocks
+from src.llm_providers import ScriptedLlm
+
+async def test_coalescer_makes_identical_requests_wait_for_the_owner():
+    """Verify that a second claim on the same (employee, software) waits until the first is released."""
+    coalescer = RequestCoalescer()
+    key = coalescer.key(" Sam.Sales@company.demo", "GitHub")
+    assert not await coalescer.acquire(key, "first")
+    assert not await coalescer.acquire(coalescer.key("sam.sales@company.demo", "Salesforce"), "second")
+
+    waiter = asyncio.create_task(coalescer.acquire(("sam.sales@company.demo", "github"), "second"))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    coalescer.release_owner("first")
+    assert await waiter is True
+    assert coalescer.owner_of(key) == "second" and coalescer.waits == 1
+
+async def test_stale_claim_is_taken_over_after_timeout():
+    """Verify that an owner that never releases only delays other requests by the timeout."""
+    coalescer = RequestCoalescer(timeout=0.05)
+    await coalescer.acquire(("a@company.demo", "figma"), "stuck")
+    assert await asyncio.wait_for(coalescer.acquire(("a@company.demo", "figma"), "next"), timeout=1) is True
+    assert coalescer.owner_of(("a@company.demo", "figma")) == "next"
+
+async def test_session_lock_serializes_turns_and_is_dropped_afterwards():
+    """Verify that turns on one session never overlap, other sessions do, and idle locks are removed."""
+    locks = SessionLocks()
+    running, overlaps = set(), []
+
+    async def turn(session_id):
+        async with locks.hold(session_id):
+            overlaps.append(session_id in running)
+            running.add(session_id)
+            await asyncio.sleep(0.01)
+            running.discard(session_id)
+
+    await asyncio.gather(turn("s1"), turn("s1"), turn("s1"), turn("s2"))
+    assert overlaps == [False] * 4 and len(locks) == 0
+    async with locks.hold(None):
+        assert len(locks) == 0  # new sessions need no lock
+
+async def test_concurrent_identical_requests_create_one_audit_row():
+    """Verify that two sessions asking for the same access at once produce one Audit_Log row, not two."""
+    from src.it_guardian_agent import create_it_guardian_agent, mock_sheets_db
+
+    email = "double.click@company.demo"
+    mock_sheets_db.append_to_sheet("Employee_Directory", {
+        "Employee_Email": email, "Employee_Name": "Double Click", "Role": "Sales", "Manager_Email": "sales.manager@company.demo"})
+    agent = create_it_guardian_agent()
+    agent.model = ScriptedLlm(software_names=mock_sheets_db.software_names, latency_seconds=0.02)
+    sessions = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="it-access-guardian", session_service=sessions)
+
+    async def request():
+        session = await sessions.create_session(app_name="it-access-guardian", user_id=email)
+        message = types.Content(role="user", parts=[types.Part(text=f"I am {email}, I need Salesforce")])
+        texts = [p.text async for event in runner.run_async(user_id=email, session_id=session.id, new_message=message)
+                 if event.content and event.content.role == "model" for p in event.content.parts if p.text]
+        return " ".join(texts)
+
+    replies = await asyncio.gather(request(), request())
+    rows = [r for r in mock_sheets_db.read_sheet("Audit_Log") if r["Employee_Email"] == email]
+    assert len(rows) == 1
+    assert sum("already have a request" in reply for reply in replies) == 1
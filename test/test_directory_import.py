@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+from src.audit_store import InMemoryAuditLog
+from src.directory_import import DirectoryImportError, compute_directory_delta, import_directory
+from src.it_guardian_agent import MockGoogleSheets
+
+def test_hr_export_is_applied_as_a_delta(tmp_path):
+    """Verify that only added, changed and departed employees are written, and unchanged rows are left alone."""
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    export = tmp_path / "hr.csv"
+    export.write_text(
+        "﻿Work_Email,Full_Name,Role,Manager_Email,Cost_Center\n"
+        "Sam.Sales@company.demo, Sam Sales ,Sales,sales.manager@company.demo,100\n"
+        "dana.design@company.demo,Dana Designer,Design,design.manager@company.demo,200\n"
+        "\n"
+        ",No Email,Sales,sales.manager@company.demo,100\n"
+        "dana.design@company.demo,Dana Again,Design,design.manager@company.demo,200\n"
+        "eve.eng@company.demo,Eve Engineer,Engineering,eng.manager@company.demo,300\n",
+        encoding="utf-8")
+    version = db.versions["Employee_Directory"]
+    report = import_directory(db, str(export))
+    assert {k: report[k] for k in ("rows", "invalid", "duplicates", "added", "updated", "removed")} == \
+        {"rows": 5, "invalid": 1, "duplicates": 1, "added": 2, "updated": 1, "removed": 1}
+    assert (report["role_changes"], report["manager_changes"]) == (0, 0)  # Sam's email case and name spacing differ
+    assert report["rows_per_second"] > 0
+    assert db.lookup("Employee_Directory", "edna.eng@company.demo") is None
+    assert db.lookup("Employee_Directory", "dana.design@company.demo")["Employee_Name"] == "Dana Designer"
+    assert db.changed_keys("Employee_Directory", version) == {
+        ("sam.sales@company.demo",), ("dana.design@company.demo",), ("eve.eng@company.demo",), ("edna.eng@company.demo",)}
+
+    # Next day: Eve moves to Sales under a new manager; nothing else changes
+    lines = export.read_text(encoding="utf-8").splitlines()
+    lines[-1] = "eve.eng@company.demo,Eve Engineer,Sales,sales.manager@company.demo,300"
+    delta = compute_directory_delta(db, io.StringIO("\n".join(lines)))
+    assert [row["Employee_Email"] for row in delta.upserts] == ["eve.eng@company.demo"] and delta.deletes == []
+    assert (delta.counts["role_changes"], delta.counts["manager_changes"]) == (1, 1)
+
+def test_unusable_exports_leave_the_directory_untouched(tmp_path):
+    """Verify that an export without required columns or without valid rows is rejected before anything is applied."""
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    with pytest.raises(DirectoryImportError, match="Role"):
+        compute_directory_delta(db, io.StringIO("email,name\nsam.sales@company.demo,Sam\n"))
+    truncated = tmp_path / "truncated.csv"
+    truncated.write_text("Employee_Email,Role\n", encoding="utf-8")
+    with pytest.raises(DirectoryImportError, match="no valid rows"):
+        import_directory(db, str(truncated))
+    assert len(db.sheets["Employee_Directory"]) == 2 and not db.journal["Employee_Directory"]
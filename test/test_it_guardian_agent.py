@@ -6,8 +6,6 @@ from google.adk.sessions import InMemorySessionService
 from google.genai import types
 from src.it_guardian_agent import create_it_guardian_agent, mock_sheets_db
 
-import time
-
 # ... imports ...
 
 # Helper to run a turn
@@ -38,12 +36,9 @@ async def run_turn(runner: Runner, session_id: str, user_id: str, text: str) ->
 
 @pytest_asyncio.fixture
 async def services():
-    # Rate limit handling: sleep before each test to avoid hitting Gemini API limits.
-    # The free tier has a limit of 15 requests per minute (RPM).
-    # Since each test makes multiple API calls, a 40s sleep ensures we stay within quota
-    # and avoid 'google.genai.errors.ResourceExhausted' errors.
-    time.sleep(40) 
-    
+    # Rate limit handling: the agent's model calls go through the process-wide
+    # model_rate_limiter (GEMINI_RPM, default 15 requests per minute), which
+    # waits for quota before each call instead of a fixed sleep per test.
     agent = create_it_guardian_agent()
     session_store = InMemorySessionService()
     runner = Runner(agent=agent, app_name="it-access-guardian", session_service=session_store)
@@ -250,3 +245,353 @@ def test_api_session_persistence():
         # Restore original method
         runner.run_async = original_run
 
+
+def test_sheet_indexes_follow_appends():
+    """Verify that employee and policy lookups use the indexes maintained by append_to_sheet."""
+    from src.it_guardian_agent import MockGoogleSheets
+
+    db = MockGoogleSheets()
+    assert db.lookup("Employee_Directory", "SAM.SALES@company.demo")["Employee_Name"] == "Sam Sales"
+    assert db.lookup("Employee_Directory", "new.hire@company.demo") is None
+
+    db.append_to_sheet("Employee_Directory", {"Employee_Email": "new.hire@company.demo", "Employee_Name": "New Hire", "Role": "Design", "Manager_Email": "design.manager@company.demo"})
+    db.append_to_sheet("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Design", "Requires_Manager_Approval": "No", "Approval_Contact_Email": "it-support@company.demo"})
+
+    assert db.lookup("Employee_Directory", "New.Hire@company.demo")["Role"] == "Design"
+    policy = db.find_row_matching("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Design"})
+    assert policy is not None and policy["Requires_Manager_Approval"] == "No"
+    assert db.find_row_matching("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Sales"}) is None
+    # Exact-match semantics are preserved for non-normalized criteria
+    assert db.find_row_matching("Employee_Directory", {"Employee_Email": "SAM.SALES@company.demo"}) is None
+
+def test_audit_index_tracks_latest_open_request():
+    """Verify that duplicate checks see the latest Audit_Log row and honour its status."""
+    from src.it_guardian_agent import MockGoogleSheets
+
+    db = MockGoogleSheets()
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub") is None
+
+    pending = db.append_to_sheet("Audit_Log", {"Employee_Email": "sam.sales@company.demo", "Request_Type": "Grant", "Software_Name": "GitHub", "Status": "Pending Manager Approval", "Notes": ""})
+    assert db.latest_audit_entry("Sam.Sales@company.demo", "GitHub", open_only=True) is pending
+
+    rejected = db.append_to_sheet("Audit_Log", {"Employee_Email": "sam.sales@company.demo", "Request_Type": "Grant", "Software_Name": "GitHub", "Status": "Rejected", "Notes": ""})
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub") is rejected
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub", open_only=True) is None
+
+    approved = db.append_to_sheet("Audit_Log", {"Employee_Email": "sam.sales@company.demo", "Request_Type": "Grant", "Software_Name": "GitHub", "Status": "Approved", "Notes": ""})
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub", open_only=True) is approved
+
+    db.append_to_sheet("Audit_Log", {"Employee_Email": "sam.sales@company.demo", "Request_Type": "Deprovision", "Software_Name": "GitHub", "Status": "Pending Deprovisioning", "Notes": ""})
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub", open_only=True) is None
+
+def test_audit_lookups_ignore_the_case_of_the_software_name():
+    """Verify that a request logged as "GitHub" is found as "github" or " GITHUB ", like the single-flight key."""
+    from src.coordination import RequestCoalescer
+    from src.it_guardian_agent import MockGoogleSheets
+
+    db = MockGoogleSheets()
+    pending = db.append_to_sheet("Audit_Log", {"Employee_Email": "Sam.Sales@company.demo", "Request_Type": "Grant", "Software_Name": "GitHub", "Status": "Pending Manager Approval", "Notes": ""})
+    assert db.latest_audit_entry("sam.sales@company.demo", "github", open_only=True) is pending
+    assert db.latest_audit_entry("SAM.SALES@company.demo", " GITHUB ") is pending
+    assert db._audit_key("Sam.Sales@company.demo", "GitHub") == RequestCoalescer.key("sam.sales@company.demo", "github")
+    assert len(db.audit_index) == 1
+
+def test_fast_path_extraction():
+    """Verify that the pre-router only picks up complete grant requests."""
+    from src.it_guardian_agent import extract_fast_path_request
+
+    assert extract_fast_path_request("I am sam.sales@company.demo, I need Salesforce.") == ("sam.sales@company.demo", "Salesforce")
+    assert extract_fast_path_request("sam.sales@company.demo needs github please") == ("sam.sales@company.demo", "GitHub")
+    assert extract_fast_path_request("I need access to Salesforce") is None
+    assert extract_fast_path_request("I am sam.sales@company.demo") is None
+    assert extract_fast_path_request("I am sam.sales@company.demo, please remove my GitHub access") is None
+
+def test_fast_path_leaves_anything_but_a_plain_grant_to_the_agent():
+    """Verify that negations, removals, questions and other people's emails are not fast-pathed as grants."""
+    from src.it_guardian_agent import extract_fast_path_request
+
+    for text in ("I am sam.sales@company.demo and I no longer need GitHub",
+                 "I am sam.sales@company.demo and I don't need GitHub",
+                 "I am sam.sales@company.demo, what is the status of my GitHub request?",
+                 "I am sam.sales@company.demo, please take away my Salesforce access",
+                 "Does edna.eng@company.demo have GitHub?",
+                 "I am sam.sales@company.demo, give GitHub access to edna.eng@company.demo",
+                 "Please give GitHub access to edna.eng@company.demo",
+                 "sam.sales@company.demo GitHub",
+                 "I am Sam, please email edna.eng@company.demo, I need GitHub",
+                 "please email edna.eng@company.demo, I need GitHub"):
+        assert extract_fast_path_request(text) is None, text
+    assert extract_fast_path_request("This is sam.sales@company.demo. I want access to GitHub") == ("sam.sales@company.demo", "GitHub")
+    assert extract_fast_path_request("My email: sam.sales@company.demo, I need GitHub") == ("sam.sales@company.demo", "GitHub")
+
+def test_fast_path_endpoint_skips_llm(monkeypatch):
+    """Verify that /invoke resolves a complete request without calling the runner."""
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+    from src.audit_store import InMemoryAuditLog
+    from src.it_guardian_agent import app, runner, MockGoogleSheets
+
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    monkeypatch.setattr(it_guardian_agent, "mock_sheets_db", db)
+    monkeypatch.setattr(it_guardian_agent, "FAST_PATH_ENABLED", True)
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("runner should not be called on the fast path")
+        yield
+    monkeypatch.setattr(runner, "run_async", no_llm)
+
+    client = TestClient(app)
+    resp = client.post("/invoke", json={"text": "I am sam.sales@company.demo, I need Salesforce"})
+    assert resp.status_code == 200
+    assert "approved" in resp.json()["text"].lower()
+    assert db.latest_audit_entry("sam.sales@company.demo", "Salesforce")["Status"] == "Approved"
+
+    resp = client.post("/invoke", json={"text": "sam.sales@company.demo needs GitHub", "session_id": resp.json()["session_id"]})
+    assert "manager" in resp.json()["text"].lower()
+    assert db.latest_audit_entry("sam.sales@company.demo", "GitHub")["Status"] == "Pending Manager Approval"
+
+    resp = client.post("/invoke", json={"text": "I am sam.sales@company.demo, I need Salesforce"})
+    assert "already" in resp.json()["text"].lower()
+    assert len(db.read_sheet("Audit_Log")) == 2
+
+def test_invoke_stream_sse_events(monkeypatch):
+    """Verify that /invoke/stream emits progress and text events before the final done event."""
+    import json
+    from fastapi.testclient import TestClient
+    from google.adk.events import Event
+    from src.it_guardian_agent import app, runner
+
+    def model_event(partial=None, **part):
+        return Event(author="AccessBot", partial=partial, content=types.Content(role="model", parts=[types.Part(**part)]))
+
+    async def mock_gen(*args, **kwargs):
+        yield model_event(function_call=types.FunctionCall(name="find_policy_for_user", args={}))
+        yield model_event(partial=True, text="Your request ")
+        yield model_event(partial=True, text="is approved.")
+        yield model_event(text="Your request is approved.")
+    monkeypatch.setattr(runner, "run_async", mock_gen)
+
+    client = TestClient(app)
+    resp = client.post("/invoke/stream", json={"text": "I need Salesforce"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+
+    assert [name for name, _ in events] == ["session", "progress", "text", "text", "done"]
+    assert events[1][1]["message"] == "Checking policy…"
+    done = events[-1][1]
+    assert done["text"] == "Your request is approved."
+    assert done["session_id"] == events[0][1]["session_id"]
+    assert 0 <= done["ttfb_ms"] <= done["total_ms"]
+
+def test_invoke_rejects_overflow_with_retry_after(monkeypatch):
+    """Verify that /invoke answers 429 with Retry-After when admission is full."""
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+    from src.it_guardian_agent import app, runner
+    from src.rate_limit import AdmissionController
+
+    monkeypatch.setattr(it_guardian_agent, "admission", AdmissionController(max_concurrent=0, max_queue=0))
+    monkeypatch.setattr(it_guardian_agent, "FAST_PATH_ENABLED", False)
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("rejected requests should not reach the runner")
+        yield
+    monkeypatch.setattr(runner, "run_async", no_llm)
+
+    client = TestClient(app)
+    for path in ("/invoke", "/invoke/stream"):
+        resp = client.post(path, json={"text": "Hi"})
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+
+def test_fast_path_answers_without_an_admission_slot(monkeypatch):
+    """Verify that deterministic replies on /invoke and /invoke/stream are served while admission is full."""
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+    from src.audit_store import InMemoryAuditLog
+    from src.it_guardian_agent import MockGoogleSheets, app
+    from src.rate_limit import AdmissionController
+
+    monkeypatch.setattr(it_guardian_agent, "mock_sheets_db", MockGoogleSheets(audit_log=InMemoryAuditLog()))
+    monkeypatch.setattr(it_guardian_agent, "admission", AdmissionController(max_concurrent=0, max_queue=0))
+    monkeypatch.setattr(it_guardian_agent, "FAST_PATH_ENABLED", True)
+
+    client = TestClient(app)
+    resp = client.post("/invoke", json={"text": "I am sam.sales@company.demo, I need Salesforce"})
+    assert resp.status_code == 200 and "approved" in resp.json()["text"].lower()
+    resp = client.post("/invoke/stream", json={"text": "I am sam.sales@company.demo, I need GitHub"})
+    assert resp.status_code == 200 and "event: done" in resp.text and "manager" in resp.text.lower()
+    assert client.post("/invoke/stream", json={"text": "Hi"}).status_code == 429
+
+def test_metrics_endpoint_reports_invoke_latency_and_sizes(monkeypatch):
+    """Verify that /metrics exposes /invoke latency, retries and store-size gauges."""
+    from fastapi.testclient import TestClient
+    from google.adk.events import Event
+    from src import it_guardian_agent
+    from src.it_guardian_agent import agent_metrics, app, runner
+
+    monkeypatch.setattr(it_guardian_agent, "FAST_PATH_ENABLED", False)
+    calls = []
+
+    async def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        yield Event(author="AccessBot", content=types.Content(role="model", parts=[types.Part(text="Hello!")]))
+    monkeypatch.setattr(runner, "run_async", flaky)
+
+    before = agent_metrics.invoke_seconds.count("/invoke", "agent")
+    client = TestClient(app)
+    assert client.post("/invoke", json={"text": "Hi"}).status_code == 200
+
+    body = client.get("/metrics").text
+    assert agent_metrics.invoke_seconds.count("/invoke", "agent") == before + 1
+    assert 'accessbot_invoke_retries_total{reason="error"}' in body
+    assert "accessbot_sessions " in body and "accessbot_audit_log_rows " in body
+    assert 'accessbot_invoke_seconds_bucket{endpoint="/invoke",route="agent",le="+Inf"}' in body
+
+def test_invoke_returns_trace_when_requested(monkeypatch):
+    """Verify that /invoke returns a span timeline only when X-Trace or ?trace=1 is set."""
+    from fastapi.testclient import TestClient
+    from google.adk.events import Event
+    from src import it_guardian_agent
+    from src.it_guardian_agent import app, runner
+
+    monkeypatch.setattr(it_guardian_agent, "FAST_PATH_ENABLED", False)
+
+    async def reply(*args, **kwargs):
+        yield Event(author="AccessBot", content=types.Content(role="model", parts=[types.Part(text="Hello!")]))
+    monkeypatch.setattr(runner, "run_async", reply)
+
+    client = TestClient(app)
+    assert "trace" not in client.post("/invoke", json={"text": "Hi"}).json()
+    for kwargs in ({"headers": {"X-Trace": "1"}}, {"params": {"trace": "1"}}):
+        trace = client.post("/invoke", json={"text": "Hi"}, **kwargs).json()["trace"]
+        names = [span["name"] for span in trace["spans"]]
+        assert names[:3] == ["session", "admission_wait", "agent_run"]
+        assert "event AccessBot" in names and trace["total_ms"] > 0
+
+def test_import_defers_adk_until_the_agent_is_needed():
+    """Verify that importing the app does not import ADK or NumPy, and reading runner builds it."""
+    import os
+    import subprocess
+    import sys
+
+    script = ("import sys; from src import it_guardian_agent as m; "
+              "assert 'google.adk' not in sys.modules and 'google.genai' not in sys.modules; "
+              "assert 'numpy' not in sys.modules and 'src.policy_matrix' not in sys.modules; "
+              "assert m.runner is m._runner is not None and 'google.adk' in sys.modules")
+    env = dict(os.environ, LLM_PROVIDER="scripted")
+    env.pop("LLM_CASSETTE_MODE", None)
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+
+def test_healthz_reports_ready_after_warmup():
+    """Verify that /healthz answers 503 until the lifespan warm-up has built the agent, then 200."""
+    import time
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+
+    with TestClient(it_guardian_agent.app) as client:
+        deadline = time.time() + 60
+        while (resp := client.get("/healthz")).status_code == 503 and time.time() < deadline:
+            assert resp.json() == {"status": "starting"}
+            time.sleep(0.05)
+        assert resp.status_code == 200 and resp.json() == {"status": "ready"}
+
+def test_lifespan_logs_a_failed_warmup_and_does_not_wait_for_a_slow_one(monkeypatch, caplog):
+    """Verify that a warm-up failure is logged, and shutdown cancels a warm-up still running."""
+    import asyncio
+    import time
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+
+    async def failing_runner():
+        raise RuntimeError("no model credentials")
+
+    async def slow_runner():
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(it_guardian_agent, "get_runner", failing_runner)
+    with TestClient(it_guardian_agent.app):
+        pass
+    assert "[STARTUP] agent warm-up failed" in caplog.text and "no model credentials" in caplog.text
+
+    monkeypatch.setattr(it_guardian_agent, "get_runner", slow_runner)
+    start = time.perf_counter()
+    with TestClient(it_guardian_agent.app):
+        pass
+    assert time.perf_counter() - start < 5
+
+def test_bulk_requests_stream_one_outcome_per_row(monkeypatch):
+    """Verify that /requests/bulk runs each row through the workflow without the model and streams outcomes in order."""
+    import json
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+    from src.audit_store import InMemoryAuditLog
+    from src.it_guardian_agent import MockGoogleSheets, runner
+    from src.outbox import EmailOutbox
+
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    outbox = EmailOutbox(lambda **kwargs: None)
+    monkeypatch.setattr(it_guardian_agent, "mock_sheets_db", db)
+    monkeypatch.setattr(it_guardian_agent, "email_outbox", outbox)
+    monkeypatch.setattr(it_guardian_agent, "BULK_BATCH_SIZE", 2)
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("runner should not be called for bulk requests")
+        yield
+    monkeypatch.setattr(runner, "run_async", no_llm)
+
+    db.append_to_sheet("Audit_Log", {"Employee_Email": "edna.eng@company.demo", "Request_Type": "Grant",
+                                     "Software_Name": "GitHub", "Status": "Approved", "Notes": "Earlier request"})
+    body = ("employee_email,software,request_type\n"
+            "sam.sales@company.demo,salesforce,\n"
+            "sam.sales@company.demo,GitHub,Grant\n"
+            "SAM.SALES@company.demo,Salesforce,Grant\n"
+            "edna.eng@company.demo,GitHub,\n"
+            "edna.eng@company.demo,Figma,\n"
+            "nobody@company.demo,Figma,\n"
+            "sam.sales@company.demo,Slack,Revoke\n"
+            "sam.sales@company.demo\n")
+    client = TestClient(it_guardian_agent.app)
+    resp = client.post("/requests/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    outcomes = [(row["line"], row["outcome"]) for row in lines[:-1]]
+    assert outcomes == [(2, "approved"), (3, "pending_manager_approval"), (4, "duplicate"), (5, "duplicate"),
+                        (6, "pending_manager_approval"), (7, "employee_not_found"), (8, "pending_deprovisioning"), (9, "invalid")]
+    assert lines[0]["software"] == "Salesforce" and lines[0]["request_id"] == "1002"
+    assert lines[4]["detail"] == "No policy for role"
+    assert lines[-1]["summary"]["rows"] == 8 and lines[-1]["summary"]["outcomes"]["duplicate"] == 2
+
+    assert [row["Status"] for row in db.read_sheet("Audit_Log")[1:]] == [
+        "Approved", "Pending Manager Approval", "Pending Manager Approval", "Pending Deprovisioning"]
+    assert outbox.queue_depth() == 4
+    assert client.post("/requests/bulk", content="a,b\n", headers={"Content-Type": "text/csv"}).status_code == 400
+    assert client.post("/requests/bulk", content=body, headers={"Content-Type": "text/plain"}).status_code == 415
+
+def test_bulk_removal_does_not_make_a_later_grant_a_duplicate(monkeypatch):
+    """Verify that only earlier Grant rows in a batch mark a Grant for the same email and software as a duplicate."""
+    import json
+    from fastapi.testclient import TestClient
+    from src import it_guardian_agent
+    from src.audit_store import InMemoryAuditLog
+    from src.it_guardian_agent import MockGoogleSheets
+    from src.outbox import EmailOutbox
+
+    monkeypatch.setattr(it_guardian_agent, "mock_sheets_db", MockGoogleSheets(audit_log=InMemoryAuditLog()))
+    monkeypatch.setattr(it_guardian_agent, "email_outbox", EmailOutbox(lambda **kwargs: None))
+    body = ("employee_email,software,request_type\n"
+            "sam.sales@company.demo,Salesforce,Revoke\n"
+            "sam.sales@company.demo,Salesforce,Grant\n"
+            "sam.sales@company.demo,Salesforce,Grant\n")
+    resp = TestClient(it_guardian_agent.app).post("/requests/bulk", content=body, headers={"Content-Type": "text/csv"})
+    lines = [json.loads(line) for line in resp.text.splitlines()][:-1]
+    assert [row["outcome"] for row in lines] == ["pending_deprovisioning", "approved", "duplicate"]
+    assert lines[2]["detail"] == "Same request as line 3"
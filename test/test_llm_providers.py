@@ -0,0 +1,107 @@
+import time
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from src.audit_store import InMemoryAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+from src.llm_providers import CassetteLlm, CassetteMiss, ScriptedLlm, create_llm, prompt_key
+
+SOFTWARE = {"salesforce": "Salesforce", "github": "GitHub", "google workspace": "Google Workspace"}
+
+def _user(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+def _called(name, response, **args):
+    return [types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]),
+            types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name=name, response=response))])]
+
+def test_scripted_llm_walks_auto_approval_workflow():
+    """Verify that the scripted model issues the Workflow A tool calls in order, then replies."""
+    llm = ScriptedLlm(software_names=SOFTWARE)
+    contents = [_user("I am sam.sales@company.demo and I need Salesforce")]
+    replies = {
+        "find_employee_by_email": {"result": "Employee found: Sam Sales, Role: Sales"},
+        "check_audit_log_for_duplicate": {"result": None},
+        "find_policy_for_user": {"Software_Name": "Salesforce", "Role": "Sales", "Requires_Manager_Approval": "No",
+                                 "Approval_Contact_Email": "it-support@company.demo"},
+        "append_to_audit_log": {"Request_ID": "1001", "Status": "Approved"},
+        "send_gmail": {"status": "queued", "to": "it-support@company.demo"},
+    }
+    calls = []
+    while True:
+        part = llm.next_step(contents)
+        if not part.function_call:
+            break
+        calls.append(part.function_call.name)
+        contents += _called(part.function_call.name, replies[part.function_call.name], **part.function_call.args)
+    assert calls == list(replies)
+    assert "approved" in part.text and "1001" in part.text
+
+def test_scripted_llm_asks_for_missing_details():
+    """Verify that the scripted model asks for the email, then the software."""
+    llm = ScriptedLlm(software_names=SOFTWARE)
+    assert "email" in llm.next_step([_user("Hi")]).text
+    contents = [_user("Hi, I am sam.sales@company.demo")]
+    assert llm.next_step(contents).function_call.name == "find_employee_by_email"
+    contents += _called("find_employee_by_email", {"result": "Employee found: Sam Sales, Role: Sales"}, email="sam.sales@company.demo")
+    assert "Which software" in llm.next_step(contents).text
+
+async def test_scripted_llm_injects_latency_and_streams_partials():
+    """Verify that latency is slept per call and streamed replies end with the full text."""
+    llm = ScriptedLlm(software_names=SOFTWARE, latency_seconds=0.05)
+    start = time.perf_counter()
+    responses = [r async for r in llm.generate_content_async(LlmRequest(contents=[_user("Hi")]), stream=True)]
+    assert time.perf_counter() - start >= 0.05
+    assert all(r.partial for r in responses[:-1]) and not responses[-1].partial
+    assert "".join(r.content.parts[0].text for r in responses[:-1]) == responses[-1].content.parts[0].text
+    assert responses[-1].usage_metadata.total_token_count > 0
+
+def test_scripted_llm_sees_policies_added_by_update_rows():
+    """Verify that a software name added through update_rows reaches a scripted model built earlier."""
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    llm = ScriptedLlm(software_names=db.software_names)
+    db.update_rows("Software_Access_Policy", upserts=[{"Software_Name": "Linear", "Role": "Engineering",
+                                                       "Requires_Manager_Approval": "No",
+                                                       "Approval_Contact_Email": "it-support@company.demo"}])
+    contents = [_user("I am edna.eng@company.demo and I need Linear")]
+    contents += _called("find_employee_by_email", {"result": "Employee found: Edna Eng, Role: Engineering"},
+                        email="edna.eng@company.demo")
+    part = llm.next_step(contents)
+    assert part.function_call.name == "check_audit_log_for_duplicate"
+    assert part.function_call.args["software_name"] == "Linear"
+
+def test_create_llm_rejects_unknown_provider():
+    """Verify that a mistyped LLM_PROVIDER fails loudly instead of falling back to Gemini."""
+    assert isinstance(create_llm("scripted"), ScriptedLlm)
+    with pytest.raises(ValueError):
+        create_llm("gpt")
+
+def test_prompt_key_ignores_volatile_values():
+    """Verify that timestamps, UUIDs and call IDs do not change the cassette key."""
+    def request(timestamp, message_id, call_id):
+        contents = [_user("I am sam.sales@company.demo")] + _called(
+            "append_to_audit_log", {"Request_ID": "1001", "Timestamp": timestamp, "message_id": message_id}, email="x")
+        contents[1].parts[0].function_call.id = contents[2].parts[0].function_response.id = call_id
+        return LlmRequest(contents=contents)
+    a = request("2025-11-25T17:42:39.123456", "1b4e28ba-2fa1-11d2-883f-0016d3cca427", "a")
+    b = request("2026-01-01T00:00:00", "6fa459ea-ee8a-3ca4-894e-db77e160355e", "b")
+    assert prompt_key(a) == prompt_key(b)
+    assert prompt_key(a) != prompt_key(LlmRequest(contents=[_user("I am edna.eng@company.demo")]))
+
+async def test_cassette_records_then_replays(tmp_path):
+    """Verify that recorded model calls replay from disk in order, and unknown prompts miss."""
+    path = str(tmp_path / "cassette.jsonl")
+    recorder = create_llm("scripted", SOFTWARE, cassette_path=path, cassette_mode="record")
+    requests = [LlmRequest(contents=[_user("Hi")]), LlmRequest(contents=[_user("I am sam.sales@company.demo")])]
+    recorded = [[r async for r in recorder.generate_content_async(req)] for req in requests]
+
+    player = create_llm("gemini", cassette_path=path, cassette_mode="replay")
+    assert isinstance(player, CassetteLlm)
+    for req, expected in zip(requests, recorded):
+        replayed = [r async for r in player.generate_content_async(req)]
+        assert [r.content for r in replayed] == [r.content for r in expected]
+    with pytest.raises(CassetteMiss):
+        [r async for r in player.generate_content_async(LlmRequest(contents=[_user("Something new")]))]
+    assert (player.hits, player.misses) == (2, 1)
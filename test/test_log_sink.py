@@ -0,0 +1,90 @@
+import io
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+from src.log_sink import DroppingQueueHandler, SampleFilter, channel_logger, configure_logging, parse_channel_spec
+
+@pytest.fixture
+def sink_output():
+    stream = io.StringIO()
+    sink = configure_logging(fmt="json", channel_levels={"test_gmail": "WARNING"},
+                             sample_rates={"test_sheets": "0"}, stream=stream)
+    yield sink, stream
+    sink.stop()
+
+def test_json_lines_carry_channel_and_respect_channel_settings(sink_output):
+    """Verify that records are written as JSON with their [TAG] as channel, and channel levels and sampling apply."""
+    sink, stream = sink_output
+    logging.getLogger("it-access-guardian").info("[FAST_PATH] handled %s", "x")
+    channel_logger("test_gmail").info("[MOCK_GMAIL] silenced by level")
+    channel_logger("test_sheets").info("[MOCK_SHEETS] sampled out")
+    channel_logger("test_sheets").warning("[MOCK_SHEETS] warnings are never sampled")
+    sink.flush()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(l["channel"], l["msg"]) for l in lines] == [
+        ("FAST_PATH", "handled x"), ("MOCK_SHEETS", "warnings are never sampled")]
+    assert lines[0]["level"] == "INFO" and lines[0]["logger"] == "it-access-guardian"
+
+def test_full_queue_drops_instead_of_blocking():
+    """Verify that logging never blocks the caller when the writer falls behind."""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("test-log-sink-drop")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        done = threading.Event()
+        threading.Thread(target=lambda: ([logger.warning("record %d", i) for i in range(5)], done.set())).start()
+        assert done.wait(timeout=2)
+        assert (handler.queue.qsize(), handler.dropped) == (2, 3)
+    finally:
+        logger.removeHandler(handler)
+
+def test_kept_records_wait_for_room_instead_of_dropping():
+    """Verify that records from keep_loggers wait on a full queue instead of being dropped."""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1), keep_loggers=["test-log-sink-keep"])
+    dropping, kept = logging.getLogger("test-log-sink-drop"), logging.getLogger("test-log-sink-keep")
+    for logger in (dropping, kept):
+        logger.propagate = False
+        logger.addHandler(handler)
+    try:
+        dropping.warning("fills the queue")
+        dropping.warning("dropped")
+        done = threading.Event()
+        threading.Thread(target=lambda: (kept.warning("kept"), done.set())).start()
+        assert not done.wait(timeout=0.1), "the kept record should wait for room"
+        assert handler.queue.get_nowait().getMessage() == "fills the queue"
+        assert done.wait(timeout=2)
+        assert handler.queue.get_nowait().getMessage() == "kept" and handler.dropped == 1
+    finally:
+        for logger in (dropping, kept):
+            logger.removeHandler(handler)
+
+def test_audit_channel_logs_at_info_whatever_the_levels():
+    """Verify that audit_log records are written under LOG_LEVEL=WARNING and the channel refuses a level."""
+    with pytest.raises(ValueError, match="audit_log"):
+        configure_logging(channel_levels={"audit_log": "WARNING"})
+    stream = io.StringIO()
+    sink = configure_logging(level="WARNING", stream=stream)
+    assert channel_logger("audit_log").name in sink.handler.keep_loggers
+    channel_logger("audit_log").info("[AUDIT_LOG] still written")
+    channel_logger("mock_sheets").info("[MOCK_SHEETS] below LOG_LEVEL")
+    sink.flush()
+    sink.stop()
+    assert [json.loads(line)["msg"] for line in stream.getvalue().splitlines()] == ["still written"]
+
+def test_channel_spec_and_sample_rate_validation():
+    """Verify that LOG_CHANNEL_LEVELS/LOG_SAMPLE_RATES style specs parse, and bad values fail loudly."""
+    assert parse_channel_spec(" MOCK_SHEETS=0.01, mock_gmail=warning ,") == {"mock_sheets": "0.01", "mock_gmail": "warning"}
+    with pytest.raises(ValueError):
+        parse_channel_spec("mock_sheets")
+    with pytest.raises(ValueError):
+        SampleFilter(1.5)
+    with pytest.raises(ValueError, match="audit_log"):
+        configure_logging(sample_rates={"audit_log": "0.1"})
+    keep_half = SampleFilter(0.5, rng=iter([0.2, 0.7]).__next__)
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "m", None, None)
+    assert [keep_half.filter(record), keep_half.filter(record)] == [True, False]
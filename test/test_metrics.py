@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from src.metrics import AgentMetrics, Histogram
+
+def test_histogram_renders_cumulative_buckets():
+    """Verify that histograms render cumulative le buckets, _sum and _count."""
+    h = Histogram("demo_seconds", "Demo.", ("tool",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        h.observe(value, "find_employee_by_email")
+    lines = h.render()
+    assert 'demo_seconds_bucket{tool="find_employee_by_email",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{tool="find_employee_by_email",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{tool="find_employee_by_email",le="+Inf"} 4' in lines
+    assert 'demo_seconds_sum{tool="find_employee_by_email"} 4.05' in lines
+    assert 'demo_seconds_count{tool="find_employee_by_email"} 4' in lines
+
+def test_callbacks_count_model_round_trips_and_time_tools():
+    """Verify that the agent callbacks feed per-request round-trips, model and tool latency."""
+    metrics = AgentMetrics()
+    tool = SimpleNamespace(name="find_policy_for_user")
+    with metrics.track_request("/invoke"):
+        for call_id in ("a", "b"):
+            metrics.before_model(None, None)
+            metrics.after_model(None, SimpleNamespace(partial=False))
+            context = SimpleNamespace(function_call_id=call_id)
+            metrics.before_tool(tool, {}, context)
+            metrics.after_tool(tool, {}, context, {})
+        metrics.before_model(None, None)
+        metrics.after_model(None, SimpleNamespace(partial=True))  # streamed chunk: not the end of the call
+        metrics.after_model(None, SimpleNamespace(partial=False))
+
+    assert metrics.model_call_seconds.count() == 3
+    assert metrics.tool_seconds.count("find_policy_for_user") == 2
+    assert metrics.invoke_seconds.count("/invoke", "agent") == 1
+    assert 'accessbot_model_round_trips_bucket{endpoint="/invoke",le="2"} 0' in metrics.render()
+    assert 'accessbot_model_round_trips_bucket{endpoint="/invoke",le="3"} 1' in metrics.render()
+
+def test_tool_that_raises_is_timed_and_forgotten():
+    """Verify that a tool error records its latency and error count and leaves no start time behind."""
+    metrics = AgentMetrics()
+    tool, context = SimpleNamespace(name="send_gmail"), SimpleNamespace(function_call_id="c")
+    metrics.before_tool(tool, {}, context)
+    assert metrics.on_tool_error(tool, {}, context, ConnectionError("SMTP unavailable")) is None
+    assert metrics._tool_started == {}
+    assert metrics.tool_seconds.count("send_gmail") == 1 and metrics.tool_errors.value("send_gmail") == 1
+
+def test_callbacks_outside_a_request_are_ignored():
+    """Verify that model calls made outside track_request (e.g. direct Runner use) don't fail."""
+    metrics = AgentMetrics()
+    metrics.before_model(None, None)
+    metrics.after_model(None, SimpleNamespace(partial=False))
+    assert metrics.model_call_seconds.count() == 0
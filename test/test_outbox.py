@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from src.outbox import EmailOutbox
+
+class FlakySender:
+    """Stands in for MockGmail.send_email, failing the first `failures` calls."""
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, to, subject, body, cc=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("SMTP unavailable")
+        self.sent.append((to, subject, cc))
+        return {"status": "success", "to": to, "subject": subject}
+
+@pytest.mark.asyncio
+async def test_drain_sends_queued_messages_in_batches():
+    """Verify that enqueued mail is delivered by drain_once and counted."""
+    sender = FlakySender()
+    outbox = EmailOutbox(sender, batch_size=2)
+    ids = [outbox.enqueue(f"user{i}@company.demo", "Subject", "Body") for i in range(3)]
+    assert outbox.queue_depth() == 3
+
+    assert await outbox.drain_once() == 2
+    assert await outbox.drain_once() == 1
+    assert await outbox.drain_once() == 0
+    assert len(sender.sent) == 3
+    assert outbox.get_message(ids[0])["status"] == "sent"
+    assert outbox.stats()["queue_depth"] == 0 and outbox.stats()["sent"] == 3
+
+@pytest.mark.asyncio
+async def test_failed_sends_retry_with_backoff_then_give_up():
+    """Verify that failures are retried after a backoff and abandoned after max_attempts."""
+    outbox = EmailOutbox(FlakySender(failures=1), base_backoff=0.0)
+    retried = outbox.enqueue("manager@company.demo", "Approve?", "Body")
+    await outbox.drain_once()
+    assert outbox.get_message(retried)["attempts"] == 1
+    assert outbox.get_message(retried)["status"] == "pending"
+    await outbox.drain_once()
+    assert outbox.get_message(retried)["status"] == "sent"
+    assert outbox.retries == 1
+
+    outbox = EmailOutbox(FlakySender(failures=10), base_backoff=0.0, max_attempts=3)
+    doomed = outbox.enqueue("manager@company.demo", "Approve?", "Body")
+    for _ in range(3):
+        await outbox.drain_once()
+    assert outbox.get_message(doomed)["status"] == "failed"
+    assert "SMTP unavailable" in outbox.get_message(doomed)["last_error"]
+
+@pytest.mark.asyncio
+async def test_background_worker_and_durable_queue(tmp_path):
+    """Verify that the worker delivers mail promptly and undelivered mail survives a restart."""
+    path = str(tmp_path / "outbox.db")
+    EmailOutbox(FlakySender(), path=path).enqueue("it-support@company.demo", "Left over", "Body")
+
+    sender = FlakySender()
+    observed = []
+    outbox = EmailOutbox(sender, path=path, poll_interval=5.0, observe_latency=lambda stage, s: observed.append(stage))
+    assert outbox.durable
+    outbox.start()
+    try:
+        outbox.enqueue("sales.manager@company.demo", "New", "Body")
+        for _ in range(100):
+            if len(sender.sent) == 2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await outbox.stop()
+    assert sorted(to for to, _, _ in sender.sent) == ["it-support@company.demo", "sales.manager@company.demo"]
+    assert sorted(observed) == ["enqueue", "send", "send"]
+
+async def test_send_gmail_returns_immediately_with_message_id():
+    """Verify that the send_gmail tool only queues the email."""
+    from src.it_guardian_agent import send_gmail, email_outbox
+
+    result = await send_gmail(to="it-support@company.demo", subject="Access Request Approved", body="Body", cc="hr@company.demo")
+    assert result["status"] == "queued"
+    assert email_outbox.get_message(result["message_id"])["cc"] == "hr@company.demo"
+
+async def test_outboxes_sharing_a_file_send_each_message_once(tmp_path):
+    """Verify that two workers draining one outbox file claim disjoint messages, and stale claims are re-queued."""
+    path = str(tmp_path / "outbox.db")
+    first, second = FlakySender(), FlakySender()
+    worker_a, worker_b = EmailOutbox(first, path=path, batch_size=4), EmailOutbox(second, path=path, batch_size=4)
+    worker_a.enqueue_many([{"to": f"user{i}@company.demo", "subject": "Subject", "body": "Body"} for i in range(10)])
+    while sum(await asyncio.gather(worker_a.drain_once(), worker_b.drain_once())):
+        pass
+    recipients = [to for to, _, _ in first.sent + second.sent]
+    assert sorted(recipients) == sorted(f"user{i}@company.demo" for i in range(10))
+
+    # A worker died mid-send: its claim is released when a worker starts, not by an ordinary drain
+    stuck = worker_a.enqueue("it-support@company.demo", "Stuck", "Body")
+    worker_a._conn.execute("UPDATE outbox SET status = 'sending', claimed_at = 0 WHERE id = ?", (stuck,))
+    assert await worker_b.drain_once() == 0 and worker_b.queue_depth() == 1
+    worker_b.start()
+    try:
+        for _ in range(100):
+            if worker_b.get_message(stuck)["status"] == "sent":
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await worker_b.stop()
+    assert worker_b.get_message(stuck)["status"] == "sent"
@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.policy_matrix import AUTO_APPROVE, MANAGER_APPROVAL, NO_POLICY, UNKNOWN_ID, PolicyMatrix
+
+def policy(software, role, approval):
+    return {"Software_Name": software, "Role": role, "Requires_Manager_Approval": approval,
+            "Approval_Contact_Email": "it-support@company.demo"}
+
+def test_matrix_decisions_match_the_policy_rows():
+    """Verify that the first row per pair wins, the array grows with new names, and unknown IDs decide NO_POLICY."""
+    matrix = PolicyMatrix([policy("GitHub", "Engineering", "No"), policy("GitHub", "Sales", "Yes"),
+                           policy("GitHub", "Engineering", "Yes")])
+    matrix.apply(policy(f"App{i}", f"Role{i}", "No") for i in range(10))
+    assert matrix.shape == (12, 11)
+    assert matrix.decision("Engineering", "GitHub") == AUTO_APPROVE
+    assert matrix.decision("Sales", "GitHub") == MANAGER_APPROVAL
+    assert matrix.decision("Role9", "App9") == AUTO_APPROVE and matrix.decision("Role9", "GitHub") == NO_POLICY
+    assert matrix.decision("Design", "GitHub") == NO_POLICY
+
+    role_ids = matrix.roles.encode(["Sales", "Design", "Engineering", "Role3"])
+    assert role_ids.tolist() == [1, UNKNOWN_ID, 0, 5]
+    assert matrix.decide(role_ids, matrix.software_id("GitHub")).tolist() == [MANAGER_APPROVAL, NO_POLICY, AUTO_APPROVE, NO_POLICY]
+    assert matrix.decide(role_ids, matrix.software_id("Figma")).tolist() == [NO_POLICY] * 4
+    software_ids = matrix.software.encode(["App3", "GitHub", "GitHub", "App3"])
+    assert np.array_equal(matrix.decide(role_ids, software_ids), [NO_POLICY, NO_POLICY, AUTO_APPROVE, AUTO_APPROVE])
+
+def test_population_queries_follow_directory_and_policy_changes():
+    """Verify that population answers track appended policy rows in place and pick up edits made elsewhere."""
+    from src.audit_store import InMemoryAuditLog
+    from src.it_guardian_agent import MockGoogleSheets
+
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    assert db.employees_with_decision("GitHub", AUTO_APPROVE) == ["edna.eng@company.demo"]
+    assert db.employees_with_decision("GitHub", MANAGER_APPROVAL) == ["sam.sales@company.demo"]
+    for email in ("edna.eng@company.demo", "sam.sales@company.demo", "left@company.demo"):
+        db.append_to_sheet("Audit_Log", {"Employee_Email": email, "Request_Type": "Grant", "Software_Name": "GitHub" if "edna" in email else "Salesforce",
+                                         "Status": "Approved", "Notes": "Auto-approved by policy"})
+    assert [(v["grant"]["Employee_Email"], v["reason"]) for v in db.policy_violations()] == [("left@company.demo", "employee_not_in_directory")]
+
+    # A new policy row is applied to the existing matrix, not recompiled
+    matrix = db.policy_matrix()
+    db.append_to_sheet("Software_Access_Policy", policy("Jira", "Sales", "No"))
+    assert db.policy_matrix() is matrix and db.employees_with_decision("Jira", AUTO_APPROVE) == ["sam.sales@company.demo"]
+
+    # Edna moves to Sales, where GitHub needs a manager; Salesforce loses its Sales policy
+    db.sheets["Employee_Directory"][1]["Role"] = "Sales"
+    db.versions["Employee_Directory"] += 1
+    db.sheets["Software_Access_Policy"][0]["Role"] = "Finance"
+    db.versions["Software_Access_Policy"] += 1
+    violations = {v["grant"]["Employee_Email"]: (v["role"], v["reason"]) for v in db.policy_violations()}
+    assert db.policy_matrix() is not matrix
+    assert violations == {"edna.eng@company.demo": ("Sales", "requires_manager_approval"),
+                          "sam.sales@company.demo": ("Sales", "no_policy_for_role"),
+                          "left@company.demo": (None, "employee_not_in_directory")}
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.rate_limit import AdmissionController, AdmissionRejected, ModelRateLimiter, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_spaces_out_reservations():
+    """Verify that reservations beyond capacity are queued at the refill rate."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_second=1.0, capacity=2, clock=clock)
+    assert [bucket.reserve(1) for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    clock.now = 10.0
+    assert bucket.reserve(1) == 0.0
+
+def test_model_rate_limiter_honours_rpm_tpm_and_pause():
+    """Verify that model calls wait for request quota, token quota and a 429 pause."""
+    clock = FakeClock()
+    limiter = ModelRateLimiter(rpm=60, tpm=600, clock=clock)
+    assert limiter.reserve(100) == 0.0
+    assert limiter.reserve(600) == pytest.approx(10.0)  # 100 tokens over the TPM budget at 10 tokens/s
+    clock.now = 100.0
+    limiter.pause(30)
+    assert limiter.reserve(1) == pytest.approx(30.0)
+    assert limiter.stats()["throttled_calls"] == 2
+
+async def test_admission_is_fifo_and_rejects_overflow():
+    """Verify that queued requests are admitted in order and overflow gets a Retry-After."""
+    waits = []
+    admission = AdmissionController(max_concurrent=1, max_queue=2, observe_wait=waits.append)
+    release = asyncio.Event()
+    order = []
+
+    async def request(n):
+        async with admission.slot():
+            order.append(n)
+            await release.wait()
+
+    tasks = [asyncio.create_task(request(n)) for n in range(3)]
+    await asyncio.sleep(0)
+    assert admission.stats()["active"] == 1 and admission.queued == 2
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with admission.slot():
+            pass
+    assert rejected.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2]
+    assert admission.stats() == {"active": 0, "queued": 0, "admitted": 3, "rejected": 1}
+    assert len(waits) == 3 and all(w >= 0 for w in waits)  # the rejected request never waited
+
+async def test_admission_cancelled_waiter_frees_its_place():
+    """Verify that a client that gives up while queued does not leak a slot."""
+    admission = AdmissionController(max_concurrent=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def request():
+        async with admission.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(request())
+    waiter = asyncio.create_task(request())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    release.set()
+    await holder
+    assert admission.stats()["active"] == 0 and admission.queued == 0
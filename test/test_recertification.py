@@ -0,0 +1,100 @@
+from src.audit_store import InMemoryAuditLog
+from src.it_guardian_agent import MockGoogleSheets
+from src.recertification import Recertifier
+
+IT = "it-support@company.demo"
+
+def employee(email, role, manager):
+    return {"Employee_Email": email, "Employee_Name": email.split("@")[0].title(), "Role": role, "Manager_Email": manager}
+
+def grant(email, software):
+    return {"Employee_Email": email, "Request_Type": "Grant", "Software_Name": software,
+            "Status": "Approved", "Notes": "Auto-approved by policy"}
+
+def make_recertifier():
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    sent = []
+
+    async def append_rows(rows):
+        return db.append_rows("Audit_Log", rows)
+
+    async def send_gmail(to, subject, body, cc=None):
+        sent.append({"to": to, "cc": cc, "subject": subject, "body": body})
+
+    return db, sent, Recertifier(db, append_rows, send_gmail, IT)
+
+def test_update_rows_swaps_in_changes_and_journals_their_keys():
+    """Verify that update_rows upserts and deletes by index key, and changed_keys reports only the keys touched."""
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    version = db.versions["Employee_Directory"]
+    counts = db.update_rows("Employee_Directory",
+                            upserts=[employee("Edna.Eng@company.demo", "Sales", "sales.manager@company.demo"),
+                                     dict(db.lookup("Employee_Directory", "sam.sales@company.demo")),
+                                     employee("new@company.demo", "Design", "design.manager@company.demo")],
+                            deletes=[("ghost@company.demo",)])
+    assert counts == {"added": 1, "updated": 1, "deleted": 0}  # Sam's row is unchanged
+    assert db.lookup("Employee_Directory", "edna.eng@company.demo")["Role"] == "Sales"
+    assert db.changed_keys("Employee_Directory", version) == {("edna.eng@company.demo",), ("new@company.demo",)}
+    assert db.update_rows("Employee_Directory", deletes=[("NEW@company.demo",)])["deleted"] == 1
+    assert db.lookup("Employee_Directory", "new@company.demo") is None
+    assert db.changed_keys("Employee_Directory", version + 1) == {("new@company.demo",)}
+
+    # An edit that bypasses the journal makes the range unknown
+    db.versions["Employee_Directory"] += 1
+    assert db.changed_keys("Employee_Directory", version) is None
+
+def test_update_rows_builds_again_when_the_sheet_changes_meanwhile():
+    """Verify that update_rows builds without the lock and keeps a row appended while it was building."""
+    db = MockGoogleSheets(audit_log=InMemoryAuditLog())
+    index_key, calls = db._index_key, []
+
+    def index_key_appending_once(sheet_name, values):
+        calls.append(values)
+        if len(calls) == 3:  # inside the first build; would deadlock if the lock were held
+            db.append_to_sheet("Employee_Directory", employee("late@company.demo", "Design", "design.manager@company.demo"))
+        return index_key(sheet_name, values)
+
+    db._index_key = index_key_appending_once
+    version = db.versions["Employee_Directory"]
+    counts = db.update_rows("Employee_Directory", upserts=[employee("edna.eng@company.demo", "Sales", "sales.manager@company.demo")])
+    assert counts == {"added": 0, "updated": 1, "deleted": 0} and db.versions["Employee_Directory"] == version + 2
+    assert db.lookup("Employee_Directory", "late@company.demo")["Role"] == "Design"
+    assert db.lookup("Employee_Directory", "edna.eng@company.demo")["Role"] == "Sales"
+
+async def test_incremental_runs_check_only_changed_grants_and_batch_the_notices():
+    """Verify that later runs re-check only grants touched by directory, policy or Audit_Log changes, once each."""
+    db, sent, recertifier = make_recertifier()
+    db.append_rows("Employee_Directory", [employee(f"eng{i}@company.demo", "Engineering", "eng.manager@company.demo") for i in range(3)])
+    db.append_rows("Audit_Log", [grant("edna.eng@company.demo", "GitHub"), grant("sam.sales@company.demo", "Salesforce")] +
+                   [grant(f"eng{i}@company.demo", "GitHub") for i in range(3)])
+
+    report = await recertifier.run()
+    assert (report["mode"], report["evaluated"], report["revoked"]) == ("full", 5, 0)
+    assert sent == []
+
+    # Two engineers move to Sales (GitHub needs a manager there) and one leaves
+    db.update_rows("Employee_Directory",
+                   upserts=[employee(f"eng{i}@company.demo", "Sales", "sales.manager@company.demo") for i in (0, 1)],
+                   deletes=[("eng2@company.demo",)])
+    report = await recertifier.run()
+    assert (report["mode"], report["evaluated"], report["revoked"], report["notices"]) == ("incremental", 3, 3, 2)
+    flagged = {(row["Employee_Email"], row["Notes"]) for row in db.audit_log.rows if row["Request_Type"] == "Deprovision"}
+    assert flagged == {("eng0@company.demo", "Recertification: requires_manager_approval"),
+                       ("eng1@company.demo", "Recertification: requires_manager_approval"),
+                       ("eng2@company.demo", "Recertification: employee_not_in_directory")}
+    manager = next(m for m in sent if m["to"] == "sales.manager@company.demo")
+    assert manager["cc"] == IT and manager["subject"] == "Access Recertification: 2 grant(s) to remove"
+    assert "eng0@company.demo" in manager["body"] and "eng1@company.demo" in manager["body"]
+    assert next(m for m in sent if m["to"] == IT)["cc"] is None
+
+    # Nothing changed: only the deprovisioning rows just written are looked at, and nothing is flagged again
+    report = await recertifier.run()
+    assert (report["evaluated"], report["revoked"]) == (3, 0)
+
+    # Sales loses Salesforce: only Salesforce grants are re-checked
+    db.update_rows("Software_Access_Policy", upserts=[{"Software_Name": "Salesforce", "Role": "Sales",
+                                                       "Requires_Manager_Approval": "Yes", "Approval_Contact_Email": IT}])
+    report = await recertifier.run()
+    assert (report["mode"], report["evaluated"], report["revoked"]) == ("incremental", 1, 1)
+    assert sent[-1]["to"] == "sales.manager@company.demo" and "Salesforce" in sent[-1]["body"]
+    assert recertifier.revoked_total == 4
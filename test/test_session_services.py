@@ -0,0 +1,143 @@
+import pytest
+
+from google.adk.events import Event
+from google.genai import types
+
+from src.session_services import BoundedSessionService
+
+APP = "it-access-guardian"
+USER = "default_user"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _text_event(text: str) -> Event:
+    return Event(author="user", content=types.Content(role="user", parts=[types.Part(text=text)]))
+
+@pytest.mark.asyncio
+async def test_idle_sessions_expire():
+    """Verify that sessions idle longer than the TTL are evicted and counted."""
+    clock = FakeClock()
+    store = BoundedSessionService(idle_ttl_seconds=60, clock=clock)
+    old = await store.create_session(app_name=APP, user_id=USER)
+    clock.now = 30
+    fresh = await store.create_session(app_name=APP, user_id=USER)
+    clock.now = 75
+
+    assert await store.get_session(app_name=APP, user_id=USER, session_id=old.id) is None
+    assert await store.get_session(app_name=APP, user_id=USER, session_id=fresh.id) is not None
+    assert store.stats()["evictions_idle"] == 1
+    assert store.stats()["sessions"] == 1
+
+@pytest.mark.asyncio
+async def test_lru_eviction_keeps_recently_used():
+    """Verify that the session cap evicts the least recently used session."""
+    store = BoundedSessionService(max_sessions=2)
+    first = await store.create_session(app_name=APP, user_id=USER)
+    second = await store.create_session(app_name=APP, user_id=USER)
+    await store.get_session(app_name=APP, user_id=USER, session_id=first.id)
+    await store.create_session(app_name=APP, user_id=USER)
+
+    assert await store.get_session(app_name=APP, user_id=USER, session_id=second.id) is None
+    assert await store.get_session(app_name=APP, user_id=USER, session_id=first.id) is not None
+    assert store.stats()["evictions_lru"] == 1
+
+@pytest.mark.asyncio
+async def test_memory_cap_tracks_event_bytes():
+    """Verify that resident size grows with events and the byte cap evicts old sessions."""
+    store = BoundedSessionService(max_bytes=2000)
+    first = await store.create_session(app_name=APP, user_id=USER)
+    await store.append_event(first, _text_event("x" * 500))
+    assert store.resident_bytes > 500
+
+    second = await store.create_session(app_name=APP, user_id=USER)
+    await store.append_event(second, _text_event("y" * 1500))
+
+    assert store.stats()["evictions_memory"] == 1
+    assert await store.get_session(app_name=APP, user_id=USER, session_id=first.id) is None
+    assert len((await store.get_session(app_name=APP, user_id=USER, session_id=second.id)).events) == 1
+
+    await store.delete_session(app_name=APP, user_id=USER, session_id=second.id)
+    assert store.stats() == {"sessions": 0, "resident_bytes": 0, "evictions_idle": 0, "evictions_lru": 0, "evictions_memory": 1}
+
+def _model_event(text: str, state_delta=None) -> Event:
+    from google.adk.events import EventActions
+    return Event(author="AccessBot", content=types.Content(role="model", parts=[types.Part(text=text)]),
+                 actions=EventActions(state_delta=state_delta or {}))
+
+@pytest.mark.asyncio
+async def test_sqlite_sessions_are_shared_between_workers(tmp_path):
+    """Verify that a session written by one service instance is visible to another on the same file."""
+    from google.adk.errors.already_exists_error import AlreadyExistsError
+    from src.session_services import SqliteSessionService
+
+    db_path = str(tmp_path / "sessions.db")
+    worker_a = SqliteSessionService(db_path)
+    worker_b = SqliteSessionService(db_path)
+
+    session = await worker_a.create_session(app_name=APP, user_id=USER, state={"user:email": "sam.sales@company.demo"})
+    assert worker_b.stats()["sessions"] == 0  # counted off the event loop, at the next refresh
+    await worker_b.refresh_stats()
+    assert worker_b.stats()["sessions"] == 1
+    await worker_a.append_event(session, _text_event("I need Salesforce"))
+    await worker_a.append_event(session, _model_event("Approved.", {"software": "Salesforce", "app:policy_version": 3}))
+    # The final response closes the turn, so the whole turn is written as one batch
+    assert worker_a.batches_written == 1
+
+    loaded = await worker_b.get_session(app_name=APP, user_id=USER, session_id=session.id)
+    assert [e.content.parts[0].text for e in loaded.events] == ["I need Salesforce", "Approved."]
+    assert loaded.state == {"software": "Salesforce", "user:email": "sam.sales@company.demo", "app:policy_version": 3}
+
+    from google.adk.sessions.base_session_service import GetSessionConfig
+    recent = await worker_b.get_session(app_name=APP, user_id=USER, session_id=session.id, config=GetSessionConfig(num_recent_events=1))
+    assert [e.content.parts[0].text for e in recent.events] == ["Approved."]
+
+    with pytest.raises(AlreadyExistsError):
+        await worker_b.create_session(app_name=APP, user_id=USER, session_id=session.id)
+    assert [s.id for s in (await worker_b.list_sessions(app_name=APP, user_id=USER)).sessions] == [session.id]
+
+    await worker_b.delete_session(app_name=APP, user_id=USER, session_id=session.id)
+    assert await worker_a.get_session(app_name=APP, user_id=USER, session_id=session.id) is None
+
+@pytest.mark.asyncio
+async def test_sqlite_reads_flush_pending_events(tmp_path):
+    """Verify that events still queued for a batch are visible to the next read."""
+    from src.session_services import SqliteSessionService
+
+    store = SqliteSessionService(str(tmp_path / "sessions.db"), max_delay=60)
+    session = await store.create_session(app_name=APP, user_id=USER)
+    await store.append_event(session, _text_event("Hi"))
+    assert store.batches_written == 0
+
+    loaded = await store.get_session(app_name=APP, user_id=USER, session_id=session.id)
+    assert len(loaded.events) == 1
+    assert store.batches_written == 1
+
+@pytest.mark.asyncio
+async def test_sqlite_background_flush_failures_are_logged_and_close_writes_the_rest(tmp_path, caplog):
+    """Verify that a failed timed flush is logged, and close() waits for timed flushes and writes queued events."""
+    import asyncio
+    from src.session_services import SqliteSessionService
+
+    store = SqliteSessionService(str(tmp_path / "sessions.db"), max_delay=0.01)
+    session = await store.create_session(app_name=APP, user_id=USER)
+    write_batch = store._write_batch
+
+    def failing_write(batch):
+        raise OSError("disk full")
+
+    store._write_batch = failing_write
+    await store.append_event(session, _text_event("lost"))
+    await asyncio.sleep(0.1)
+    assert "[SESSIONS] background flush failed" in caplog.text and not store._flush_tasks
+
+    store._write_batch = write_batch
+    await store.append_event(session, _text_event("Hi"))
+    await store.close()
+    assert store.batches_written == 1 and store._flush_timer is None and not store._flush_tasks
+    loaded = await store.get_session(app_name=APP, user_id=USER, session_id=session.id)
+    assert [e.content.parts[0].text for e in loaded.events] == ["Hi"]
@@ -0,0 +1,74 @@
+from src.metrics import Gauge
+from src.sheet_cache import VersionedCache
+
+class FakeSheet:
+    def __init__(self):
+        self.rows = {"salesforce": "No", "github": "Yes"}
+        self.version = 1
+        self.reads = 0
+        self.version_reads = 0
+
+    def load(self, key):
+        self.reads += 1
+        return self.rows.get(key)
+
+    def etag(self):
+        self.version_reads += 1
+        return self.version
+
+def test_cache_reads_each_key_once_and_checks_the_version_at_most_every_interval():
+    """Verify that steady-state lookups hit the cache, misses are not cached, and the version is polled sparingly."""
+    sheet, now = FakeSheet(), [0.0]
+    cache = VersionedCache(sheet.load, sheet.etag, max_staleness=5.0, clock=lambda: now[0])
+    for _ in range(100):
+        assert cache.get("salesforce") == "No"
+        assert cache.get("figma") is None
+        now[0] += 0.01
+    assert (sheet.reads, sheet.version_reads) == (101, 1)
+    assert (cache.hits, cache.misses) == (99, 101) and cache.stats()["entries"] == 1
+
+def test_cache_evicts_the_least_recently_used_entry_beyond_max_entries():
+    """Verify that the cache holds at most max_entries, evicting the entry used longest ago."""
+    sheet = FakeSheet()
+    sheet.rows.update(figma="No", jira="Yes")
+    cache = VersionedCache(sheet.load, sheet.etag, max_entries=2)
+    cache.get("salesforce"), cache.get("github"), cache.get("salesforce"), cache.get("figma")
+    assert list(cache._entries) == ["salesforce", "figma"] and cache.evictions == 1
+    reads = sheet.reads
+    assert cache.get("salesforce") == "No" and sheet.reads == reads
+    assert cache.get("github") == "Yes" and sheet.reads == reads + 1
+
+def test_external_change_shows_up_within_the_staleness_bound():
+    """Verify that a changed ETag drops the cached entries, but only once the staleness window has passed."""
+    sheet, now = FakeSheet(), [0.0]
+    cache = VersionedCache(sheet.load, sheet.etag, max_staleness=5.0, clock=lambda: now[0])
+    assert cache.get("github") == "Yes"
+    sheet.rows["github"], sheet.version = "No", 2
+
+    now[0] = 4.9
+    assert cache.get("github") == "Yes" and cache.staleness() == 4.9
+    now[0] = 5.0
+    assert cache.get("github") == "No"
+    assert cache.invalidations == 1 and cache.staleness() == 0.0
+
+def test_mock_sheets_lookups_go_through_the_versioned_cache():
+    """Verify that local appends are visible at once, edits elsewhere after the bound, and counters are exported."""
+    from src.it_guardian_agent import MockGoogleSheets
+
+    db = MockGoogleSheets(cache_staleness_seconds=3600)
+    policy = db.caches["Software_Access_Policy"]
+    assert db.find_row_matching("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Sales"}) is None
+    db.append_to_sheet("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Sales", "Requires_Manager_Approval": "No",
+                                                  "Approval_Contact_Email": "it-support@company.demo"})
+    assert db.find_row_matching("Software_Access_Policy", {"Software_Name": "Jira", "Role": "Sales"})["Requires_Manager_Approval"] == "No"
+
+    # Someone edits the sheet directly: the cached copy is served until the version is checked again
+    db.indexes["Software_Access_Policy"][("Jira", "Sales")]["Requires_Manager_Approval"] = "Yes"
+    db.versions["Software_Access_Policy"] += 1
+    assert db.lookup("Software_Access_Policy", "Jira", "Sales")["Requires_Manager_Approval"] == "No"
+    policy.max_staleness = 0
+    assert db.lookup("Software_Access_Policy", "Jira", "Sales")["Requires_Manager_Approval"] == "Yes"
+    assert policy.hits >= 1 and policy.invalidations >= 2
+
+    rendered = Gauge("accessbot_policy_cache_hits_total", "Hits.", lambda: policy.hits, kind="counter").render()
+    assert rendered[1] == "# TYPE accessbot_policy_cache_hits_total counter"
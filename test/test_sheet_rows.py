@@ -0,0 +1,36 @@
+import json
+
+from src.sheet_rows import AuditRow, DirectoryRow, make_row, to_dict
+
+def test_slotted_rows_read_and_write_like_dicts():
+    """Verify that slotted rows keep dict behaviour, column order and unknown columns, and share interned values."""
+    values = {"Employee_Email": "sam.sales@company.demo", "Request_Type": "Grant", "Software_Name": "GitHub",
+              "Status": "Approved", "Notes": "Auto-approved by policy", "Ticket": "T-1"}
+    row = make_row("Audit_Log", json.loads(json.dumps(values)))
+    assert isinstance(row, AuditRow) and not hasattr(row, "__dict__")
+    assert row == values and list(row) == list(values) and len(row) == 6
+    assert row.get("Request_ID") is None and "Request_ID" not in row and row.get("Ticket") == "T-1"
+    row["Request_ID"] = "1001"
+    assert list(row)[-2:] == ["Request_ID", "Ticket"]  # schema columns first, in sheet order
+    assert json.loads(json.dumps(row, default=dict))["Request_ID"] == "1001"
+
+    other = make_row("Audit_Log", json.loads(json.dumps(values)))
+    assert other["Status"] is row["Status"] and other["Employee_Email"] is not row["Employee_Email"]
+    emp = make_row("Employee_Directory", {"Employee_Email": "new@company.demo", "Role": "Sales"})
+    assert isinstance(emp, DirectoryRow) and to_dict(emp) == {"Employee_Email": "new@company.demo", "Role": "Sales"}
+    assert type(make_row("Other_Sheet", values)) is dict
+
+async def test_tools_still_return_plain_dicts(monkeypatch):
+    """Verify that the agent tools hand out plain dict copies of the slotted rows, in the same shape as before."""
+    from src import it_guardian_agent
+    from src.audit_store import InMemoryAuditLog
+
+    monkeypatch.setattr(it_guardian_agent, "mock_sheets_db", it_guardian_agent.MockGoogleSheets(audit_log=InMemoryAuditLog()))
+    entry = await it_guardian_agent.append_to_audit_log("sam.sales@company.demo", "Grant", "GitHub", "Pending Manager Approval", "")
+    duplicate = it_guardian_agent.check_audit_log_for_duplicate("sam.sales@company.demo", "GitHub")
+    policy = it_guardian_agent.find_policy_for_user("GitHub", "Sales")
+    assert type(entry) is dict and type(duplicate) is dict and type(policy) is dict
+    assert list(entry) == ["Employee_Email", "Request_Type", "Software_Name", "Status", "Notes", "Request_ID", "Timestamp"]
+    assert duplicate == entry
+    assert policy == {"Software_Name": "GitHub", "Role": "Sales", "Requires_Manager_Approval": "Yes",
+                      "Approval_Contact_Email": "it-support@company.demo"}
@@ -0,0 +1,54 @@
+import json
+from types import SimpleNamespace
+
+from src.tracing import RequestTracer, Trace, current_trace, maybe_span
+
+def test_chrome_trace_lays_out_spans_and_instants(tmp_path):
+    """Verify that saved traces use Chrome trace events: X spans per lane and instant events."""
+    trace = Trace("/invoke")
+    with trace.span("session"):
+        pass
+    trace.begin("call", "find_policy_for_user", "tool")
+    trace.end("call")
+    trace.instant("event AccessBot", parts="text")
+
+    path = trace.save(str(tmp_path))
+    events = json.load(open(path))["traceEvents"]
+    spans = {e["name"]: e for e in events if e["ph"] != "M"}
+    assert spans["session"]["ph"] == "X" and spans["session"]["tid"] == 1
+    assert spans["find_policy_for_user"]["tid"] == 3
+    assert spans["event AccessBot"]["ph"] == "i"
+    assert [s["name"] for s in trace.timeline()["spans"]] == ["session", "find_policy_for_user", "event AccessBot"]
+
+def test_model_callbacks_record_prep_call_and_tokens():
+    """Verify that the tracer splits model prep from the model call and records token counts."""
+    tracer = RequestTracer()
+    request = SimpleNamespace(contents=[1, 2, 3])
+    usage = SimpleNamespace(prompt_token_count=120, candidates_token_count=8)
+    response = SimpleNamespace(partial=False, usage_metadata=usage, content=None)
+    with tracer.trace("/invoke", enabled=True) as trace:
+        tracer.before_model_start(None, request)
+        tracer.before_model(None, request)
+        tracer.after_model(None, response)
+    spans = {s["name"]: s for s in trace.timeline()["spans"]}
+    assert spans["model_prep"]["contents"] == 3
+    assert spans["model_call"]["prompt_tokens"] == 120 and spans["model_call"]["completion_tokens"] == 8
+    assert current_trace() is None
+
+def test_tool_that_raises_is_closed_with_its_error():
+    """Verify that a tool error ends the tool span and records the error on it."""
+    tracer = RequestTracer()
+    tool, context = SimpleNamespace(name="send_gmail"), SimpleNamespace(function_call_id="c")
+    with tracer.trace("/invoke", enabled=True) as trace:
+        tracer.before_tool(tool, {}, context)
+        assert tracer.on_tool_error(tool, {}, context, ConnectionError("SMTP unavailable")) is None
+    assert trace._open == {}
+    [span] = trace.timeline()["spans"]
+    assert span["name"] == "send_gmail" and span["error"] == "ConnectionError: SMTP unavailable"
+
+def test_untraced_requests_record_nothing():
+    """Verify that spans and callbacks are no-ops when tracing was not requested."""
+    tracer = RequestTracer()
+    with tracer.trace("/invoke", enabled=False) as trace, maybe_span("session") as span:
+        tracer.before_model_start(None, SimpleNamespace(contents=[]))
+    assert trace is None and span is None